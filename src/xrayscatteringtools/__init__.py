@@ -1,5 +1,8 @@
-from .io import combineRuns, get_leaves, read_xyz, write_xyz, read_mol, get_data_paths, get_config_for_runs, get_config
+from .io import combineRuns, iterRuns, get_leaves, read_xyz, write_xyz, read_mol, get_data_paths, get_config_for_runs, get_config_for_shots, get_config
+from .parallel import combineRunsParallel
+from .h5layout import get_layout, find_keys
 from .plotting import plot_j4m, plot_jungfrau, compute_pixel_edges, edges_from_centers
 from .utils import enable_underscore_cleanup, compute_q_map, azimuthalBinning, au2invAngstroms, invAngstroms2au, keV2Angstroms, Angstroms2keV, q2theta, theta2q, element_number_to_symbol, element_symbol_to_number, translate_molecule, rotate_molecule, J4M, compress_ranges
 from . import theory
-from . import calib
\ No newline at end of file
+from . import calib
+from . import analysis
\ No newline at end of file
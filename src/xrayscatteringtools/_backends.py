@@ -0,0 +1,256 @@
+"""Execution backends and picklable array readers for worker tasks.
+
+This module only depends on numpy and the standard library, so analysis and
+theory code can run work on a pool without importing the file-loading layer
+of :mod:`xrayscatteringtools.io`. :mod:`xrayscatteringtools.parallel`
+re-exports the backends.
+
+A *backend* is any object with a ``map(func, iterable)`` method that returns
+results in input order. Large input arrays should not travel inside the
+tasks: :func:`array_reader` turns an array into a small picklable reader
+(shared memory, a memory-mapped file or an HDF5 dataset path) that workers
+index to get just the rows they need.
+"""
+
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SerialBackend:
+    """Backend that runs every task in the calling process (useful for debugging)."""
+
+    def map(self, func, iterable):
+        return list(map(func, iterable))
+
+
+class ProcessPoolBackend:
+    """Backend that runs tasks on a pool of local worker processes.
+
+    Parameters
+    ----------
+    n_workers : int, optional
+        Number of worker processes. Defaults to ``os.cpu_count()``.
+    mp_context : multiprocessing context, optional
+        Start method context passed to :class:`~concurrent.futures.ProcessPoolExecutor`.
+    """
+
+    def __init__(self, n_workers=None, mp_context=None):
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.mp_context = mp_context
+
+    def map(self, func, iterable):
+        tasks = list(iterable)
+        n_workers = max(1, min(self.n_workers, len(tasks)))
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=self.mp_context) as pool:
+            return list(pool.map(func, tasks))
+
+
+def shard(items, n_shards):
+    """Split a sequence into `n_shards` contiguous, nearly equal parts.
+
+    Parameters
+    ----------
+    items : sequence
+        Items to split, e.g. run numbers. Order is preserved.
+    n_shards : int
+        Number of shards. Capped at ``len(items)`` so no shard is empty.
+
+    Returns
+    -------
+    list of list
+
+    Examples
+    --------
+    >>> shard([1, 2, 3, 4, 5], 2)
+    [[1, 2, 3], [4, 5]]
+    """
+    items = list(items)
+    if n_shards < 1:
+        raise ValueError(f"'n_shards' must be a positive integer, got {n_shards}.")
+    n_shards = min(n_shards, len(items))
+    if n_shards == 0:
+        return []
+    size, extra = divmod(len(items), n_shards)
+    shards, start = [], 0
+    for i in range(n_shards):
+        stop = start + size + (1 if i < extra else 0)
+        shards.append(items[start:stop])
+        start = stop
+    return shards
+
+
+def tree_reduce(func, items):
+    """Reduce `items` with a binary function by merging neighbours level by level.
+
+    Unlike :func:`functools.reduce`, the reduction depth is ``log2(len(items))``
+    and adjacent items are always merged left to right, so order-sensitive merges
+    (such as concatenation) are preserved.
+
+    Parameters
+    ----------
+    func : callable
+        ``func(left, right)`` returning the merged result.
+    items : sequence
+        Partial results to merge. Must not be empty.
+
+    Returns
+    -------
+    object
+        The fully merged result.
+    """
+    items = list(items)
+    if not items:
+        raise ValueError("tree_reduce() arg is an empty sequence")
+    while len(items) > 1:
+        merged = [func(items[i], items[i + 1]) for i in range(0, len(items) - 1, 2)]
+        if len(items) % 2:
+            merged.append(items[-1])
+        items = merged
+    return items[0]
+
+
+class SharedArray:
+    """Copy of an array in shared memory; pickles as its name, shape and dtype.
+
+    Indexing returns a copy, so no view of the shared block outlives the call.
+    The creating process owns the block and must :meth:`close` it (or use the
+    object as a context manager) once the workers are done.
+    """
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+        self.shape, self.dtype = array.shape, array.dtype
+        self._shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.name = self._shm.name
+        np.ndarray(self.shape, self.dtype, buffer=self._shm.buf)[...] = array
+
+    def __getstate__(self):
+        return {'name': self.name, 'shape': self.shape, 'dtype': self.dtype}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
+
+    def __getitem__(self, key):
+        shm = self._shm if self._shm is not None else shared_memory.SharedMemory(name=self.name)
+        try:
+            view = np.ndarray(self.shape, self.dtype, buffer=shm.buf)
+            out = np.array(view[key])
+            del view
+        finally:
+            if shm is not self._shm:
+                shm.close()
+        return out
+
+    def close(self):
+        """Release and delete the shared block (creating process only)."""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemmapArray:
+    """Reader of a file-backed :class:`numpy.memmap` that reopens the file when indexed."""
+
+    def __init__(self, filename, dtype, shape, offset=0, order='C'):
+        self.filename, self.dtype, self.shape = filename, np.dtype(dtype), tuple(shape)
+        self.offset, self.order = offset, order
+
+    def __getitem__(self, key):
+        array = np.memmap(self.filename, dtype=self.dtype, mode='r', offset=self.offset,
+                          shape=self.shape, order=self.order)
+        return np.array(array[key])
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DatasetArray:
+    """Reader of an HDF5 dataset that reopens ``filename`` and reads ``name`` when indexed."""
+
+    def __init__(self, filename, name, shape, dtype):
+        self.filename, self.name, self.shape, self.dtype = filename, name, tuple(shape), np.dtype(dtype)
+
+    def __getitem__(self, key):
+        import h5py  # Lazy
+        with h5py.File(self.filename, 'r') as f:
+            dset = f[self.name]
+            if isinstance(key, np.ndarray) and key.dtype.kind in 'iu':
+                # h5py only reads increasing index lists
+                unique, inverse = np.unique(key, return_inverse=True)
+                return dset[unique][inverse.reshape(key.shape)]
+            return dset[key]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def file_reader(array):
+    """
+    Return a picklable reader that reopens the file behind `array`, if any.
+
+    Parameters
+    ----------
+    array : array_like
+        Array to read in worker processes.
+
+    Returns
+    -------
+    DatasetArray, MemmapArray or None
+        A reader of an :class:`h5py.Dataset` or of a file-backed
+        :class:`numpy.memmap` (not a view of one), otherwise None.
+    """
+    if 'h5py' in sys.modules:
+        import h5py
+        if isinstance(array, h5py.Dataset):
+            return DatasetArray(array.file.filename, array.name, array.shape, array.dtype)
+    # Only the memmap that owns the mapping knows its file offset
+    if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and array.filename:
+        order = 'F' if array.flags.f_contiguous and not array.flags.c_contiguous else 'C'
+        return MemmapArray(array.filename, array.dtype, array.shape, array.offset, order)
+    return None
+
+
+def array_reader(array):
+    """
+    Return a small picklable reader of `array` for worker processes.
+
+    Parameters
+    ----------
+    array : array_like
+        An :class:`h5py.Dataset`, a file-backed :class:`numpy.memmap` or any
+        array. Datasets and memory maps are reopened by the workers (see
+        :func:`file_reader`); other arrays are copied once into shared memory.
+
+    Returns
+    -------
+    SharedArray, MemmapArray or DatasetArray
+        Object whose ``reader[key]`` returns ``np.array(array[key])``. Use it
+        as a context manager so shared memory is released afterwards.
+    """
+    reader = file_reader(array)
+    return reader if reader is not None else SharedArray(array)
@@ -0,0 +1,5 @@
+from .delay_binning import delay_bin_edges, assign_delay_bins, binned_mean, bin_difference_signal
+from .bootstrap import bootstrap_difference_signal, bootstrap_weights
+from .shot_filtering import shot_metrics, mad_outliers, group_median, filter_shots
+from .decomposition import randomized_svd
+from .scaling import fit_scale_offset
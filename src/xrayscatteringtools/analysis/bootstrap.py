@@ -0,0 +1,176 @@
+"""Bootstrap confidence bands for binned difference signals ΔS(q, t).
+
+Shots are assigned to their (delay bin, laser on/off) group once and sorted by
+group. A bootstrap resample is then just a vector of multinomial weights (how
+often every shot is drawn, resampling within each group), and the resampled
+group means are weighted sums computed as matrix products for a whole batch
+of resamples at a time. Resamples are spread over worker processes with the
+backends of :mod:`xrayscatteringtools.parallel`; every resample has its own
+random stream spawned from one :class:`numpy.random.SeedSequence`, so results
+do not depend on the number of workers. Process-pool workers get the patterns
+through shared memory (or by reopening a memory-mapped or HDF5 source) with
+the row order and normalization, and gather the group-sorted rows themselves.
+"""
+
+import os
+import warnings
+
+import numpy as np
+
+from .._backends import ProcessPoolBackend, SerialBackend, array_reader, shard
+from .delay_binning import assign_delay_bins, bin_difference_signal
+
+
+def bootstrap_weights(rng, starts, counts):
+    """
+    Draw one stratified bootstrap resample as multinomial weights.
+
+    Parameters
+    ----------
+    rng : numpy.random.Generator
+        Random stream of this resample.
+    starts, counts : ndarray of int
+        First row and number of rows of every group in the group-sorted data.
+
+    Returns
+    -------
+    weights : ndarray of int
+        Number of times every row is drawn. Each group keeps its size.
+    """
+    n_rows = int(counts.sum())
+    group_start = np.repeat(starts, counts)
+    group_size = np.repeat(counts, counts)
+    drawn = group_start + (rng.random(n_rows) * group_size).astype(np.intp)
+    return np.bincount(drawn, minlength=n_rows)
+
+
+def _bootstrap_task(task):
+    """Worker: resampled group means for one slice of resample seeds."""
+    source, order, scale, starts, counts, seeds, batch_size = task
+    # Group-sorted, normalized patterns, read once per task
+    data = np.asarray(source[order], dtype=float).reshape(order.size, -1)
+    if scale is not None:
+        data /= scale[:, np.newaxis]
+    n_groups = starts.size
+    means = np.full((len(seeds), n_groups, data.shape[1]), np.nan)
+    for b0 in range(0, len(seeds), batch_size):
+        batch = seeds[b0:b0 + batch_size]
+        weights = np.stack([bootstrap_weights(np.random.default_rng(ss), starts, counts)
+                            for ss in batch]).astype(data.dtype)
+        for g in range(n_groups):
+            if counts[g] == 0:
+                continue
+            rows = slice(starts[g], starts[g] + counts[g])
+            means[b0:b0 + len(batch), g] = weights[:, rows] @ data[rows] / counts[g]
+    return means
+
+
+def bootstrap_difference_signal(azav, delays, laser_on, xray_on=None, norm=None, bins=20, mode='uniform',
+                                delay_range=None, reference='global', n_boot=1000, confidence=0.95,
+                                seed=None, n_workers=None, backend=None, batch_size=None,
+                                return_samples=False):
+    """
+    Bootstrap confidence bands of the binned difference signal ΔS(q, t).
+
+    Shots are resampled with replacement within every delay bin and laser
+    state (a stratified bootstrap), so each resample has the same counts as
+    the data, and ΔS is recomputed exactly as in
+    :func:`~xrayscatteringtools.analysis.bin_difference_signal`.
+
+    Parameters
+    ----------
+    azav, delays, laser_on, xray_on, norm, bins, mode, delay_range, reference
+        As in :func:`~xrayscatteringtools.analysis.bin_difference_signal`.
+    n_boot : int, optional
+        Number of bootstrap resamples. Default is 1000.
+    confidence : float, optional
+        Confidence level of the percentile bands. Default is 0.95.
+    seed : int or numpy.random.SeedSequence, optional
+        Seed of the random streams. The same seed gives the same bands for any
+        number of workers.
+    n_workers : int, optional
+        Number of worker processes when `backend` is None. Defaults to
+        ``os.cpu_count()``; 1 runs in the calling process.
+    backend : object, optional
+        Object with an ordered ``map(func, iterable)`` method, see
+        :mod:`xrayscatteringtools.parallel`. Defaults to
+        ``ProcessPoolBackend(n_workers)``.
+    batch_size : int, optional
+        Resamples whose weights are held and multiplied at once. Defaults to
+        a batch of about 10 million weights.
+    return_samples : bool, optional
+        If True, also return the resampled ΔS under ``'dS_samples'``
+        (``n_boot x n_bins x ...``). Default is False.
+
+    Returns
+    -------
+    dict
+        The output of ``bin_difference_signal`` plus
+        ``'dS_lower'``/``'dS_upper'`` (percentile band per (t, q) bin),
+        ``'dS_boot_std'`` (bootstrap standard error) and ``'confidence'``.
+    """
+    if n_boot < 2:
+        raise ValueError(f"'n_boot' must be at least 2, got {n_boot}.")
+    result = bin_difference_signal(azav, delays, laser_on, xray_on=xray_on, norm=norm, bins=bins,
+                                   mode=mode, delay_range=delay_range, reference=reference)
+    source = azav
+    azav = np.asarray(azav)
+    delays = np.asarray(delays, dtype=float)
+    laser_on = np.asarray(laser_on, dtype=bool)
+    edges = result['edges']
+    n_bins = edges.size - 1
+
+    # Per-shot group membership, computed once: on-shots of bin b are group b,
+    # off-shots are group n_bins (global reference) or n_bins + b (binned)
+    use = np.ones(azav.shape[0], dtype=bool)
+    if xray_on is not None:
+        use &= np.asarray(xray_on, dtype=bool)
+    if norm is not None:
+        norm = np.asarray(norm, dtype=float)
+        use &= np.isfinite(norm) & (norm > 0)
+    bin_idx = assign_delay_bins(delays, edges)
+    group = np.full(azav.shape[0], -1)
+    on = use & laser_on & (bin_idx >= 0)
+    group[on] = bin_idx[on]
+    off = use & ~laser_on
+    if reference == 'global':
+        group[off] = n_bins
+        n_groups = n_bins + 1
+    else:
+        off &= bin_idx >= 0
+        group[off] = n_bins + bin_idx[off]
+        n_groups = 2 * n_bins
+    order = np.flatnonzero(group >= 0)
+    order = order[np.argsort(group[order], kind='stable')]
+    counts = np.bincount(group[order], minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    scale = norm[order] if norm is not None else None
+
+    seeds = np.random.SeedSequence(seed).spawn(n_boot)
+    if batch_size is None:
+        batch_size = max(1, min(n_boot, 10_000_000 // max(1, order.size)))
+    n_workers = n_workers or os.cpu_count() or 1
+    if backend is None:
+        backend = ProcessPoolBackend(n_workers) if n_workers > 1 else SerialBackend()
+    # Local worker processes read the patterns instead of unpickling a copy per task
+    reader = array_reader(source) if isinstance(backend, ProcessPoolBackend) else None
+    try:
+        tasks = [(reader if reader is not None else azav, order, scale, starts, counts, part, batch_size)
+                 for part in shard(seeds, n_workers)]
+        means = np.concatenate(backend.map(_bootstrap_task, tasks))
+    finally:
+        if reader is not None:
+            reader.close()
+
+    # The off group(s) broadcast against the on groups of every bin
+    dS = (means[:, :n_bins] - means[:, n_bins:]).reshape((n_boot,) + result['dS'].shape)
+
+    tail = 50 * (1 - confidence)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # empty bins are all-NaN
+        result['dS_lower'], result['dS_upper'] = np.nanpercentile(dS, [tail, 100 - tail], axis=0)
+        result['dS_boot_std'] = np.nanstd(dS, axis=0, ddof=1)
+    result['confidence'] = confidence
+    if return_samples:
+        result['dS_samples'] = dS
+    return result
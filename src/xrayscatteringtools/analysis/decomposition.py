@@ -0,0 +1,150 @@
+"""Randomized SVD / PCA of shot-by-q and ΔS(q, t) matrices too large for memory.
+
+The matrix is only touched through products with thin blocks, computed
+`chunk_size` rows at a time, so it can be an HDF5 dataset or a
+:func:`numpy.memmap` with tens of millions of rows. The row space is found by
+randomized subspace iteration on ``A^T A`` (one pass over the rows per
+iteration); the top components then follow from the small projected Gram
+matrix. Memory use is ``O(chunk_size x n_features + n_features x (k + p))``.
+"""
+
+import numpy as np
+
+
+def _blocks(data, chunk_size, mask=None):
+    """Yield ``(start, stop, block)`` of flattened float rows, with masked rows dropped."""
+    n_rows = data.shape[0]
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        block = np.asarray(data[start:stop], dtype=float).reshape(stop - start, -1)
+        if mask is not None:
+            block = block[mask[start:stop]]
+        yield start, stop, block
+
+
+def _prepare(block, mean):
+    """Center a block and set NaNs to the column mean (0 after centering)."""
+    if mean is not None:
+        block = block - mean
+    return np.nan_to_num(block, nan=0.0, copy=False)
+
+
+def randomized_svd(data, n_components=10, center=True, n_oversamples=10, n_iter=4, mask=None,
+                   return_scores=False, chunk_size=100000, seed=None):
+    """
+    Top singular components of a large matrix by randomized subspace iteration.
+
+    Parameters
+    ----------
+    data : array_like, shape (N_rows, ...)
+        Matrix to decompose, e.g. an azav stack ``(N_shots, n_q)`` or a binned
+        ΔS ``(n_bins, n_q)``. Trailing axes are flattened into features. HDF5
+        datasets and memory-mapped arrays are read `chunk_size` rows at a time.
+    n_components : int, optional
+        Number of components k to return. Default is 10.
+    center : bool, optional
+        Subtract the mean row first, so the result is a PCA. Default is True.
+    n_oversamples : int, optional
+        Extra random directions p used in the subspace. Default is 10.
+    n_iter : int, optional
+        Number of power iterations; more iterations sharpen components with
+        close singular values. Default is 4.
+    mask : array_like of bool, shape (N_rows,), optional
+        Rows to include (e.g. the ``keep`` mask of
+        :func:`~xrayscatteringtools.analysis.filter_shots`).
+    return_scores : bool, optional
+        If True, also return the projection of every row onto the components
+        (one more pass over the data). Default is False.
+    chunk_size : int, optional
+        Number of rows read at once. Default is 100000.
+    seed : int, optional
+        Seed of the random starting subspace.
+
+    Returns
+    -------
+    dict
+        - ``'components'``: ``(k, ...)`` right singular vectors with the
+          feature shape of `data`, each with its largest entry positive.
+        - ``'singular_values'``: ``(k,)``.
+        - ``'explained_variance'``: ``(k,)``, ``s**2 / (n - 1)``.
+        - ``'explained_variance_ratio'``: ``(k,)``, fraction of the total
+          (centered) sum of squares.
+        - ``'mean'``: the mean row (zeros if ``center=False``).
+        - ``'n_samples'``: number of rows used.
+        - ``'scores'``: ``(N_rows, k)`` projections (NaN for masked rows), if
+          `return_scores`.
+
+    Notes
+    -----
+    NaN entries are replaced by the column mean (or 0 if ``center=False``).
+    The decomposition makes ``n_iter + 3`` passes over the data (plus one with
+    `return_scores`).
+    """
+    n_rows = data.shape[0]
+    feature_shape = tuple(data.shape[1:])
+    n_features = int(np.prod(feature_shape))
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        if mask.shape != (n_rows,):
+            raise ValueError("mask must have one entry per row of data.")
+    if n_components < 1 or n_components > n_features:
+        raise ValueError(f"n_components must be between 1 and {n_features}, got {n_components}.")
+
+    # Pass 1: column means and the total sum of squares
+    n_samples = 0
+    sums = np.zeros(n_features)
+    counts = np.zeros(n_features)
+    for _, _, block in _blocks(data, chunk_size, mask):
+        finite = np.isfinite(block)
+        sums += np.where(finite, block, 0).sum(axis=0)
+        counts += finite.sum(axis=0)
+        n_samples += block.shape[0]
+    if n_samples < 2:
+        raise ValueError("At least two rows are needed for a decomposition.")
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(counts > 0, sums / counts, 0.0) if center else None
+    total_ss = 0.0
+
+    def gram_product(Q):
+        """``A^T A Q`` of the prepared matrix in one pass."""
+        nonlocal total_ss
+        Z = np.zeros_like(Q)
+        total_ss = 0.0
+        for _, _, block in _blocks(data, chunk_size, mask):
+            block = _prepare(block, mean)
+            Z += block.T @ (block @ Q)
+            total_ss += np.einsum('ij,ij->', block, block)
+        return Z
+
+    rng = np.random.default_rng(seed)
+    n_basis = min(n_components + n_oversamples, n_features)
+    Q, _ = np.linalg.qr(rng.standard_normal((n_features, n_basis)))
+    for _ in range(n_iter + 1):
+        Q, _ = np.linalg.qr(gram_product(Q))
+
+    # Last pass: project onto the basis; the small Gram matrix gives s and V
+    G = Q.T @ gram_product(Q)
+    eigvals, W = np.linalg.eigh((G + G.T) / 2)
+    order = np.argsort(eigvals)[::-1][:n_components]
+    singular_values = np.sqrt(np.maximum(eigvals[order], 0))
+    V = Q @ W[:, order]
+    # Deterministic signs: largest entry of every component positive
+    signs = np.sign(V[np.abs(V).argmax(axis=0), np.arange(V.shape[1])])
+    V *= np.where(signs == 0, 1, signs)
+
+    result = {
+        'components': V.T.reshape((n_components,) + feature_shape),
+        'singular_values': singular_values,
+        'explained_variance': singular_values ** 2 / (n_samples - 1),
+        'explained_variance_ratio': singular_values ** 2 / total_ss if total_ss > 0
+        else np.zeros(n_components),
+        'mean': (mean if center else np.zeros(n_features)).reshape(feature_shape),
+        'n_samples': n_samples,
+    }
+    if return_scores:
+        scores = np.full((n_rows, n_components), np.nan)
+        for start, stop, block in _blocks(data, chunk_size, mask):
+            rows = np.arange(start, stop) if mask is None else start + np.flatnonzero(mask[start:stop])
+            scores[rows] = _prepare(block, mean) @ V
+        result['scores'] = scores
+    return result
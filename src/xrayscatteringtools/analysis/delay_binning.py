@@ -0,0 +1,214 @@
+"""Delay binning of time-resolved scattering into difference signals ΔS(q, t).
+
+Shots are assigned to delay bins once, sorted by bin, and every per-bin sum
+over the (shot x q) stack is taken with a single :func:`numpy.add.reduceat`,
+so binning millions of shots costs one pass over the data regardless of the
+number of bins.
+"""
+
+import numpy as np
+
+
+def delay_bin_edges(delays, bins=20, mode='uniform', delay_range=None):
+    """
+    Compute delay bin edges.
+
+    Parameters
+    ----------
+    delays : array_like
+        Delays of the shots to bin (e.g. the laser-on shots). NaNs are ignored.
+    bins : int or array_like, optional
+        Number of bins, or explicit (increasing) bin edges which are returned
+        unchanged. Default is 20.
+    mode : {'uniform', 'equal'}, optional
+        ``'uniform'`` gives bins of equal width, ``'equal'`` gives bins with
+        (nearly) equal numbers of shots from the quantiles of `delays`.
+        Default is 'uniform'.
+    delay_range : tuple of float, optional
+        (min, max) delays to cover. Defaults to the range of `delays`.
+
+    Returns
+    -------
+    edges : ndarray
+        Bin edges, length ``n_bins + 1``.
+    """
+    if np.ndim(bins) > 0:
+        edges = np.asarray(bins, dtype=float)
+        if edges.ndim != 1 or edges.size < 2 or np.any(np.diff(edges) <= 0):
+            raise ValueError("Bin edges must be a 1D, strictly increasing array.")
+        return edges
+    delays = np.asarray(delays, dtype=float).ravel()
+    delays = delays[np.isfinite(delays)]
+    if delay_range is None:
+        if delays.size == 0:
+            raise ValueError("Cannot determine bin edges without finite delays.")
+        delay_range = (delays.min(), delays.max())
+    lo, hi = map(float, delay_range)
+    if mode == 'uniform':
+        return np.linspace(lo, hi, int(bins) + 1)
+    if mode == 'equal':
+        delays = delays[(delays >= lo) & (delays <= hi)]
+        edges = np.quantile(delays, np.linspace(0, 1, int(bins) + 1))
+        edges[0], edges[-1] = lo, hi
+        # Repeated delays (e.g. a stepped stage) can make quantiles coincide
+        return np.unique(edges)
+    raise ValueError(f"Unknown mode {mode!r}; use 'uniform' or 'equal'.")
+
+
+def assign_delay_bins(delays, edges):
+    """
+    Return the bin index of every delay, or -1 outside the edges.
+
+    Bins are half-open ``[edges[i], edges[i + 1])`` except the last one, which
+    also includes ``edges[-1]``. NaN delays give -1.
+    """
+    delays = np.asarray(delays, dtype=float)
+    edges = np.asarray(edges, dtype=float)
+    idx = np.searchsorted(edges, delays, side='right') - 1
+    idx[delays == edges[-1]] = edges.size - 2
+    idx[(idx < 0) | (idx >= edges.size - 1) | ~np.isfinite(delays)] = -1
+    return idx
+
+
+def binned_mean(values, bin_idx, n_bins):
+    """
+    Per-bin mean, standard error and count of the rows of `values`, in one pass.
+
+    Parameters
+    ----------
+    values : ndarray, shape (N, ...)
+        Per-shot values (e.g. normalized azav).
+    bin_idx : ndarray of int, shape (N,)
+        Bin of every shot; negative indices are skipped.
+    n_bins : int
+        Number of bins.
+
+    Returns
+    -------
+    mean : ndarray, shape (n_bins, ...)
+        Mean of each bin (NaN for empty bins).
+    sem : ndarray, shape (n_bins, ...)
+        Standard error of the mean (NaN for bins with fewer than two shots).
+    counts : ndarray of int, shape (n_bins,)
+        Number of shots in each bin.
+    """
+    values = np.asarray(values)
+    bin_idx = np.asarray(bin_idx)
+    out_shape = (n_bins,) + values.shape[1:]
+    values = values.reshape(values.shape[0], -1)
+    keep = bin_idx >= 0
+    order = np.flatnonzero(keep)[np.argsort(bin_idx[keep], kind='stable')]
+    sorted_bins = bin_idx[order]
+    counts = np.bincount(sorted_bins, minlength=n_bins)
+
+    mean = np.full((n_bins, values.shape[1]), np.nan)
+    sem = np.full((n_bins, values.shape[1]), np.nan)
+    if order.size:
+        rows = values[order].astype(float)
+        # Shift by the overall mean so the sum of squares does not cancel badly;
+        # non-finite shots are left out so they only spoil their own bin
+        finite = np.isfinite(rows)
+        shift = np.where(finite, rows, 0).sum(axis=0) / np.maximum(finite.sum(axis=0), 1)
+        rows -= shift
+        starts = np.flatnonzero(np.r_[True, sorted_bins[1:] != sorted_bins[:-1]])
+        filled = sorted_bins[starts]
+        n = counts[filled][:, np.newaxis]
+        sums = np.add.reduceat(rows, starts, axis=0)
+        sumsq = np.add.reduceat(rows * rows, starts, axis=0)
+        mean[filled] = sums / n + shift
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = np.maximum(sumsq - sums * sums / n, 0) / (n - 1)
+            sem[filled] = np.where(n > 1, np.sqrt(var / n), np.nan)
+    return mean.reshape(out_shape), sem.reshape(out_shape), counts
+
+
+def bin_difference_signal(azav, delays, laser_on, xray_on=None, norm=None, bins=20, mode='uniform',
+                          delay_range=None, reference='global'):
+    """
+    Bin shots by delay and compute the laser-on minus laser-off signal ΔS(q, t).
+
+    Parameters
+    ----------
+    azav : array_like, shape (N_shots, ...)
+        Azimuthally averaged patterns (e.g. ``(N, n_q)`` or ``(N, n_phi, n_q)``).
+    delays : array_like, shape (N_shots,)
+        Per-shot (timetool-corrected) delays.
+    laser_on : array_like of bool, shape (N_shots,)
+        True for pumped shots, False for reference shots.
+    xray_on : array_like of bool, shape (N_shots,), optional
+        Shots with False are dropped (e.g. X-ray off or filtered shots).
+    norm : array_like, shape (N_shots,), optional
+        Per-shot normalization (e.g. total scattering or i0); every pattern is
+        divided by it. Shots with non-positive or NaN norm are dropped.
+    bins : int or array_like, optional
+        Number of delay bins or explicit edges, see :func:`delay_bin_edges`.
+    mode : {'uniform', 'equal'}, optional
+        Bin spacing when `bins` is a number. ``'equal'`` uses equal-population
+        bins of the laser-on delays. Default is 'uniform'.
+    delay_range : tuple of float, optional
+        (min, max) delays to bin. Defaults to the range of the laser-on delays.
+    reference : {'global', 'binned'}, optional
+        ``'global'`` (default) subtracts the mean of all laser-off shots from
+        every bin, ``'binned'`` subtracts the laser-off shots of the same bin.
+
+    Returns
+    -------
+    dict
+        - ``'edges'``: bin edges, ``(n_bins + 1,)``.
+        - ``'delay'``: mean delay of the laser-on shots of each bin, ``(n_bins,)``.
+        - ``'dS'``, ``'dS_err'``: difference signal and its standard error,
+          ``(n_bins, ...)``.
+        - ``'S_on'``, ``'S_on_err'``, ``'S_off'``, ``'S_off_err'``: the laser-on
+          and reference means with standard errors (``S_off`` has no bin axis
+          for ``reference='global'``).
+        - ``'counts_on'``, ``'counts_off'``: number of shots per bin (a scalar
+          ``counts_off`` for ``reference='global'``).
+    """
+    azav = np.asarray(azav)
+    delays = np.asarray(delays, dtype=float)
+    laser_on = np.asarray(laser_on, dtype=bool)
+    n_shots = azav.shape[0]
+    if delays.shape != (n_shots,) or laser_on.shape != (n_shots,):
+        raise ValueError("delays and laser_on must have one entry per shot of azav.")
+    if reference not in ('global', 'binned'):
+        raise ValueError(f"Unknown reference {reference!r}; use 'global' or 'binned'.")
+
+    use = np.ones(n_shots, dtype=bool)
+    if xray_on is not None:
+        use &= np.asarray(xray_on, dtype=bool)
+    data = azav
+    if norm is not None:
+        norm = np.asarray(norm, dtype=float)
+        use &= np.isfinite(norm) & (norm > 0)
+        safe_norm = np.where(use, norm, 1.0)
+        data = azav / safe_norm.reshape((-1,) + (1,) * (azav.ndim - 1))
+
+    on = use & laser_on
+    off = use & ~laser_on
+    edges = delay_bin_edges(delays[on], bins, mode, delay_range)
+    n_bins = edges.size - 1
+    bin_idx = assign_delay_bins(delays, edges)
+
+    S_on, S_on_err, counts_on = binned_mean(data, np.where(on, bin_idx, -1), n_bins)
+    if reference == 'global':
+        S_off, S_off_err, counts_off = binned_mean(data, np.where(off, 0, -1), 1)
+        S_off, S_off_err, counts_off = S_off[0], S_off_err[0], int(counts_off[0])
+    else:
+        S_off, S_off_err, counts_off = binned_mean(data, np.where(off, bin_idx, -1), n_bins)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delay_sum = np.bincount(bin_idx[on & (bin_idx >= 0)],
+                                weights=delays[on & (bin_idx >= 0)], minlength=n_bins)
+        delay = delay_sum / counts_on
+    return {
+        'edges': edges,
+        'delay': delay,
+        'dS': S_on - S_off,
+        'dS_err': np.sqrt(S_on_err ** 2 + S_off_err ** 2),
+        'S_on': S_on,
+        'S_on_err': S_on_err,
+        'S_off': S_off,
+        'S_off_err': S_off_err,
+        'counts_on': counts_on,
+        'counts_off': counts_off,
+    }
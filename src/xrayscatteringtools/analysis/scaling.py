@@ -0,0 +1,133 @@
+"""Closed-form scaling of theory patterns to every shot at once.
+
+Fitting ``scale * I_theory(q) + offset`` to a pattern is a linear least-squares
+problem with a 2x2 normal system, so instead of one ``curve_fit`` per shot the
+weighted sums of the normal equations are formed for a whole chunk of shots
+with matrix products and solved in closed form.
+"""
+
+import numpy as np
+
+
+def fit_scale_offset(azav, theory, mask=None, weights=None, offset=True, return_residuals=True,
+                     chunk_size=100000):
+    """
+    Fit ``scale * theory + offset`` to every shot by weighted linear least squares.
+
+    Parameters
+    ----------
+    azav : array_like, shape (N_shots, ...)
+        Measured patterns, e.g. ``(N, n_q)``. HDF5 datasets and memory-mapped
+        arrays are read `chunk_size` shots at a time. NaN points are ignored.
+    theory : array_like, shape (...) or (N_shots, ...)
+        Theory pattern on the same q grid (e.g. from ``iam_total_pattern`` or
+        ``np.interp(q, pattern.q, pattern.I_q)`` of a ``theory.patterns``
+        object), shared by all shots or one per shot.
+    mask : array_like of bool, shape (...) or (N_shots, ...), optional
+        Points to include in the fit, shared or per shot.
+    weights : array_like, shape (...) or (N_shots, ...), optional
+        Least-squares weights (e.g. ``1 / sigma**2``), shared or per shot.
+    offset : bool, optional
+        Fit a constant offset as well as the scale. Default is True.
+    return_residuals : bool, optional
+        Return the residual patterns (as large as `azav`). Default is True.
+    chunk_size : int, optional
+        Number of shots solved at once. Default is 100000.
+
+    Returns
+    -------
+    dict
+        - ``'scale'``, ``'offset'``: ``(N_shots,)`` best-fit parameters (NaN
+          where the fit is undetermined, e.g. fewer points than parameters).
+        - ``'chi2'``: ``(N_shots,)`` weighted sum of squared residuals.
+        - ``'n_points'``: ``(N_shots,)`` number of points used.
+        - ``'residuals'``: ``azav - (scale * theory + offset)``, if
+          `return_residuals`, also at masked points so the fit can be
+          judged outside the fitted q range.
+    """
+    n_shots = azav.shape[0]
+    feature_shape = tuple(azav.shape[1:])
+    n_features = int(np.prod(feature_shape))
+
+    def _per_point(arr, name):
+        """Flatten a shared or per-shot array; returns (array, per_shot)."""
+        if arr is None:
+            return None, False
+        shape = tuple(arr.shape) if hasattr(arr, 'shape') else np.shape(arr)
+        if shape == feature_shape:
+            return np.asarray(arr).reshape(n_features), False
+        if shape == (n_shots,) + feature_shape:
+            return arr, True
+        raise ValueError(f"{name} must have shape {feature_shape} or {(n_shots,) + feature_shape}, got {shape}.")
+
+    theory, theory_per_shot = _per_point(theory, 'theory')
+    mask, mask_per_shot = _per_point(mask, 'mask')
+    weights, weights_per_shot = _per_point(weights, 'weights')
+
+    def _block(arr, per_shot, start, stop, dtype=float):
+        if per_shot:
+            return np.asarray(arr[start:stop], dtype=dtype).reshape(stop - start, n_features)
+        return np.asarray(arr, dtype=dtype)
+
+    result = {
+        'scale': np.full(n_shots, np.nan),
+        'offset': np.full(n_shots, np.nan),
+        'chi2': np.full(n_shots, np.nan),
+        'n_points': np.zeros(n_shots, dtype=int),
+    }
+    if return_residuals:
+        residuals = np.empty((n_shots, n_features))
+
+    for start in range(0, n_shots, chunk_size):
+        stop = min(start + chunk_size, n_shots)
+        y_raw = np.asarray(azav[start:stop], dtype=float).reshape(stop - start, n_features)
+        t_raw = _block(theory, theory_per_shot, start, stop)
+        y, t = y_raw, t_raw
+        W = np.isfinite(y) & np.isfinite(t)
+        if mask is not None:
+            W &= _block(mask, mask_per_shot, start, stop, dtype=bool)
+        W = W.astype(float)
+        if weights is not None:
+            W *= _block(weights, weights_per_shot, start, stop)
+        used = W > 0
+        W = np.where(used, W, 0.0)
+        y = np.where(used, y, 0.0)
+        t = np.where(used, t, 0.0) if theory_per_shot else np.where(np.isfinite(t), t, 0.0)
+
+        Wy = W * y
+        S_y = Wy.sum(axis=1)
+        if theory_per_shot:
+            S_t = (W * t).sum(axis=1)
+            S_tt = (W * t * t).sum(axis=1)
+            S_ty = (Wy * t).sum(axis=1)
+        else:
+            # Shared theory: the sums over q are matrix-vector products
+            S_t = W @ t
+            S_tt = W @ (t * t)
+            S_ty = Wy @ t
+        n_points = used.sum(axis=1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if offset:
+                S_w = W.sum(axis=1)
+                det = S_w * S_tt - S_t * S_t
+                ok = (n_points >= 2) & (det > 0)
+                scale = np.where(ok, (S_w * S_ty - S_t * S_y) / det, np.nan)
+                shift = np.where(ok, (S_y - scale * S_t) / S_w, np.nan)
+            else:
+                ok = (n_points >= 1) & (S_tt > 0)
+                scale = np.where(ok, S_ty / S_tt, np.nan)
+                shift = np.zeros(stop - start)
+        r = y_raw - (scale[:, np.newaxis] * t_raw + shift[:, np.newaxis])
+        chi2 = (W * np.where(used, r, 0.0) ** 2).sum(axis=1)
+
+        result['scale'][start:stop] = scale
+        result['offset'][start:stop] = shift
+        result['chi2'][start:stop] = np.where(ok, chi2, np.nan)
+        result['n_points'][start:stop] = n_points
+        if return_residuals:
+            residuals[start:stop] = r
+
+    if return_residuals:
+        result['residuals'] = residuals.reshape((n_shots,) + feature_shape)
+    return result
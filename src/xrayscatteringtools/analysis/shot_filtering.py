@@ -0,0 +1,243 @@
+"""Per-shot metrics and robust outlier rejection on whole azav stacks.
+
+Metrics are reductions over the q axis, computed `chunk_size` shots at a time
+so stacks that only exist on disk (HDF5 datasets, :func:`numpy.memmap`) are
+streamed rather than loaded. Outliers are flagged with median / MAD
+statistics, optionally per run.
+"""
+
+import numpy as np
+
+# Scale of the MAD relative to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+
+def _chunks(n, chunk_size):
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
+
+
+def _run_means(azav, run_indicator, chunk_size):
+    """Mean pattern of every run (flattened), streaming over chunks."""
+    runs, inverse = np.unique(run_indicator, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    sums = np.zeros((runs.size, int(np.prod(azav.shape[1:]))))
+    counts = np.zeros((runs.size, sums.shape[1]))
+    for start, stop in _chunks(azav.shape[0], chunk_size):
+        block = np.asarray(azav[start:stop], dtype=float).reshape(stop - start, -1)
+        finite = np.isfinite(block)
+        block_runs = inverse[start:stop]
+        # Chunks usually hold one or two runs
+        for r in np.unique(block_runs):
+            rows = block_runs == r
+            sums[r] += np.where(finite[rows], block[rows], 0).sum(axis=0)
+            counts[r] += finite[rows].sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, inverse
+
+
+def shot_metrics(azav, q=None, q_window=None, i0=None, run_indicator=None, chunk_size=10000):
+    """
+    Compute per-shot filtering metrics of an azav stack in vectorized chunks.
+
+    Parameters
+    ----------
+    azav : array_like, shape (N_shots, ..., n_q)
+        Azimuthally averaged patterns. HDF5 datasets and memory-mapped arrays
+        are read `chunk_size` shots at a time. NaN pixels are ignored.
+    q : array_like, shape (n_q,), optional
+        q grid of the last axis; required for `q_window`.
+    q_window : tuple of float, optional
+        (q_min, q_max) range of the ``'window'`` metric.
+    i0 : array_like, shape (N_shots,), optional
+        Incident intensity monitor. Adds the ``'i0'`` and ``'total_per_i0'``
+        metrics.
+    run_indicator : array_like, shape (N_shots,), optional
+        Run of every shot. The ``'correlation'`` metric then compares each shot
+        to the mean pattern of its own run instead of the overall mean.
+    chunk_size : int, optional
+        Number of shots reduced at once. Default is 10000.
+
+    Returns
+    -------
+    dict of ndarray
+        ``'total'`` (sum over all bins), ``'window'`` (sum over `q_window`, if
+        given), ``'correlation'`` (Pearson correlation with the run mean
+        pattern) and, with `i0`, ``'i0'`` and ``'total_per_i0'``.
+    """
+    n_shots = azav.shape[0]
+    if run_indicator is None:
+        run_indicator = np.zeros(n_shots, dtype=int)
+    run_indicator = np.asarray(run_indicator)
+    if run_indicator.shape != (n_shots,):
+        raise ValueError("run_indicator must have one entry per shot of azav.")
+    if q_window is not None:
+        if q is None:
+            raise ValueError("q is required to use q_window.")
+        q = np.asarray(q, dtype=float)
+        in_window = (q >= q_window[0]) & (q <= q_window[1])
+
+    # First pass: mean pattern of every run, the reference of the correlation
+    means, run_index = _run_means(azav, run_indicator, chunk_size)
+
+    metrics = {
+        'total': np.empty(n_shots),
+        'correlation': np.empty(n_shots),
+    }
+    if q_window is not None:
+        metrics['window'] = np.empty(n_shots)
+
+    # Second pass: per-shot reductions
+    for start, stop in _chunks(n_shots, chunk_size):
+        block = np.asarray(azav[start:stop], dtype=float)
+        flat = block.reshape(stop - start, -1)
+        metrics['total'][start:stop] = np.nansum(flat, axis=1)
+        if q_window is not None:
+            metrics['window'][start:stop] = np.nansum(
+                block[..., in_window].reshape(stop - start, -1), axis=1)
+        ref = means[run_index[start:stop]]
+        valid = np.isfinite(flat) & np.isfinite(ref)
+        n_valid = valid.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x = np.where(valid, flat, 0)
+            x = np.where(valid, x - x.sum(axis=1, keepdims=True) / n_valid, 0)
+            m = np.where(valid, ref, 0)
+            m = np.where(valid, m - m.sum(axis=1, keepdims=True) / n_valid, 0)
+            metrics['correlation'][start:stop] = (x * m).sum(axis=1) / np.sqrt(
+                (x * x).sum(axis=1) * (m * m).sum(axis=1))
+
+    if i0 is not None:
+        i0 = np.asarray(i0, dtype=float)
+        metrics['i0'] = i0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            metrics['total_per_i0'] = metrics['total'] / i0
+    return metrics
+
+
+def group_median(values, groups=None):
+    """
+    Median of `values` within every group, ignoring NaNs, in one sort.
+
+    Parameters
+    ----------
+    values : array_like, shape (N,)
+    groups : array_like, shape (N,), optional
+        Group label of every value. Default is a single group.
+
+    Returns
+    -------
+    medians : ndarray, shape (N,)
+        The median of each value's group (NaN if the group has no finite values).
+    """
+    values = np.asarray(values, dtype=float)
+    if groups is None:
+        groups = np.zeros(values.shape, dtype=int)
+    _, inverse = np.unique(np.asarray(groups), return_inverse=True)
+    inverse = inverse.reshape(-1)
+    finite = np.isfinite(values)
+    n_groups = inverse.max() + 1 if inverse.size else 0
+    medians = np.full(n_groups, np.nan)
+    idx = np.flatnonzero(finite)
+    if idx.size:
+        order = idx[np.lexsort((values[idx], inverse[idx]))]
+        sorted_groups = inverse[order]
+        counts = np.bincount(sorted_groups, minlength=n_groups)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        lo = starts[filled] + (counts[filled] - 1) // 2
+        hi = starts[filled] + counts[filled] // 2
+        medians[filled] = 0.5 * (values[order[lo]] + values[order[hi]])
+    return medians[inverse]
+
+
+def mad_outliers(values, threshold=5.0, groups=None, side='both'):
+    """
+    Flag outliers by their distance from the median in units of the scaled MAD.
+
+    Parameters
+    ----------
+    values : array_like, shape (N,)
+        Metric of every shot.
+    threshold : float, optional
+        Robust z-score beyond which a value is an outlier. Default is 5.
+    groups : array_like, shape (N,), optional
+        Compute the median and MAD within each group (e.g. per run).
+    side : {'both', 'low', 'high'}, optional
+        Which tail(s) count as outliers. Default is 'both'.
+
+    Returns
+    -------
+    outlier : ndarray of bool
+        True for outliers and non-finite values.
+    z : ndarray
+        Robust z-score ``(value - median) / (1.4826 * MAD)``.
+    """
+    values = np.asarray(values, dtype=float)
+    median = group_median(values, groups)
+    mad = MAD_SCALE * group_median(np.abs(values - median), groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (values - median) / mad
+    # A zero MAD (more than half the values identical) only flags differing values
+    z = np.where(mad == 0, np.where(values == median, 0.0, np.copysign(np.inf, values - median)), z)
+    if side == 'both':
+        outlier = np.abs(z) > threshold
+    elif side == 'low':
+        outlier = z < -threshold
+    elif side == 'high':
+        outlier = z > threshold
+    else:
+        raise ValueError(f"Unknown side {side!r}; use 'both', 'low' or 'high'.")
+    return outlier | ~np.isfinite(values), z
+
+
+def filter_shots(azav, q=None, q_window=None, i0=None, run_indicator=None, threshold=5.0,
+                 per_run=True, chunk_size=10000):
+    """
+    Reject outlier shots of an azav stack with robust per-shot statistics.
+
+    Every metric of :func:`shot_metrics` is tested with :func:`mad_outliers`:
+    totals, q-window sums, i0 and total/i0 on both sides, the correlation with
+    the run mean only on the low side.
+
+    Parameters
+    ----------
+    azav, q, q_window, i0, run_indicator, chunk_size
+        As in :func:`shot_metrics`.
+    threshold : float or dict, optional
+        Robust z-score threshold, or a dictionary of thresholds per metric
+        (metrics missing from it are not tested). Default is 5.
+    per_run : bool, optional
+        Compute medians and MADs per run when `run_indicator` is given.
+        Default is True.
+
+    Returns
+    -------
+    keep : ndarray of bool, shape (N_shots,)
+        True for shots passing every test.
+    diagnostics : dict
+        ``'metrics'`` (from :func:`shot_metrics`), ``'z'`` (robust z-score per
+        metric), ``'rejected_by'`` (outlier mask per metric) and
+        ``'n_rejected'`` (count per metric).
+    """
+    metrics = shot_metrics(azav, q=q, q_window=q_window, i0=i0, run_indicator=run_indicator,
+                           chunk_size=chunk_size)
+    groups = run_indicator if per_run else None
+    sides = {'correlation': 'low'}
+    keep = np.ones(azav.shape[0], dtype=bool)
+    z_scores, rejected = {}, {}
+    for name, values in metrics.items():
+        if isinstance(threshold, dict):
+            if name not in threshold:
+                continue
+            limit = threshold[name]
+        else:
+            limit = threshold
+        rejected[name], z_scores[name] = mad_outliers(values, limit, groups, sides.get(name, 'both'))
+        keep &= ~rejected[name]
+    diagnostics = {
+        'metrics': metrics,
+        'z': z_scores,
+        'rejected_by': rejected,
+        'n_rejected': {name: int(mask.sum()) for name, mask in rejected.items()},
+    }
+    return keep, diagnostics
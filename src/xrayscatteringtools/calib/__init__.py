@@ -1,4 +1,7 @@
 from .geometry_calibration import run_geometry_calibration, model
 from .scattering_corrections import correction_factor, J4M_efficiency
 from .masking import MaskMaker, mask_maker  # mask_maker kept for backward compat
-from .timetool_calibration import fast_erf_fit, add_calibration_to_yaml, apply_timetool_correction
\ No newline at end of file
+from .timetool_calibration import (
+    fast_erf_fit, fast_erf_fit_batch, erf_fit_batch, add_calibration_to_yaml, apply_timetool_correction,
+    LinearFitAccumulator, robust_linear_fit, run_timetool_calibration,
+)
\ No newline at end of file
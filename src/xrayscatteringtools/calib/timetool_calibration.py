@@ -1,6 +1,7 @@
 import numpy as np
 import math
 from ruamel.yaml import YAML
+from scipy.special import erf, erfinv
 
 def fast_erf_fit(array, min_val=0.1, max_val=0.9):
     """
@@ -75,6 +76,246 @@ def fast_erf_fit(array, min_val=0.1, max_val=0.9):
 
     return range_val, cent_pos, cent_amp, norm, slope_val
 
+def fast_erf_fit_batch(arrays, min_val=0.1, max_val=0.9, return_norm=False, chunk_size=4096):
+    """
+    Batched :func:`fast_erf_fit` over many traces at once.
+
+    Every row of `arrays` is treated exactly like the 1D input of
+    :func:`fast_erf_fit`, but normalization and threshold searches are done on
+    whole blocks of rows: the last crossing below `min_val` and the first
+    crossing above `max_val` are found with ``argmax`` on boolean masks, so
+    there is no Python loop over shots.
+
+    Parameters
+    ----------
+    arrays : array_like, shape (N_shots, N_pixels)
+        Timetool traces, one per row. Anything that can be sliced by rows
+        (e.g. an :class:`h5py.Dataset` or a memory map) works and is read
+        `chunk_size` rows at a time.
+    min_val : float, optional
+        Lower threshold (fraction of the normalized range). Default is 0.1.
+    max_val : float, optional
+        Upper threshold (fraction of the normalized range). Default is 0.9.
+    return_norm : bool, optional
+        If True, also compute the normalized traces (N_shots x N_pixels
+        floats). Default is False.
+    chunk_size : int, optional
+        Number of rows processed at once, which bounds the temporary memory.
+        Default is 4096.
+
+    Returns
+    -------
+    range_val : ndarray of int, shape (N_shots,)
+        Width of the transition region of each trace.
+    cent_pos : ndarray of int, shape (N_shots,)
+        Center index of the transition region of each trace.
+    cent_amp : ndarray of float, shape (N_shots,)
+        Normalized amplitude at the center position.
+    norm_data : ndarray, shape (N_shots, N_pixels), or None
+        Normalized traces if `return_norm` is True, otherwise None, so the
+        outputs are in the same order as those of :func:`fast_erf_fit`.
+    slope_val : ndarray of float, shape (N_shots,)
+        Estimated slope of the transition.
+
+    Notes
+    -----
+    As in :func:`fast_erf_fit`, flat traces and traces whose crossings are
+    missing or in the wrong order give zeros (and a zero row of `norm_data`).
+    """
+    if np.ndim(arrays) != 2:
+        arrays = np.asarray(arrays)
+        if arrays.ndim != 2:
+            raise ValueError(f"arrays must be 2D (N_shots, N_pixels), got shape {arrays.shape}.")
+    n_shots, length = arrays.shape
+    range_val = np.zeros(n_shots, dtype=int)
+    cent_pos = np.zeros(n_shots, dtype=int)
+    cent_amp = np.zeros(n_shots)
+    slope_val = np.zeros(n_shots)
+    norm_data = np.zeros((n_shots, length)) if return_norm else None
+
+    for start in range(0, n_shots, chunk_size):
+        block = np.asarray(arrays[start:start + chunk_size], dtype=float)
+        rows = np.arange(block.shape[0])
+
+        # Normalize every row to 0-1
+        with np.errstate(invalid='ignore', divide='ignore'):
+            lo = np.nanmin(block, axis=1, keepdims=True)
+            hi = np.nanmax(block, axis=1, keepdims=True)
+            norm = (block - lo) / (hi - lo)
+
+        # Last index below min_val and first index above max_val
+        low = norm < min_val
+        high = norm > max_val
+        min_pos = length - 1 - np.argmax(low[:, ::-1], axis=1)
+        max_pos = np.argmax(high, axis=1)
+
+        valid = (hi[:, 0] != lo[:, 0]) & low.any(axis=1) & high.any(axis=1) & (min_pos < max_pos)
+        rng = max_pos - min_pos
+        cent = (min_pos + max_pos) // 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (norm[rows, max_pos] - norm[rows, min_pos]) / rng
+
+        stop = start + block.shape[0]
+        range_val[start:stop] = np.where(valid, rng, 0)
+        cent_pos[start:stop] = np.where(valid, cent, 0)
+        cent_amp[start:stop] = np.where(valid, norm[rows, cent], 0)
+        slope_val[start:stop] = np.where(valid, slope, 0)
+        if return_norm:
+            norm_data[start:stop] = np.where(valid[:, np.newaxis], norm, 0)
+
+    return range_val, cent_pos, cent_amp, norm_data, slope_val
+
+def erf_fit_batch(arrays, window=None, max_iter=20, tol=1e-3, min_val=0.1, max_val=0.9, chunk_size=1024):
+    """
+    Sub-pixel fit of an error-function step to many traces at once.
+
+    Each trace is modelled as ``offset + amplitude * (1 + erf((x - center) / width)) / 2``
+    and fitted by a Levenberg-Marquardt iteration with the analytic Jacobian,
+    vectorized over all traces of a block (no per-shot ``curve_fit``). The
+    iteration starts from the coarse estimate of :func:`fast_erf_fit_batch`.
+
+    Parameters
+    ----------
+    arrays : array_like, shape (N_shots, N_pixels)
+        Timetool traces, one per row. Anything that can be sliced by rows
+        (e.g. an :class:`h5py.Dataset` or a memory map) works.
+    window : int, optional
+        If given, only pixels within `window` of the coarse center are fitted,
+        which is faster for long traces and ignores structure far from the
+        edge. Default is None (fit the whole trace).
+    max_iter : int, optional
+        Maximum number of iterations. Default is 20.
+    tol : float, optional
+        A fit has converged when its center moves by less than `tol` pixels
+        in an accepted step. Default is 1e-3.
+    min_val, max_val : float, optional
+        Thresholds of the coarse estimate, see :func:`fast_erf_fit`.
+    chunk_size : int, optional
+        Number of rows fitted at once. Default is 1024.
+
+    Returns
+    -------
+    center : ndarray, shape (N_shots,)
+        Sub-pixel edge position (pixels).
+    width : ndarray, shape (N_shots,)
+        Width of the erf step (pixels); the 10-90 % rise is about 1.81 widths.
+    amplitude : ndarray, shape (N_shots,)
+        Height of the step.
+    offset : ndarray, shape (N_shots,)
+        Baseline before the step.
+    converged : ndarray of bool, shape (N_shots,)
+        Whether the fit converged within `max_iter` iterations.
+
+    Notes
+    -----
+    Traces for which the coarse estimate fails (flat, falling or without
+    threshold crossings) give NaN for all parameters. NaN pixels are ignored.
+    """
+    if np.ndim(arrays) != 2:
+        arrays = np.asarray(arrays)
+        if arrays.ndim != 2:
+            raise ValueError(f"arrays must be 2D (N_shots, N_pixels), got shape {arrays.shape}.")
+    n_shots = arrays.shape[0]
+    params = np.full((n_shots, 4), np.nan)
+    converged = np.zeros(n_shots, dtype=bool)
+    for start in range(0, n_shots, chunk_size):
+        block = np.asarray(arrays[start:start + chunk_size], dtype=float)
+        stop = start + block.shape[0]
+        params[start:stop], converged[start:stop] = _erf_fit_block(
+            block, window, max_iter, tol, min_val, max_val)
+    offset, amplitude, center, width = params.T
+    return center, width, amplitude, offset, converged
+
+
+def _erf_model(x, params, weight):
+    """Evaluate the erf step for every row of (offset, amplitude, center, width).
+
+    Returns the model and its Jacobian with shape (n, 4, n_pixels), zeroed
+    where `weight` is False.
+    """
+    a, b, c, w = (params[:, i:i + 1] for i in range(4))
+    z = (x - c) / w
+    jac = np.empty((z.shape[0], 4, z.shape[1]))
+    jac[:, 0] = weight
+    step = jac[:, 1]
+    np.multiply(0.5, 1 + erf(z), out=step)
+    model = a + b * step
+    step *= weight
+    g = jac[:, 2]
+    np.exp(-z * z, out=g)
+    g *= (-b / (w * math.sqrt(math.pi))) * weight
+    np.multiply(g, z, out=jac[:, 3])
+    return model, jac
+
+
+def _erf_fit_block(block, window, max_iter, tol, min_val, max_val):
+    """Levenberg-Marquardt erf fit of every row of a 2D block."""
+    n, length = block.shape
+    range_val, cent_pos, _, _, _ = fast_erf_fit_batch(block, min_val, max_val)
+    valid = range_val > 0
+
+    # Initial guess from the coarse crossings
+    with np.errstate(invalid='ignore'):
+        lo = np.nanmin(block, axis=1)
+        hi = np.nanmax(block, axis=1)
+    z_span = erfinv(2 * max_val - 1) - erfinv(2 * min_val - 1)
+    params = np.stack([lo, hi - lo, cent_pos.astype(float), np.maximum(range_val, 1) / z_span], axis=1)
+
+    # Pixels entering the fit
+    if window is None:
+        x = np.broadcast_to(np.arange(length, dtype=float), (n, length))
+        y = block
+        weight = np.isfinite(y)
+    else:
+        idx = cent_pos[:, np.newaxis] + np.arange(-window, window + 1)
+        weight = (idx >= 0) & (idx < length)
+        idx = np.clip(idx, 0, length - 1)
+        x = idx.astype(float)
+        y = np.take_along_axis(block, idx, axis=1)
+        weight &= np.isfinite(y)
+    weight &= valid[:, np.newaxis]
+    y = np.where(weight, y, 0.0)
+
+    model, jac = _erf_model(x, params, weight)
+    resid = np.where(weight, y - model, 0.0)
+    cost = np.einsum('nk,nk->n', resid, resid)
+    lam = np.full(n, 1e-3)
+    active = valid.copy()
+    converged = np.zeros(n, dtype=bool)
+    eye = np.eye(4)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        rows = np.flatnonzero(active)
+        J = jac if rows.size == n else jac[rows]
+        JtJ = J @ J.transpose(0, 2, 1)
+        Jtr = (J @ resid[rows, :, np.newaxis])[:, :, 0]
+        diag = np.einsum('nii->ni', JtJ)
+        A = JtJ + (lam[rows, np.newaxis] * diag + 1e-12 * (1 + diag.sum(axis=1, keepdims=True)))[:, :, np.newaxis] * eye
+        step = np.linalg.solve(A, Jtr[:, :, np.newaxis])[:, :, 0]
+
+        trial = params[rows] + step
+        new_model, new_jac = _erf_model(x[rows], trial, weight[rows])
+        new_resid = np.where(weight[rows], y[rows] - new_model, 0.0)
+        new_cost = np.einsum('nk,nk->n', new_resid, new_resid)
+        better = np.isfinite(new_cost) & (new_cost <= cost[rows])
+
+        # Accept improving steps and relax the damping, otherwise damp harder
+        acc = rows[better]
+        params[acc], jac[acc], resid[acc], cost[acc] = trial[better], new_jac[better], new_resid[better], new_cost[better]
+        lam[rows] = np.where(better, lam[rows] / 10, lam[rows] * 10)
+        done = better & (np.abs(step[:, 2]) < tol)
+        converged[rows[done]] = True
+        active[rows[done | (lam[rows] > 1e10)]] = False
+
+    # A negative width describes the same step with a flipped amplitude
+    flip = params[:, 3] < 0
+    params[flip, 0] += params[flip, 1]
+    params[flip, 1] *= -1
+    params[flip, 3] *= -1
+    params[~valid] = np.nan
+    return params, converged
+
 def add_calibration_to_yaml(run_range, slope, intercept, file_path = 'config.yaml' ,key_name='tt_calibration'):
     """Append timetool calibration data to a YAML file, preserving comments.
 
@@ -169,7 +410,8 @@ def add_calibration_to_yaml(run_range, slope, intercept, file_path = 'config.yam
         
     print(f"Successfully appended calibration to '{key_name}' in {file_path}.")
 
-def apply_timetool_correction(delays, edge_positions, slopes, intercepts, run_indicator=None):
+def apply_timetool_correction(delays, edge_positions, slopes, intercepts, run_indicator=None,
+                              dtype=None, out=None):
     """
     Apply timetool corrections, optionally using per-run calibration parameters.
 
@@ -182,53 +424,67 @@ def apply_timetool_correction(delays, edge_positions, slopes, intercepts, run_in
     slopes : scalar, sequence or ndarray
         Slope(s) for the correction (seconds per pixel). If a single value
         is provided, it will be applied to all shots. If multiple values
-        are provided, their length must match the number of unique runs
-        in `run_indicator`.
+        are provided with `run_indicator`, their length must match the number
+        of unique runs in `run_indicator`. Without `run_indicator`, an array
+        with the shape of `delays` is applied shot by shot (e.g. the output of
+        :func:`xrayscatteringtools.io.get_config_for_shots`).
     intercepts : scalar, sequence or ndarray
-        Intercept(s) for the correction (seconds). If a single value is
-        provided, it will be applied to all shots. If multiple values
-        are provided, their length must match the number of unique runs
-        in `run_indicator`.
+        Intercept(s) for the correction (seconds), following the same rules
+        as `slopes`.
     run_indicator : array_like, optional
         Per-shot run identifier. If provided, it must have the same length
         as `delays` and `edge_positions`. The unique values in `run_indicator`
         determine which slope and intercept to use for each shot.
+    dtype : data-type, optional
+        Floating point type of the computation and of the result, e.g.
+        ``np.float32`` to halve the memory of large datasets. Defaults to the
+        dtype of `out` if given, else float64.
+    out : ndarray, optional
+        Array with the shape of `delays` to write the result into. Passing
+        `delays` itself corrects the delays in place.
 
     Returns
     -------
     corrected_delays : ndarray
-        Array of corrected delays, same shape as `delays`.
+        Array of corrected delays, same shape as `delays` (`out` if given).
+
+    Notes
+    -----
+    With `run_indicator`, every shot is mapped to the index of its run among
+    the sorted unique runs, and the per-run slopes and intercepts are gathered
+    with that index in a single vectorized step, so the cost is linear in the
+    number of shots regardless of the number of runs.
     """
     delays = np.asarray(delays)
     edge_positions = np.asarray(edge_positions)
+    if dtype is None:
+        dtype = out.dtype if out is not None else np.float64
+    dtype = np.dtype(dtype)
 
     if run_indicator is None:
-        # Single calibration case
-        if not np.isscalar(slopes) or not np.isscalar(intercepts):
-            raise ValueError("When run_indicator is not provided, slopes and intercepts must be scalars.")
-
-        timetool_correction = edge_positions * slopes + intercepts
-        corrected_delays = delays + timetool_correction
+        # Single calibration, or per-shot calibration arrays
+        for name, value in (('slopes', slopes), ('intercepts', intercepts)):
+            if not np.isscalar(value) and np.shape(value) != delays.shape:
+                raise ValueError(
+                    f"When run_indicator is not provided, {name} must be scalars or "
+                    f"arrays with the same shape as delays."
+                )
+        shot_slopes = np.asarray(slopes, dtype=dtype)
+        shot_intercepts = np.asarray(intercepts, dtype=dtype)
 
     else:
         # Multi-calibration case
         run_indicator = np.asarray(run_indicator)
-        unique_runs = np.unique(run_indicator)
-        num_unique_runs = unique_runs.size
+        num_unique_runs, run_index = _run_index(run_indicator)
 
-        slopes = np.asarray(slopes)
-        intercepts = np.asarray(intercepts)
+        slopes = np.asarray(slopes, dtype=dtype).reshape(-1)
+        intercepts = np.asarray(intercepts, dtype=dtype).reshape(-1)
 
         # Validate slopes and intercepts
-        if slopes.ndim == 0:
-            slopes = slopes.reshape(1)
-        if intercepts.ndim == 0:
-            intercepts = intercepts.reshape(1)
-
         if slopes.size == 1:
-            slopes = np.full(num_unique_runs, slopes.item())
+            slopes = np.full(num_unique_runs, slopes[0])
         if intercepts.size == 1:
-            intercepts = np.full(num_unique_runs, intercepts.item())
+            intercepts = np.full(num_unique_runs, intercepts[0])
 
         if slopes.size != num_unique_runs or intercepts.size != num_unique_runs:
             raise ValueError("Number of slopes/intercepts must be 1 or match the number of unique runs in run_indicator.")
@@ -236,17 +492,288 @@ def apply_timetool_correction(delays, edge_positions, slopes, intercepts, run_in
         if run_indicator.shape != delays.shape or run_indicator.shape != edge_positions.shape:
             raise ValueError("run_indicator, delays, and edge_positions must have the same shape.")
 
-        # Prepare output array
-        corrected_delays = np.empty_like(delays, dtype=float)
+        # Gather the calibration of each shot's run
+        shot_slopes = slopes[run_index]
+        shot_intercepts = intercepts[run_index]
+
+    if out is None:
+        out = np.empty(np.broadcast(delays, edge_positions).shape, dtype=dtype)
+    # The correction is computed before `out` is written, so out may alias delays
+    timetool_correction = np.multiply(edge_positions, shot_slopes, dtype=dtype)
+    timetool_correction += shot_intercepts
+    np.add(delays, timetool_correction, out=out, dtype=dtype)
+    return out
+
 
-        # Apply the corresponding calibration to each subset of shots
-        for i, run in enumerate(unique_runs):
-            mask = run_indicator == run
-            if not np.any(mask):
-                continue
-            s = float(slopes[i])
-            it = float(intercepts[i])
-            timetool_correction = edge_positions[mask] * s + it
-            corrected_delays[mask] = delays[mask] + timetool_correction
+def _run_index(run_indicator):
+    """Return the number of unique runs and each shot's index among the sorted unique runs.
 
-    return corrected_delays
\ No newline at end of file
+    Equivalent to ``np.unique(run_indicator, return_inverse=True)``. For integer
+    run numbers spanning a compact range (the usual case) it uses a presence
+    table instead of a sort, which is linear in the number of shots.
+    """
+    if run_indicator.size and np.issubdtype(run_indicator.dtype, np.integer):
+        lo, hi = int(run_indicator.min()), int(run_indicator.max())
+        if hi - lo < 4 * run_indicator.size + 1024:
+            offset = run_indicator - lo
+            present = np.zeros(hi - lo + 1, dtype=bool)
+            present[offset] = True
+            rank = np.cumsum(present) - 1
+            return int(present.sum()), rank[offset]
+    unique_runs, inverse = np.unique(run_indicator, return_inverse=True)
+    return unique_runs.size, inverse.reshape(run_indicator.shape)
+
+
+class LinearFitAccumulator:
+    """Streaming normal equations of a weighted straight-line fit ``y = slope * x + intercept``.
+
+    Only six running sums are kept, so a fit over millions of points can be
+    accumulated chunk by chunk (and partial accumulators merged) without
+    holding the data.
+
+    Examples
+    --------
+    >>> acc = LinearFitAccumulator()
+    >>> for x, y in chunks:
+    ...     acc.add(x, y)
+    >>> slope, intercept = acc.solve()
+    """
+
+    def __init__(self):
+        self.sums = np.zeros(6)  # w, wx, wy, wxx, wxy, wyy
+
+    def add(self, x, y, weights=None):
+        """Add points (NaN points are skipped) with optional non-negative weights."""
+        x = np.asarray(x, dtype=float).ravel()
+        y = np.asarray(y, dtype=float).ravel()
+        w = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float).ravel()
+        keep = np.isfinite(x) & np.isfinite(y) & np.isfinite(w)
+        x, y, w = x[keep], y[keep], w[keep]
+        wx, wy = w * x, w * y
+        self.sums += [w.sum(), wx.sum(), wy.sum(), wx @ x, wx @ y, wy @ y]
+        return self
+
+    def merge(self, other):
+        """Add the sums of another accumulator."""
+        self.sums += other.sums
+        return self
+
+    @property
+    def count(self):
+        """Total weight of the accumulated points."""
+        return self.sums[0]
+
+    def solve(self):
+        """Return the (slope, intercept) of the weighted least-squares line."""
+        sw, sx, sy, sxx, sxy, _ = self.sums
+        det = sw * sxx - sx * sx
+        if sw <= 0 or det <= 1e-12 * max(sw * sxx, 1e-300):
+            raise ValueError("Not enough distinct points to fit a line.")
+        slope = (sw * sxy - sx * sy) / det
+        intercept = (sy - slope * sx) / sw
+        return slope, intercept
+
+
+def _mad_scale(residuals):
+    """Robust standard deviation (1.4826 * median absolute deviation)."""
+    return 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+
+
+def robust_linear_fit(x, y, method='huber', huber_k=1.345, max_iter=50, tol=1e-10,
+                      n_trials=500, residual_threshold=None, max_samples=20000, seed=None):
+    """
+    Robust straight-line fit ``y = slope * x + intercept``.
+
+    Parameters
+    ----------
+    x, y : array_like
+        Points to fit. Non-finite points are ignored.
+    method : {'huber', 'ransac', 'ols'}, optional
+        ``'huber'`` (default) runs iteratively reweighted least squares with
+        Huber weights ``min(1, huber_k * scale / |residual|)``, the scale
+        being the MAD of the residuals. ``'ransac'`` scores `n_trials` lines
+        through random pairs of points at once and refits the largest inlier
+        set. ``'ols'`` is ordinary least squares.
+    huber_k : float, optional
+        Huber tuning constant, in units of the residual scale. Default is 1.345.
+    max_iter : int, optional
+        Maximum number of Huber iterations. Default is 50.
+    tol : float, optional
+        Relative change of the parameters that stops the Huber iteration.
+    n_trials : int, optional
+        Number of RANSAC candidate lines. Default is 500.
+    residual_threshold : float, optional
+        RANSAC inlier threshold in units of `y`. Defaults to 2.5 times the
+        robust residual scale of the candidate with the smallest median
+        absolute residual.
+    max_samples : int, optional
+        RANSAC scores candidates on at most this many randomly chosen points.
+        Default is 20000.
+    seed : int or numpy.random.Generator, optional
+        Random state of RANSAC.
+
+    Returns
+    -------
+    slope : float
+    intercept : float
+    weights : ndarray
+        Final weight of every point: Huber weights, RANSAC inlier mask (as
+        0/1) or ones for ``'ols'``. Non-finite points get 0.
+    """
+    x = np.asarray(x, dtype=float).ravel()
+    y = np.asarray(y, dtype=float).ravel()
+    if x.shape != y.shape:
+        raise ValueError("x and y must have the same number of points.")
+    finite = np.isfinite(x) & np.isfinite(y)
+    weights = finite.astype(float)
+    slope, intercept = LinearFitAccumulator().add(x, y, weights).solve()
+
+    if method == 'ols':
+        pass
+    elif method == 'huber':
+        for _ in range(max_iter):
+            resid = np.where(finite, y - (slope * x + intercept), 0.0)
+            scale = _mad_scale(resid[finite])
+            if scale == 0:
+                break
+            with np.errstate(divide='ignore'):
+                weights = np.where(finite, np.minimum(1.0, huber_k * scale / np.abs(resid)), 0.0)
+            new_slope, new_intercept = LinearFitAccumulator().add(x, y, weights).solve()
+            change = abs(new_slope - slope) + abs(new_intercept - intercept)
+            slope, intercept = new_slope, new_intercept
+            if change <= tol * (abs(slope) + abs(intercept) + 1e-300):
+                break
+    elif method == 'ransac':
+        rng = np.random.default_rng(seed)
+        idx = np.flatnonzero(finite)
+        if idx.size > max_samples:
+            idx = rng.choice(idx, max_samples, replace=False)
+        xs, ys = x[idx], y[idx]
+        # Candidate lines through random pairs of points
+        i, j = rng.integers(0, xs.size, (2, n_trials))
+        dx = xs[j] - xs[i]
+        ok = dx != 0
+        i, j, dx = i[ok], j[ok], dx[ok]
+        cand_slope = (ys[j] - ys[i]) / dx
+        cand_intercept = ys[i] - cand_slope * xs[i]
+        # Absolute residuals of every candidate, in blocks to bound memory
+        block = max(1, 2_000_000 // xs.size)
+        med = np.empty(cand_slope.size)
+        for k in range(0, cand_slope.size, block):
+            r = np.abs(ys - (cand_slope[k:k + block, None] * xs + cand_intercept[k:k + block, None]))
+            med[k:k + block] = np.median(r, axis=1)
+        if residual_threshold is None:
+            best = np.argmin(med)
+            r = ys - (cand_slope[best] * xs + cand_intercept[best])
+            residual_threshold = 2.5 * max(_mad_scale(r), 1e-12 * (np.abs(ys).max() + 1))
+        counts = np.empty(cand_slope.size, dtype=int)
+        for k in range(0, cand_slope.size, block):
+            r = np.abs(ys - (cand_slope[k:k + block, None] * xs + cand_intercept[k:k + block, None]))
+            counts[k:k + block] = (r <= residual_threshold).sum(axis=1)
+        best = np.argmax(counts)
+        resid = np.abs(y - (cand_slope[best] * x + cand_intercept[best]))
+        weights = (finite & (resid <= residual_threshold)).astype(float)
+        slope, intercept = LinearFitAccumulator().add(x, y, weights).solve()
+    else:
+        raise ValueError(f"Unknown method {method!r}; use 'huber', 'ransac' or 'ols'.")
+    return float(slope), float(intercept), weights
+
+
+def run_timetool_calibration(delays, traces=None, edges=None, run_range=None, method='huber',
+                             subpixel=True, window=None, streaming=False, chunk_size=4096,
+                             file_path='config.yaml', key_name='tt_calibration', **fit_kwargs):
+    """
+    Calibrate the timetool from a delay scan and optionally store the result.
+
+    The timetool edge of every shot is computed in batches
+    (:func:`erf_fit_batch`, or :func:`fast_erf_fit_batch` if `subpixel` is
+    False), reading `traces` `chunk_size` rows at a time so the raw traces are
+    never held in memory. The stage delay is then fitted as a straight line
+    of the edge position, ``delay = slope * edge + intercept``, the relation
+    used by :func:`apply_timetool_correction`.
+
+    Parameters
+    ----------
+    delays : array_like, shape (N_shots,)
+        Stage delay of every shot of the calibration scan.
+    traces : array_like, shape (N_shots, N_pixels), optional
+        Raw timetool traces, e.g. an :class:`h5py.Dataset` or a list of
+        per-shot traces. Required unless `edges` is given.
+    edges : array_like, shape (N_shots,), optional
+        Precomputed edge positions (pixels). NaN marks failed edges.
+    run_range : sequence, optional
+        Runs the calibration applies to, e.g. ``[30, '.inf']``. If given, the
+        result is appended to `file_path` with :func:`add_calibration_to_yaml`.
+    method : {'huber', 'ransac', 'ols'}, optional
+        Line fit, see :func:`robust_linear_fit`. Default is 'huber'.
+    subpixel : bool, optional
+        Use the sub-pixel erf fit for the edges. Default is True.
+    window : int, optional
+        Fit window of :func:`erf_fit_batch` around the coarse edge.
+    streaming : bool, optional
+        If True, the normal equations are accumulated chunk by chunk
+        (:class:`LinearFitAccumulator`) and no per-shot edges are kept. Only
+        failed edges are rejected, so `method` must be 'ols'. Default is False.
+    chunk_size : int, optional
+        Number of shots processed at once. Default is 4096.
+    file_path : str, optional
+        YAML file to write to. Default is 'config.yaml'.
+    key_name : str, optional
+        Key of the calibration entries. Default is 'tt_calibration'.
+    **fit_kwargs
+        Passed to :func:`robust_linear_fit`.
+
+    Returns
+    -------
+    slope : float
+        Seconds (delay units) per pixel.
+    intercept : float
+        Delay at edge position 0.
+    edges : ndarray or None
+        Edge position of every shot (None when `streaming`).
+    weights : ndarray or None
+        Fit weight of every shot (None when `streaming`).
+    """
+    delays = np.asarray(delays, dtype=float).ravel()
+    if traces is None and edges is None:
+        raise ValueError("Either traces or edges must be provided.")
+    if streaming and method != 'ols':
+        raise ValueError("Streaming accumulation only supports method='ols'.")
+    n_shots = delays.size
+    if edges is not None:
+        edges = np.asarray(edges, dtype=float).ravel()
+    elif not hasattr(traces, 'shape'):
+        # Lists of per-shot traces; datasets and arrays are read in chunks as is
+        traces = np.asarray(traces)
+    if (edges if edges is not None else traces).shape[0] != n_shots:
+        raise ValueError("delays must have one entry per shot of traces/edges.")
+
+    def edge_chunks():
+        for start in range(0, n_shots, chunk_size):
+            stop = min(start + chunk_size, n_shots)
+            if edges is not None:
+                chunk = np.asarray(edges[start:stop], dtype=float)
+            elif subpixel:
+                center, _, amplitude, _, _ = erf_fit_batch(traces[start:stop], window=window,
+                                                           chunk_size=chunk_size)
+                chunk = np.where(amplitude > 0, center, np.nan)
+            else:
+                range_val, cent_pos, _, _, _ = fast_erf_fit_batch(traces[start:stop], chunk_size=chunk_size)
+                chunk = np.where(range_val > 0, cent_pos, np.nan).astype(float)
+            yield start, stop, chunk
+
+    if streaming:
+        acc = LinearFitAccumulator()
+        for start, stop, chunk in edge_chunks():
+            acc.add(chunk, delays[start:stop])
+        slope, intercept = acc.solve()
+        all_edges = weights = None
+    else:
+        all_edges = np.empty(n_shots)
+        for start, stop, chunk in edge_chunks():
+            all_edges[start:stop] = chunk
+        slope, intercept, weights = robust_linear_fit(all_edges, delays, method=method, **fit_kwargs)
+
+    if run_range is not None:
+        add_calibration_to_yaml(run_range, slope, intercept, file_path=file_path, key_name=key_name)
+    return float(slope), float(intercept), all_edges, weights
@@ -0,0 +1,219 @@
+"""Parsed experiment configuration with run-range lookups.
+
+Experiment configuration lives in a YAML file (usually ``config.yaml``) whose
+run-dependent entries are lists of mappings with a ``runs: [first, last]``
+range, for example::
+
+    data_paths:
+      - runs: [1, 50]
+        path: /sdf/data/lcls/ds/cxi/cxil1234/hdf5/smalldata/
+      - runs: [51, .inf]
+        path: /sdf/data/lcls/ds/cxi/cxil1234/scratch/hdf5/smalldata/
+
+:func:`load_config` parses the file once and caches it until the file changes
+(modification time or size). For each run-dependent key an
+:class:`RunRangeIndex` is built lazily, so looking up thousands of runs is a
+single vectorized :func:`numpy.searchsorted` instead of a linear scan per run.
+"""
+
+import copy
+import os
+
+import numpy as np
+import yaml
+
+# Cache of parsed configs: absolute path -> ExperimentConfig
+_config_cache = {}
+
+
+class RunRangeIndex:
+    """Sorted interval index over the run ranges of one configuration key.
+
+    The (inclusive) ``runs`` ranges of all entries are split into disjoint
+    elementary intervals, each labelled with the first entry (in file order)
+    that covers it. This reproduces the first-match semantics of a linear scan
+    even when ranges overlap, while lookups only need a binary search.
+
+    Parameters
+    ----------
+    entries : list of dict
+        Configuration entries, each with a ``'runs'`` item ``[first, last]``.
+        ``last`` may be ``.inf`` for an open-ended range.
+    key : str, optional
+        Name of the configuration key, used in error messages.
+    """
+
+    def __init__(self, entries, key=''):
+        self.entries = list(entries)
+        self.key = key
+        bounds = np.array([entry['runs'] for entry in self.entries], dtype=float).reshape(-1, 2)
+        if bounds.shape[0] == 0:
+            self._starts = np.array([-np.inf])
+            self._owner = np.array([-1])
+            return
+        lower = bounds[:, 0]
+        # Ranges are inclusive, so each one stops just after its upper bound
+        upper = np.nextafter(bounds[:, 1], np.inf)
+        starts = np.unique(np.concatenate([lower, upper]))
+        # Label each elementary interval [starts[k], starts[k+1]) with its first covering entry
+        covers = (lower[np.newaxis, :] <= starts[:, np.newaxis]) & (starts[:, np.newaxis] < upper[np.newaxis, :])
+        owner = np.where(covers.any(axis=1), covers.argmax(axis=1), -1)
+        # Merge neighbouring intervals with the same owner
+        keep = np.ones(owner.size, dtype=bool)
+        keep[1:] = owner[1:] != owner[:-1]
+        self._starts = starts[keep]
+        self._owner = owner[keep]
+
+    def lookup(self, run_numbers):
+        """Return the index of the entry covering each run, or -1 where none does.
+
+        Parameters
+        ----------
+        run_numbers : int or array_like
+            Run number(s) to look up.
+
+        Returns
+        -------
+        int or np.ndarray of int
+            Entry index per run, with the shape of `run_numbers`.
+        """
+        runs = np.asarray(run_numbers, dtype=float)
+        pos = np.searchsorted(self._starts, runs, side='right') - 1
+        idx = np.where(pos >= 0, self._owner[np.clip(pos, 0, None)], -1)
+        # NaN run numbers never match
+        idx = np.where(np.isnan(runs), -1, idx)
+        return int(idx) if idx.ndim == 0 else idx
+
+    def column(self, subkey):
+        """Return the values of `subkey` for every entry, as a NumPy array.
+
+        Every entry must define `subkey`; use :meth:`values` to look up runs.
+        """
+        return np.asarray([entry[subkey] for entry in self.entries])
+
+    def values(self, run_numbers, subkey):
+        """Vectorized lookup of `subkey` for an array of run numbers.
+
+        Parameters
+        ----------
+        run_numbers : array_like
+            Run numbers to look up.
+        subkey : str
+            Entry field to return, e.g. ``'path'`` or ``'slope'``.
+
+        Returns
+        -------
+        np.ndarray
+            Array of values with the shape of `run_numbers`.
+
+        Raises
+        ------
+        ValueError
+            If any run is not covered by an entry.
+        """
+        idx = np.asarray(self.lookup(run_numbers))
+        missing = idx < 0
+        if np.any(missing):
+            run = np.asarray(run_numbers)[missing].flat[0]
+            raise ValueError(f"No {self.key}/{subkey} value found for run number: {run}")
+        # Only the matched entries are read, so other entries may lack `subkey`
+        matched, inverse = np.unique(idx, return_inverse=True)
+        column = np.asarray([copy.deepcopy(self.entries[i][subkey]) for i in matched])
+        return column[inverse.reshape(idx.shape)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f"RunRangeIndex({self.key!r}, {len(self.entries)} entries)"
+
+
+class ExperimentConfig:
+    """Parsed experiment configuration file.
+
+    Use :func:`load_config` rather than instantiating directly, so the parsed
+    file and its run-range indices are shared between calls.
+
+    Parameters
+    ----------
+    config_path : str
+        Path to the YAML configuration file.
+    """
+
+    def __init__(self, config_path):
+        self.path = os.path.abspath(config_path)
+        stat = os.stat(self.path)
+        self._signature = (stat.st_mtime_ns, stat.st_size)
+        with open(self.path) as f:
+            self.data = yaml.safe_load(f)
+        self._indices = {}
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        """Return a deep copy of the value of `key`, so callers cannot alter the cache."""
+        return copy.deepcopy(self.data.get(key, default))
+
+    def index(self, key):
+        """Return the (cached) :class:`RunRangeIndex` of a run-dependent key."""
+        if key not in self._indices:
+            self._indices[key] = RunRangeIndex(self.data[key], key=key)
+        return self._indices[key]
+
+    def values_for_runs(self, run_numbers, key, subkey):
+        """Return (copies of) the `subkey` value of `key` for every run number, as a list."""
+        index = self.index(key)
+        idx = np.atleast_1d(index.lookup(run_numbers))
+        runs = np.atleast_1d(run_numbers)
+        values = []
+        for run, i in zip(runs, idx):
+            if i < 0:
+                raise ValueError(f"No {key}/{subkey} value found for run number: {run}")
+            values.append(copy.deepcopy(index.entries[i][subkey]))
+        return values
+
+    def is_current(self):
+        """True if the file on disk is unchanged since it was parsed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == self._signature
+
+    def __repr__(self):
+        return f"ExperimentConfig({self.path!r})"
+
+
+def load_config(config_path='config.yaml'):
+    """
+    Load an experiment configuration file, reusing the parsed copy when unchanged.
+
+    Parameters
+    ----------
+    config_path : str, optional
+        Path to the YAML configuration file (default is 'config.yaml').
+
+    Returns
+    -------
+    ExperimentConfig
+        The parsed configuration. It is re-parsed only when the file's
+        modification time or size changes.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the configuration file does not exist.
+    yaml.YAMLError
+        If there is an error parsing the YAML configuration file.
+    """
+    path = os.path.abspath(config_path)
+    cached = _config_cache.get(path)
+    if cached is not None and cached.is_current():
+        return cached
+    config = ExperimentConfig(path)
+    _config_cache[path] = config
+    return config
@@ -1,13 +1,22 @@
+import bisect
 import math
 import os
 import time
 import datetime
 from dateutil.relativedelta import relativedelta
 import urllib
+import codecs
+import numpy as np
 import requests
 import matplotlib.pyplot as plt
 import json
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+
+from .utils import _cache_dir
 
 #logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -25,11 +34,71 @@ class EpicsArchive(object):
     """
     Class that accesses data from the new archiver.
     Currently supports getting points, plotting points, and searching for pvs.
+
+    All requests go through one pooled ``requests.Session``, so connections to
+    the archiver are kept alive between queries. Many (PV, time window) pairs
+    can be fetched concurrently with get_points_many.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        Root URL of the archiver appliance. Defaults to the LCLS archive viewer.
+        Retrieval requests go to ``base_url + "/retrieval/data/getData.json"``.
+    max_workers : int, optional
+        Number of threads used by get_points_many, which is also the size of the
+        connection pool (default: 8).
+    timeout : float, optional
+        Timeout of each HTTP request in seconds (default: None, wait forever).
+    cache : bool, str or ArchiveCache, optional
+        Persistent local cache used by get_arrays and get_points_for_windows.
+        True uses the default cache directory, a string names a cache directory
+        and an ArchiveCache instance is used as is. With a cache, only time
+        ranges that were never fetched before go to the archiver. If the cache
+        directory cannot be created or written, a warning is logged and the
+        archiver is queried directly (default: None, no cache).
     """
 
-    def __init__(self):
+    def __init__(self, base_url=None, max_workers=8, timeout=None, cache=None):
         self._pts_cache = None
         self._pv_cache = None
+        if base_url is None:
+            self.retrieval_url = retrieval_url
+            self.mgmt_url = mgmt_url
+        else:
+            base_url = base_url.rstrip("/")
+            self.retrieval_url = base_url + "/retrieval/data/getData.json"
+            self.mgmt_url = base_url + "/mgmt/bpl/"
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=max(1, max_workers)
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        if cache is None or cache is False:
+            self.cache = None
+        elif isinstance(cache, ArchiveCache):
+            self.cache = cache
+        else:
+            try:
+                self.cache = ArchiveCache(None if cache is True else cache)
+            except OSError as err:
+                # e.g. read-only home directory on a compute node
+                logger.warning(f"Archive cache unavailable, querying the archiver directly: {err}")
+                self.cache = None
+
+    def close(self):
+        """
+        Close the pooled HTTP connections.
+        """
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def get_point(self, PV=None, when=None, value_only=False):
         """
@@ -85,6 +154,61 @@ class EpicsArchive(object):
         else:
             return (data[0]["secs"] + data[0]["nanos"] / 1e9, data[0]["val"])
 
+    def get_points_at(self, PV, times, value_only=False):
+        """
+        Get the values of PV at many points in time, like get_point for each.
+
+        times is an array of unix timestamps (or datetime objects). The range
+        spanning all of them is fetched once (through the cache when the
+        archive has one) and all instants are answered with one vectorized
+        search. As in get_point, the fetch is widened forward until a sample
+        after the last instant is found, and an instant gives no value if it is
+        before archiving started or if the next sample carries a
+        fields/cnxlostepsecs tag earlier than the instant (the PV was
+        disconnected at that time).
+
+        Returns (timestamps, values) float64 arrays with the shape of times,
+        holding the archived sample used for every instant, or only values if
+        value_only is true. Instants without a value are NaN.
+        """
+        times = np.asarray(times)
+        if times.dtype == object:
+            times = np.vectorize(
+                lambda t: t.timestamp() if isinstance(t, datetime.datetime) else t,
+                otypes=[float],
+            )(times)
+        times = times.astype(float)
+        nan = np.full(times.shape, np.nan)
+        if times.size == 0:
+            return nan if value_only else (nan, nan.copy())
+        first, last = np.min(times), np.max(times)
+        # Look a minute past the last instant for the next sample, which tells
+        # whether the PV was still connected at that instant
+        now = time.time()
+        end, incr = min(math.ceil(last) + 60.0, now), 600.0
+        t_arr, v_arr, c_arr = self._arrays_or_empty(PV, first, max(end, last))
+        while (t_arr.size == 0 or t_arr[-1] <= last) and end < now:
+            new_end = min(end + incr, now)
+            more = self._arrays_or_empty(PV, end, new_end)
+            t_arr, idx = np.unique(np.concatenate([t_arr, more[0]]), return_index=True)
+            v_arr = np.concatenate([v_arr, more[1]])[idx]
+            c_arr = np.concatenate([c_arr, more[2]])[idx]
+            end, incr = new_end, 10 * incr
+
+        idx = np.searchsorted(t_arr, times, side="right") - 1
+        valid = idx >= 0
+        # The next sample may say the connection was lost before the instant
+        nxt = idx + 1
+        has_next = nxt < t_arr.size
+        lost = np.full(times.shape, np.nan)
+        lost[has_next] = c_arr[nxt[has_next]]
+        valid &= ~(lost < times)
+        safe = np.clip(idx, 0, None)
+        values = np.where(valid, v_arr[safe] if t_arr.size else nan, np.nan)
+        if value_only:
+            return values
+        return np.where(valid, t_arr[safe] if t_arr.size else nan, np.nan), values
+
     def get_points(
         self,
         PV=None,
@@ -95,16 +219,41 @@ class EpicsArchive(object):
         two_lists=False,
         raw=False,
         useMS=False,
+        arrays=False,
     ):
         """
         Get points from the archive, returning them as a list of tuples.
         You may set two_lists=True to get a list of positions and a list of times instead of a single list of tuples.
         You may set raw=True to get times as seconds from the epoch instead of as strings.
+        You may set arrays=True to get (times, values) as float64 numpy arrays,
+        with times in seconds from the epoch. The response is then parsed as it
+        streams in, without building Python objects for every point, which is
+        much faster for long histories of scalar PVs.
+
+        The points of the last list query are kept, so calling get_points()
+        without a PV returns them again.
         """
+        return self._get_points(PV, start, end, unit, chunk, two_lists, raw, useMS, arrays, remember=True)
+
+    def _get_points(self, PV, start, end, unit="days", chunk=False, two_lists=False, raw=False,
+                    useMS=False, arrays=False, remember=False):
+        """get_points; only updates the cache used by get_points(PV=None) if `remember`."""
         if PV is None:
             pts, _ = self._check_cache()
             if pts is None:
                 return
+            if arrays:
+                return tuple(np.array(x, dtype=float) for x in self._pts_to_arrays(pts))
+        elif arrays:
+            json_start, json_end = self._json_args(start, end, unit)
+            if not valid_date_arrays(json_start, json_end):
+                print("Invalid dates! Start must be BEFORE end!")
+                return np.empty(0), np.empty(0)
+            result = self._get_arrays(PV, json_start, json_end, chunk, useMS)
+            if isinstance(result, int):  # Handle http error code
+                logger.warning(f"Not able to retrieve PV {PV} (http code {result}).")
+                return np.empty(0), np.empty(0)
+            return result[0], result[1]
         else:
             json_start, json_end = self._json_args(start, end, unit)
             if valid_date_arrays(json_start, json_end):
@@ -115,8 +264,9 @@ class EpicsArchive(object):
                     )
                     return []
                 pts = self._json_to_pts(json_obj, useMS)
-                self._pts_cache = pts
-                self._pv_cache = PV
+                if remember:
+                    self._pts_cache = pts
+                    self._pv_cache = PV
             else:
                 print("Invalid dates! Start must be BEFORE end!")
                 pts = []
@@ -127,6 +277,120 @@ class EpicsArchive(object):
         else:
             return pts
 
+    def get_points_many(self, queries, max_workers=None, **kwargs):
+        """
+        Fetch many (PV, start, end) windows concurrently.
+
+        queries is an iterable of (PV, start, end) tuples. Remaining keyword
+        arguments (unit, two_lists, raw, ...) are passed to get_points for every
+        query. At most max_workers requests (default: self.max_workers) are in
+        flight at once, all sharing the pooled session.
+
+        Returns a list with the result of get_points for each query, in the same
+        order as queries. The queries run in parallel threads, so they do not
+        update the points returned by get_points() without a PV.
+        """
+        return self._map_concurrent(
+            lambda query: self._get_points(*query, **kwargs), queries, max_workers
+        )
+
+    def get_arrays(self, PV, start, end):
+        """
+        Get the archived samples of PV between two unix timestamps as arrays.
+
+        Like the archiver itself, the result starts with the last sample at or
+        before start. When the archive has a cache, only the parts of
+        [start, end] that were never fetched before are requested from the
+        archiver; if it cannot be reached, the cached samples are returned with
+        a warning.
+
+        Returns (times, values, cnxlost) float64 arrays sorted by time. times
+        include the nanoseconds, and cnxlost holds the cnxlostepsecs field of
+        each sample (the time the connection was lost, NaN if absent).
+        """
+        # The archiver URL has whole-second resolution
+        start, end = math.floor(start), math.ceil(end)
+        if end <= start:
+            end = start + 1
+        if self.cache is None:
+            return self._fetch_arrays(PV, start, end)
+        with self.cache.lock(PV):
+            for gap_start, gap_end in self.cache.missing(PV, start, end):
+                try:
+                    arrays = self._fetch_arrays(PV, gap_start, gap_end)
+                except requests.RequestException as err:
+                    logger.warning(f"Archiver unreachable, using cached data for {PV}: {err}")
+                    break
+                if arrays is not None:
+                    self.cache.add(PV, gap_start, gap_end, *arrays)
+            return self.cache.get(PV, start, end)
+
+    def get_points_for_windows(self, PVs, windows, max_gap=300.0):
+        """
+        Fetch one or more PVs over many time windows with as few queries as possible.
+
+        windows is an iterable of (start, end) unix timestamps, e.g. the first
+        and last unixTime of each run. Windows that overlap or are separated by
+        at most max_gap seconds are merged, so back-to-back runs cost a single
+        query per PV. All (PV, merged window) queries are fetched concurrently,
+        through the cache if the archive has one.
+
+        Returns a dictionary mapping each PV to a (times, values) pair of
+        float64 arrays, sorted by time and without duplicate timestamps. Use
+        previous_value to evaluate them at arbitrary times.
+        """
+        if isinstance(PVs, str):
+            PVs = [PVs]
+        merged = merge_windows(windows, max_gap)
+        queries = [(pv, start, end) for pv in PVs for start, end in merged]
+        results = self._map_concurrent(lambda query: self.get_arrays(*query), queries)
+        arrays = {}
+        for i, pv in enumerate(PVs):
+            parts = [result for result in results[i * len(merged):(i + 1) * len(merged)]
+                     if result is not None]  # None on http errors
+            times = np.concatenate([p[0] for p in parts]) if parts else np.empty(0)
+            values = np.concatenate([p[1] for p in parts]) if parts else np.empty(0)
+            # Each response starts with the last sample before its window, which
+            # may repeat a sample of the previous window: sort and deduplicate.
+            times, first = np.unique(times, return_index=True)
+            arrays[pv] = (times, values[first])
+        return arrays
+
+    def _arrays_or_empty(self, PV, start, end):
+        """
+        get_arrays, with empty arrays instead of None on http errors.
+        """
+        result = self.get_arrays(PV, start, end)
+        if result is None:
+            return np.empty(0), np.empty(0), np.empty(0)
+        return result
+
+    def _map_concurrent(self, func, items, max_workers=None):
+        """
+        Apply func to every item on up to max_workers threads, keeping order.
+        """
+        items = list(items)
+        if not items:
+            return []
+        max_workers = max_workers or self.max_workers
+        if max_workers <= 1 or len(items) == 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+            futures = [pool.submit(func, item) for item in items]
+            return [future.result() for future in futures]
+
+    def _fetch_arrays(self, PV, start, end):
+        """
+        Query the archiver for PV between two whole-second unix timestamps.
+        Returns (times, values, cnxlost) arrays, or None on http errors.
+        """
+        json_start, json_end = self._json_args(start, end, "seconds")
+        result = self._get_arrays(PV, json_start, json_end, False, True)
+        if isinstance(result, int):  # Handle http error code
+            logger.warning(f"Not able to retrieve PV {PV} (http code {result}).")
+            return None
+        return result
+
     def plot_points(self, PV=None, start=5, end=None, unit="days", chunk=False):
         """
         Use matplotlib to plot points from the archive.
@@ -165,9 +429,9 @@ class EpicsArchive(object):
         If do_print=True, prints the PVs nicely on your screen.
         If do_print=False, returns the list of matches.
         """
-        url = mgmt_url + "getAllPVs"
+        url = self.mgmt_url + "getAllPVs"
         url += pv_arg.format(urllib.parse.quote(glob, safe=""))
-        pvs = url_query(url)
+        pvs = url_query(url, self._session, self.timeout)
         if do_print:
             success = list_print(pvs)
             if not success:
@@ -225,20 +489,39 @@ class EpicsArchive(object):
 
         return json_start, json_end
 
-    def _get_json(self, PV, start, end, chunk):
+    def _data_url(self, PV, start, end, chunk):
         """
-        Do a url query of the new archiver. Return the json result unmodified.
+        Build the retrieval URL of PV between two date arrays.
         """
-        url = retrieval_url
+        url = self.retrieval_url
         url += pv_arg.format(PV)
         url += url_arg.format("from", date_format(*start))
         url += url_arg.format("to", date_format(*end))
         if not chunk:
             url += url_flag.format("donotchunk")
         logger.debug(f"URL: {url}")
-        data = url_query(url)
+        return url
+
+    def _get_json(self, PV, start, end, chunk):
+        """
+        Do a url query of the new archiver. Return the json result unmodified.
+        """
+        url = self._data_url(PV, start, end, chunk)
+        data = url_query(url, self._session, self.timeout)
         return data
 
+    def _get_arrays(self, PV, start, end, chunk, useMS):
+        """
+        Do a url query of the new archiver, streaming the response into
+        (times, values, cnxlost) arrays with json_to_arrays.
+        Returns the http status code on failure.
+        """
+        url = self._data_url(PV, start, end, chunk)
+        with self._session.get(url, timeout=self.timeout, stream=True) as req:
+            if req.status_code != 200:
+                return req.status_code
+            return json_to_arrays(req.iter_content(chunk_size=_stream_chunk_size), useMS)
+
     def _json_to_pts(self, json_obj, useMS):
         """
         Interprets a data retrieval json object as an array of tuple points.
@@ -260,6 +543,192 @@ class EpicsArchive(object):
         return t_array, val_array
 
 
+
+class ArchiveCache(object):
+    """
+    Persistent local cache of archived PV samples, one HDF5 file per PV.
+
+    Every file stores the samples fetched so far (times, values and the
+    cnxlostepsecs field) and the list of time intervals they cover. An interval
+    [a, b] is covered when every sample in it is stored, together with the
+    last sample before a. New segments are merged into the stored samples and
+    overlapping or touching intervals are joined, so any later request only
+    needs the missing sub-ranges from the archiver, and fully covered requests
+    work offline.
+
+    Archived history only stops changing once the archiver has ingested it, so
+    coverage is only recorded up to settle_time seconds before now.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Directory of the cache files. Defaults to
+        ``~/.cache/xrayscatteringtools/epics`` (see ``XRAYSCATTERINGTOOLS_CACHE``).
+    settle_time : float, optional
+        Age in seconds after which archived data is considered final
+        (default: 3600).
+    chunk_size : int, optional
+        HDF5 chunk length of the sample datasets (default: 4096).
+
+    Raises
+    ------
+    OSError
+        If the cache directory cannot be created or is not writable.
+    """
+
+    def __init__(self, cache_dir=None, settle_time=3600.0, chunk_size=4096):
+        if cache_dir is None:
+            cache_dir = _cache_dir("epics")
+        self.cache_dir = os.fspath(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if not os.access(self.cache_dir, os.W_OK):
+            raise PermissionError(f"Cache directory {self.cache_dir} is not writable.")
+        self.settle_time = settle_time
+        self.chunk_size = chunk_size
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def path(self, PV):
+        """
+        Return the cache file of PV.
+        """
+        return os.path.join(self.cache_dir, urllib.parse.quote(PV, safe="") + ".h5")
+
+    def lock(self, PV):
+        """
+        Return the lock serializing updates of PV within this process.
+        """
+        with self._locks_lock:
+            return self._locks.setdefault(PV, threading.Lock())
+
+    def load(self, PV):
+        """
+        Return the cached (times, values, cnxlost, covered) arrays of PV.
+        covered is an (n, 2) array of disjoint, sorted intervals.
+        """
+        try:
+            with h5py.File(self.path(PV), "r") as f:
+                return tuple(f[name][()] for name in ("times", "values", "cnxlost", "covered"))
+        except FileNotFoundError:
+            empty = np.empty(0)
+            return empty, empty, empty, np.empty((0, 2))
+
+    def covered(self, PV):
+        """
+        Return the (n, 2) array of intervals covered by the cache of PV.
+        """
+        try:
+            with h5py.File(self.path(PV), "r") as f:
+                return f["covered"][()]
+        except FileNotFoundError:
+            return np.empty((0, 2))
+
+    def missing(self, PV, start, end):
+        """
+        Return the sub-ranges of [start, end] not covered by the cache, as a
+        list of (start, end) tuples.
+        """
+        gaps = []
+        for lo, hi in self.covered(PV):
+            if hi < start:
+                continue
+            if lo > end:
+                break
+            if lo > start:
+                gaps.append((start, lo))
+            start = max(start, hi)
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+    def get(self, PV, start, end):
+        """
+        Return the cached (times, values, cnxlost) samples of PV from the last
+        sample at or before start up to end.
+
+        The bounds are found by binary search on the stored times, so only
+        the requested samples are read from disk.
+        """
+        try:
+            f = h5py.File(self.path(PV), "r")
+        except FileNotFoundError:
+            empty = np.empty(0)
+            return empty, empty, empty
+        with f:
+            times = f["times"]
+            first = max(bisect.bisect_right(times, start) - 1, 0)
+            last = bisect.bisect_right(times, end, lo=first)
+            return tuple(f[name][first:last] for name in ("times", "values", "cnxlost"))
+
+    def add(self, PV, start, end, times, values, cnxlost=None):
+        """
+        Merge samples fetched for [start, end] into the cache of PV.
+
+        Samples with the same timestamp as cached ones replace them, and
+        [start, end] (cut at settle_time before now) is added to the covered
+        intervals. The datasets are resizable: samples newer than all cached
+        ones are appended, otherwise only the cached samples from the first
+        new timestamp on are rewritten. The covered intervals are written
+        last, so an interrupted update never marks missing samples as cached.
+        """
+        times = np.asarray(times, dtype=float)
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        values = np.asarray(values, dtype=float)[order]
+        if cnxlost is None:
+            cnxlost = np.full(times.shape, np.nan)
+        cnxlost = np.asarray(cnxlost, dtype=float)[order]
+
+        with h5py.File(self.path(PV), "a") as f:
+            if "times" not in f:
+                f.attrs["pv"] = PV
+                for name in ("times", "values", "cnxlost"):
+                    f.create_dataset(name, shape=(0,), maxshape=(None,), dtype=float,
+                                     chunks=(self.chunk_size,))
+                f.create_dataset("covered", shape=(0, 2), maxshape=(None, 2), dtype=float,
+                                 chunks=True)
+            stored = f["times"]
+            n_stored = stored.shape[0]
+            if times.size:
+                # Cached samples from the first new timestamp on are merged in memory
+                tail = bisect.bisect_left(stored, times[0]) if n_stored else 0
+                merged = []
+                for name, new in (("times", times), ("values", values), ("cnxlost", cnxlost)):
+                    merged.append(np.concatenate([f[name][tail:], new]))
+                order = np.argsort(merged[0], kind="stable")
+                merged_times = merged[0][order]
+                # Keep the last (newest) of every run of equal timestamps
+                keep = np.ones(merged_times.size, dtype=bool)
+                keep[:-1] = merged_times[1:] != merged_times[:-1]
+                order = order[keep]
+                for name, column in zip(("times", "values", "cnxlost"), merged):
+                    dset = f[name]
+                    dset.resize((tail + order.size,))
+                    dset[tail:] = column[order]
+
+            end = min(end, time.time() - self.settle_time)
+            if end > start:
+                covered = f["covered"]
+                intervals = merge_windows(list(map(tuple, covered[()])) + [(start, end)])
+                covered.resize((len(intervals), 2))
+                covered[:] = np.array(intervals, dtype=float).reshape(-1, 2)
+
+    def clear(self, PV=None):
+        """
+        Delete the cache of PV, or of every PV if PV is None.
+        """
+        if PV is not None:
+            paths = [self.path(PV)]
+        else:
+            paths = [os.path.join(self.cache_dir, name)
+                     for name in os.listdir(self.cache_dir) if name.endswith(".h5")]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
 days_map = {}
 days_map.update({x: 365 for x in ("years", "year", "yr", "y")})
 days_map.update({x: 365.0 / 12 for x in ("months", "month", "mon")})
@@ -271,11 +740,12 @@ days_map.update({x: 1.0 / 24 / 60 / 60 for x in ("seconds", "secs", "sec", "s")}
 days_map.update({x: 1.0 / 24 / 60 / 60 / 1000 for x in ("milliseconds", "msec", "ms")})
 
 
-def url_query(url):
+def url_query(url, session=None, timeout=None):
     """
-    Makes the URL request.
+    Makes the URL request, through session (a requests.Session) if given.
+    Returns the decoded json, or the http status code on failure.
     """
-    req = requests.get(url)
+    req = (session or requests).get(url, timeout=timeout)
     if req.status_code != 200:
         return req.status_code
     return req.json()
@@ -337,6 +807,147 @@ def valid_date_arrays(start, end):
     return False
 
 
+def merge_windows(windows, max_gap=0.0):
+    """
+    Merge (start, end) time windows that overlap or are at most max_gap apart.
+
+    Returns a list of (start, end) tuples sorted by start time.
+    """
+    merged = []
+    for start, end in sorted((float(s), float(e)) for s, e in windows):
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def previous_value(times, values, query_times):
+    """
+    Evaluate a sampled PV at query_times using the most recent sample.
+
+    This matches scipy's interp1d(kind='previous', fill_value='extrapolate'):
+    times before the first sample give NaN and times after the last sample
+    give the last value. times must be sorted. The lookup is a single
+    vectorized np.searchsorted.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    query_times = np.asarray(query_times, dtype=float)
+    if times.size == 0:
+        return np.full(query_times.shape, np.nan)
+    idx = np.searchsorted(times, query_times, side="right") - 1
+    out = values[np.clip(idx, 0, None)]
+    return np.where(idx < 0, np.nan, out)
+
+
+_stream_chunk_size = 1 << 16
+_json_whitespace = " \t\n\r"
+
+
+def json_to_arrays(chunks, useMS=True):
+    """
+    Parse an archiver getData.json response into numpy arrays.
+
+    chunks is the response body as bytes or str, or an iterable of bytes/str
+    pieces (e.g. requests' iter_content). The body is parsed incrementally:
+    the complete samples of each piece are decoded in one call of the json
+    parser and copied into float64 arrays that grow geometrically, so only
+    one piece is ever held as Python objects. Only the first PV of the
+    response is read.
+
+    Returns (times, values, cnxlost) float64 arrays. times are seconds since
+    the epoch (including nanoseconds if useMS), and cnxlost holds the
+    cnxlostepsecs field of each sample, NaN where absent. Values that are not
+    scalar numbers raise a ValueError.
+    """
+    if isinstance(chunks, (bytes, str)):
+        chunks = [chunks]
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    arrays = [np.empty(1024) for _ in range(3)]  # times, values, cnxlost
+    n = 0
+    buf, pos = "", 0
+    in_data = False
+    chunks = iter(chunks)
+    exhausted = False
+    while not exhausted:
+        text = next(chunks, None)
+        if text is None:
+            text = decoder.decode(b"", final=True)
+            exhausted = True
+        elif isinstance(text, bytes):
+            text = decoder.decode(text)
+        buf = buf[pos:] + text
+        pos = 0
+        if not in_data:
+            # Skip to the opening bracket of the first "data" array
+            key = buf.find('"data"')
+            bracket = buf.find("[", key) if key >= 0 else -1
+            if bracket < 0:
+                pos = max(0, len(buf) - 16)  # the key may be split between pieces
+                continue
+            pos = bracket + 1
+            in_data = True
+        samples, pos, done = _decode_samples(buf, pos)
+        if samples:
+            m = len(samples)
+            if n + m > arrays[0].size:
+                arrays = [np.resize(a, max(2 * arrays[0].size, n + m)) for a in arrays]
+            if useMS:
+                arrays[0][n:n + m] = [x["secs"] + x["nanos"] / 1e9 for x in samples]
+            else:
+                arrays[0][n:n + m] = [x["secs"] for x in samples]
+            try:
+                arrays[1][n:n + m] = [x["val"] for x in samples]
+            except (TypeError, ValueError):
+                raise ValueError("Non-scalar PV values cannot be parsed into an array.")
+            arrays[2][n:n + m] = [
+                float(x["fields"].get("cnxlostepsecs", "nan")) if "fields" in x else np.nan
+                for x in samples
+            ]
+            n += m
+        if done:
+            break
+    else:
+        if in_data and buf[pos:].strip():
+            raise ValueError("Truncated archiver response.")
+    return tuple(a[:n].copy() for a in arrays)
+
+
+def _decode_samples(buf, pos):
+    """
+    Decode the complete samples of a data array in buf, starting at pos.
+    Returns (samples, pos, done): the decoded list, the position of the first
+    unparsed character and whether the closing bracket of the array was reached.
+    """
+    pos = _skip_separators(buf, pos)
+    end = len(buf)
+    while pos < end and buf[pos] != "]":
+        # Decode everything up to the last closing brace that ends a sample, in
+        # one call of the C parser. A brace that closes a nested "fields" object
+        # leaves the last sample incomplete, so fall back to the previous one.
+        end = buf.rfind("}", pos, end)
+        if end < 0:
+            break
+        try:
+            samples = json.loads("[" + buf[pos:end + 1] + "]")
+        except json.JSONDecodeError:
+            continue
+        pos = _skip_separators(buf, end + 1)
+        return samples, pos, pos < len(buf) and buf[pos] == "]"
+    return [], pos, pos < len(buf) and buf[pos] == "]"
+
+
+def _skip_separators(buf, pos):
+    """
+    Return the position of the first character at or after pos that is
+    neither whitespace nor a comma.
+    """
+    while pos < len(buf) and (buf[pos] in _json_whitespace or buf[pos] == ","):
+        pos += 1
+    return pos
+
+
 def pts_string_time(pts):
     """
     Convert array of points of the form (unix timestamp, value) to the form
@@ -0,0 +1,295 @@
+"""Cached layout index of HDF5 files.
+
+Walking a smalldata file with ``h5py.File.visit`` touches every object header,
+which takes seconds for files with thousands of datasets on a network
+filesystem. :func:`get_layout` walks a file once, records the path, shape,
+dtype, chunking and compression of every node, and caches the result on disk
+keyed by the file's modification time and size. Later lookups, including key
+discovery across a whole experiment with :func:`find_keys`, only stat the file
+and read a small JSON document.
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import h5py
+
+from .utils import _cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached JSON layout changes
+_LAYOUT_VERSION = 1
+
+# In-process LRU cache: absolute path -> H5Layout
+_memory_cache = OrderedDict()
+_MEMORY_CACHE_SIZE = 256
+
+
+class H5Layout:
+    """Layout of an HDF5 file: every group and dataset with its metadata.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the file the layout describes.
+    nodes : dict
+        Mapping of node path to a metadata dict, in ``visit`` order. Groups have
+        ``{'kind': 'group'}``; datasets have ``'kind': 'dataset'`` plus ``'shape'``,
+        ``'dtype'``, ``'chunks'``, ``'compression'`` and ``'compression_opts'``.
+    mtime_ns : int, optional
+        Modification time of the file when the layout was built.
+    size : int, optional
+        Size of the file in bytes when the layout was built.
+
+    Examples
+    --------
+    >>> layout = get_layout('/sdf/data/.../cxilv4418_Run0042.h5')
+    >>> layout.glob('jungfrau4M/azav*')
+    ['jungfrau4M/azav_azav', 'jungfrau4M/azav_qbin']
+    >>> layout['jungfrau4M/azav_azav']['shape']
+    (12000, 1, 500)
+    """
+
+    def __init__(self, filename, nodes, mtime_ns=None, size=None):
+        self.filename = filename
+        self.nodes = nodes
+        self.mtime_ns = mtime_ns
+        self.size = size
+
+    @classmethod
+    def from_file(cls, f):
+        """Build the layout of an open :class:`h5py.File` (or group) by visiting every node.
+
+        For a group, node paths are relative to the group.
+        """
+        nodes = {}
+
+        def _record(name, item):
+            if isinstance(item, h5py.Dataset):
+                nodes[name] = {
+                    'kind': 'dataset',
+                    'shape': tuple(item.shape) if item.shape is not None else None,
+                    'dtype': str(item.dtype),
+                    'chunks': item.chunks,
+                    'compression': item.compression,
+                    'compression_opts': item.compression_opts,
+                }
+            else:
+                nodes[name] = {'kind': 'group'}
+        f.visititems(_record)
+        return cls(f.file.filename, nodes)
+
+    @property
+    def datasets(self):
+        """Dictionary of dataset path to metadata, in ``visit`` order."""
+        return {name: info for name, info in self.nodes.items() if info['kind'] == 'dataset'}
+
+    @property
+    def groups(self):
+        """List of group paths, in ``visit`` order."""
+        return [name for name, info in self.nodes.items() if info['kind'] == 'group']
+
+    def glob(self, pattern, datasets_only=True):
+        """Return node paths matching a shell-style pattern.
+
+        Parameters
+        ----------
+        pattern : str
+            Pattern matched with :func:`fnmatch.fnmatchcase`, e.g. ``'Sums/*'``
+            or ``'*azav*'``. Note that ``*`` also matches ``/``.
+        datasets_only : bool, optional
+            If True (default), only datasets are returned.
+
+        Returns
+        -------
+        list of str
+        """
+        return [
+            name for name, info in self.nodes.items()
+            if (not datasets_only or info['kind'] == 'dataset') and fnmatch.fnmatchcase(name, pattern)
+        ]
+
+    def __getitem__(self, name):
+        return self.nodes[name.lstrip('/')]
+
+    def __contains__(self, name):
+        return name.lstrip('/') in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def to_dict(self):
+        nodes = {}
+        for name, info in self.nodes.items():
+            info = dict(info)
+            for field in ('shape', 'chunks'):
+                if info.get(field) is not None:
+                    info[field] = list(info[field])
+            nodes[name] = info
+        return {
+            'version': _LAYOUT_VERSION,
+            'filename': self.filename,
+            'mtime_ns': self.mtime_ns,
+            'size': self.size,
+            'nodes': nodes,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        nodes = {}
+        for name, info in d['nodes'].items():
+            for field in ('shape', 'chunks'):
+                if info.get(field) is not None:
+                    info[field] = tuple(info[field])
+            # JSON turns tuple filter options (e.g. szip) into lists
+            if isinstance(info.get('compression_opts'), list):
+                info['compression_opts'] = tuple(info['compression_opts'])
+            nodes[name] = info
+        return cls(d['filename'], nodes, mtime_ns=d['mtime_ns'], size=d['size'])
+
+    def __repr__(self):
+        return f"H5Layout({self.filename!r}, {len(self.datasets)} datasets, {len(self.groups)} groups)"
+
+
+def _cache_file(path, cache_dir):
+    key = hashlib.sha1(path.encode()).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _load_cached(path, stat, cache_dir):
+    """Return the cached layout of `path` if it matches `stat`, else None."""
+    cached = _memory_cache.get(path)
+    if cached is not None and (cached.mtime_ns, cached.size) == (stat.st_mtime_ns, stat.st_size):
+        _memory_cache.move_to_end(path)
+        return cached
+    if cache_dir is None:
+        return None
+    try:
+        with open(_cache_file(path, cache_dir)) as fp:
+            d = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if d.get('version') != _LAYOUT_VERSION or (d['mtime_ns'], d['size']) != (stat.st_mtime_ns, stat.st_size):
+        return None
+    layout = H5Layout.from_dict(d)
+    _remember(layout)
+    return layout
+
+
+def _remember(layout):
+    """Keep `layout` in the in-process cache, evicting the least recently used."""
+    _memory_cache[layout.filename] = layout
+    _memory_cache.move_to_end(layout.filename)
+    while len(_memory_cache) > _MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _store_cached(layout, cache_dir):
+    _remember(layout)
+    if cache_dir is None:
+        return
+    target = _cache_file(layout.filename, cache_dir)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w') as fp:
+            json.dump(layout.to_dict(), fp)
+        os.replace(tmp, target)  # Atomic, so concurrent readers never see a partial file
+    except OSError as err:
+        logger.debug("Could not write layout cache %s: %s", target, err)
+
+
+def get_layout(f, cache_dir=None, use_cache=True, persist=True):
+    """
+    Return the layout index of an HDF5 file, building and caching it if needed.
+
+    Parameters
+    ----------
+    f : str, os.PathLike, h5py.File or h5py.Group
+        Path of the file, or an open file. Open files are only served from (and
+        stored in) the cache when opened read-only; otherwise the layout is
+        rebuilt from the open handle. Groups are always walked, without the
+        cache, and give paths relative to the group.
+    cache_dir : str, optional
+        Directory for the on-disk cache. Defaults to
+        ``~/.cache/xrayscatteringtools/h5layout`` (see ``XRAYSCATTERINGTOOLS_CACHE``).
+    use_cache : bool, optional
+        If False, always walk the file and do not touch the cache (default: True).
+    persist : bool, optional
+        If False, only the in-process cache (the 256 most recently used files)
+        is used and nothing is written to disk (default: True).
+
+    Returns
+    -------
+    H5Layout
+        The layout of the file.
+
+    Notes
+    -----
+    The cache is keyed by the absolute path of the file and invalidated when its
+    modification time or size changes.
+    """
+    if isinstance(f, h5py.File):
+        path = os.path.abspath(f.filename)
+        if not use_cache or f.mode != 'r':
+            return H5Layout.from_file(f)
+    elif isinstance(f, h5py.Group):
+        return H5Layout.from_file(f)
+    else:
+        path = os.path.abspath(os.fspath(f))
+
+    stat = os.stat(path)
+    if use_cache:
+        if not persist:
+            cache_dir = None
+        elif cache_dir is None:
+            try:
+                cache_dir = str(_cache_dir('h5layout'))
+            except OSError:
+                cache_dir = None
+        layout = _load_cached(path, stat, cache_dir)
+        if layout is not None:
+            return layout
+
+    if isinstance(f, h5py.File):
+        layout = H5Layout.from_file(f)
+    else:
+        with h5py.File(path, 'r') as h5:
+            layout = H5Layout.from_file(h5)
+    layout.filename, layout.mtime_ns, layout.size = path, stat.st_mtime_ns, stat.st_size
+    if use_cache:
+        _store_cached(layout, cache_dir)
+    return layout
+
+
+def find_keys(filenames, pattern='*', cache_dir=None):
+    """
+    Find dataset keys matching a pattern across many HDF5 files.
+
+    Parameters
+    ----------
+    filenames : str or iterable of str
+        Files to search, e.g. every run file of an experiment.
+    pattern : str, optional
+        Shell-style pattern for the dataset paths (default: ``'*'``, all datasets).
+    cache_dir : str, optional
+        Directory for the on-disk layout cache (see :func:`get_layout`).
+
+    Returns
+    -------
+    dict
+        Mapping of each filename to the list of matching dataset paths.
+    """
+    if isinstance(filenames, (str, os.PathLike)):
+        filenames = [filenames]
+    return {
+        os.fspath(filename): get_layout(filename, cache_dir=cache_dir).glob(pattern)
+        for filename in filenames
+    }
@@ -1,12 +1,18 @@
+import copy
+import hashlib
+import queue
+import threading
 import numpy as np
 import h5py
-from .epicsArch import EpicsArchive
-from scipy.interpolate import interp1d
-import yaml
+from .epicsArch import EpicsArchive, previous_value
+from .iostats import IOStats
+from .h5layout import get_layout
+from .config import load_config
 from .utils import element_number_to_symbol
 from numbers import Number
 
-def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check, verbose=False, archPVs=None):
+def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check, verbose=False, archPVs=None,
+                return_stats=False, measure_decompression=False, archive_cache=True):
     """
     Combine data from multiple experimental runs into a single consolidated dataset.
 
@@ -27,9 +33,12 @@ def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check
         Keys in the data files whose arrays should be concatenated along the first axis.
     keys_to_sum : list of str
         Keys in the data files whose arrays should be summed element-wise across runs.
+        The sum is accumulated as each file is read, so memory use does not grow with
+        the number of runs.
     keys_to_check : list of str
-        Keys for which consistency across runs should be verified. If any discrepancies
-        are found, a warning is printed.
+        Keys for which consistency across runs should be verified. Each run's array is
+        compared to the first run's through a content hash (shape, dtype and bytes).
+        If any discrepancies are found, a warning is printed.
     verbose : bool, optional
         If True, prints detailed information during data loading (default: False).
     archPVs : str or list of str, optional
@@ -37,6 +46,20 @@ def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check
         run timestamps. Each PV is stored in `data_combined` using the PV name as
         the key. For this to work, the 'unixTime' key must be present in each run's data.
         Note: this will only work on machines with access to the EPICS archive. (default: None).
+    return_stats : bool, optional
+        If True, also return an :class:`~xrayscatteringtools.iostats.IOStats` object with
+        per-file and per-key bytes read, read time, MB/s and peak RSS (default: False).
+        The same information is always reported through the
+        ``xrayscatteringtools.iostats`` logger (INFO per file, DEBUG per key).
+    measure_decompression : bool, optional
+        If True, compressed datasets are also re-read chunk by chunk without filters
+        and once more with filters to separate filesystem time from decompression
+        time. This reads compressed data three times (default: False).
+    archive_cache : bool, str or ArchiveCache, optional
+        Local cache used for `archPVs`, passed to
+        :class:`~xrayscatteringtools.epicsArch.EpicsArchive` as ``cache``. True uses
+        the default cache directory, a string names a cache directory and False
+        queries the archiver every time (default: True).
 
     Returns
     -------
@@ -47,6 +70,9 @@ def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check
         - Checked keys from `keys_to_check`
         - `'run_indicator'`: an array indicating which run each data point belongs to
         - One key per PV in `archPVs`, containing the interpolated archive data.
+    stats : IOStats
+        Only returned if `return_stats` is True. Use ``stats.summary()`` for a table
+        and ``stats.to_chrome_trace(path)`` for a timeline viewable in chrome://tracing.
 
     Raises
     ------
@@ -68,9 +94,203 @@ def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check
     ```
     """
     from tqdm.auto import tqdm # Lazy
+    runNumbers, folders = _normalize_runs_and_folders(runNumbers, folders)
+
+    accumulator = _RunAccumulator(keys_to_combine, keys_to_sum, keys_to_check)
+    stats = IOStats(measure_decompression=measure_decompression)
+    for i, runNumber in enumerate(tqdm(runNumbers, desc="Loading Runs")):
+        filename = _run_filename(folders[i], runNumber)
+        print('Loading: ' + filename)
+        file_stats = stats.open_file(filename, run=runNumber)
+        with h5py.File(filename, 'r') as f:
+            # Print all keys and shapes without loading data
+            if verbose:
+                for name, info in get_layout(f, persist=False).datasets.items():
+                    print(f"  {name}  {info['shape']}  {info['dtype']}")
+            for key in accumulator.add_file(f, runNumber, verbose=verbose, file_stats=file_stats):
+                print(f'Problem with key {key} in run {runNumber}')
+        file_stats.close()
+
+    data_combined = accumulator.result(progress=tqdm)
+    # Import EPICS PV data from the archive if requested
+    if archPVs is not None:
+        _add_archive_pvs(data_combined, runNumbers, archPVs, cache=archive_cache)
+    print('Loaded Data')
+    if return_stats:
+        return data_combined, stats
+    return data_combined
+
+def _read(dset, file_stats=None, out=None):
+    """Read a whole dataset, recording it in `file_stats` when instrumentation is on."""
+    if file_stats is not None:
+        return file_stats.read(dset, out=out)
+    if out is None:
+        return dset[()]
+    dset.read_direct(out)
+    return out
+
+class _RunAccumulator:
+    """Streaming per-run reductions shared by :func:`combineRuns` and its parallel variant.
+
+    Per-event keys are collected run by run, `keys_to_sum` are accumulated into a
+    single running sum, and `keys_to_check` are reduced to one reference array plus
+    a content hash per run. Two accumulators holding consecutive runs can be merged,
+    which is how partial results from worker processes are combined.
+    """
+
+    def __init__(self, keys_to_combine, keys_to_sum, keys_to_check):
+        self.keys_to_combine = list(keys_to_combine)
+        self.keys_to_sum = list(keys_to_sum)
+        self.keys_to_check = list(keys_to_check)
+        self.runs = []
+        self.combine_chunks = {key: [] for key in self.keys_to_combine}
+        self.run_indicator_chunks = []
+        self.sums = {}
+        self.check_refs = {}
+        self.check_digests = {key: [] for key in self.keys_to_check}  # [(run, digest), ...]
+        self._sum_buffers = {}
+
+    def add_file(self, f, runNumber, verbose=False, file_stats=None):
+        """Read the needed keys of one open run file.
+
+        If `file_stats` (a :class:`~xrayscatteringtools.iostats.FileReadStats`) is
+        given, every dataset read is timed and recorded in it.
+
+        Returns
+        -------
+        list of str
+            Keys in `keys_to_check` whose content differs from the first run.
+        """
+        self.runs.append(runNumber)
+        # Only load the keys we need
+        for key in self.keys_to_combine:
+            self.combine_chunks[key].append(np.squeeze(_read(f[key], file_stats)))
+            if verbose:
+                print(f"  [loaded] {key}")
+        xray = f['lightStatus/xray']  # Always needed for run_indicator
+        self.run_indicator_chunks.append(runNumber * np.ones(xray.shape, dtype=xray.dtype))
+        for key in self.keys_to_sum:
+            dset = f[key]
+            if key not in self.sums:
+                self.sums[key] = np.zeros(dset.shape, dtype=dset.dtype)
+            if key not in self._sum_buffers:
+                self._sum_buffers[key] = np.empty(dset.shape, dtype=dset.dtype)
+            # Read into a reusable buffer so only one extra image is ever held
+            _read(dset, file_stats, out=self._sum_buffers[key])
+            self.sums[key] += self._sum_buffers[key]
+            if verbose:
+                print(f"  [summed] {key}")
+        problems = []
+        for key in self.keys_to_check:
+            arr = _read(f[key], file_stats)
+            digest = _array_digest(arr)
+            if key not in self.check_refs:
+                self.check_refs[key] = arr
+            elif digest != self.check_digests[key][0][1]:
+                problems.append(key)
+            self.check_digests[key].append((runNumber, digest))
+            if verbose:
+                print(f"  [checked] {key}")
+        return problems
+
+    def compact(self):
+        """Concatenate the collected per-run chunks in place and drop read buffers."""
+        self._sum_buffers.clear()
+        for key, chunks in self.combine_chunks.items():
+            if len(chunks) > 1:
+                self.combine_chunks[key] = [np.concatenate(chunks, axis=0)]
+        if len(self.run_indicator_chunks) > 1:
+            self.run_indicator_chunks = [np.concatenate(self.run_indicator_chunks)]
+        return self
+
+    def merge(self, other):
+        """Append the runs held by `other` (which must follow this accumulator's runs)."""
+        self.runs.extend(other.runs)
+        for key in self.keys_to_combine:
+            self.combine_chunks[key].extend(other.combine_chunks[key])
+        self.run_indicator_chunks.extend(other.run_indicator_chunks)
+        for key, arr in other.sums.items():
+            if key in self.sums:
+                self.sums[key] += arr
+            else:
+                self.sums[key] = arr
+        for key in self.keys_to_check:
+            if key not in self.check_refs and key in other.check_refs:
+                self.check_refs[key] = other.check_refs[key]
+            self.check_digests[key].extend(other.check_digests[key])
+        return self
+
+    def problems(self):
+        """Return ``(key, run)`` pairs whose checked content differs from the first run."""
+        return [
+            (key, run)
+            for key, digests in self.check_digests.items()
+            for run, digest in digests[1:]
+            if digest != digests[0][1]
+        ]
+
+    def result(self, progress=None):
+        """Build the `data_combined` dictionary returned by :func:`combineRuns`."""
+        self._sum_buffers.clear()
+        keys = self.keys_to_combine if progress is None else progress(self.keys_to_combine, desc="Combining Data")
+        data_combined = {}
+        for key in keys:
+            data_combined[key] = np.concatenate(self.combine_chunks.pop(key), axis=0)
+        data_combined['run_indicator'] = np.concatenate(self.run_indicator_chunks)
+        data_combined.update(self.sums)
+        data_combined.update(self.check_refs)
+        return data_combined
+
+def _add_archive_pvs(data_combined, runNumbers, archPVs, cache=True):
+    """Fetch EPICS PVs from the archive and evaluate them at every shot's `unixTime`.
+
+    The time windows of all runs are merged so back-to-back runs cost one archive
+    query per PV, and each PV is evaluated at all shots with a single
+    previous-value lookup. With a `cache` (see ``EpicsArchive``), fetched history
+    is kept locally, so reloading the same runs does not query the archiver again.
+    """
+    if isinstance(archPVs, str):
+        archPVs = [archPVs]
+    unixTime = data_combined['unixTime']
+    run_indicator = data_combined['run_indicator']
+    windows = []
+    for runNumber in runNumbers:
+        runUnixTime = unixTime[run_indicator == runNumber]
+        windows.append((runUnixTime[0], runUnixTime[-1]))
+    with EpicsArchive(cache=cache) as archive:
+        pv_arrays = archive.get_points_for_windows(archPVs, windows)
+    for pv in archPVs:
+        times, values = pv_arrays[pv]
+        data_combined[pv] = previous_value(times, values, unixTime)
+
+def _normalize_runs_and_folders(runNumbers, folders):
+    """Coerce run numbers and folders into two lists of equal length.
+
+    Parameters
+    ----------
+    runNumbers : int or list of int
+        Run number(s) to load.
+    folders : str, bytes, list, or tuple
+        Folder(s) containing the run files. A single folder is repeated for
+        every run.
+
+    Returns
+    -------
+    runNumbers : list of int
+    folders : list of str
+
+    Raises
+    ------
+    TypeError
+        If `folders` is not a string, bytes, list, or tuple.
+    ValueError
+        If multiple folders are provided but the number of folders does not match
+        the number of run numbers.
+    """
     # Ensure runNumbers is a list
     if not isinstance(runNumbers, (list, tuple)):
         runNumbers = [runNumbers]
+    runNumbers = list(runNumbers)
 
     # If folders is a string or bytes, make it a list of one element
     if isinstance(folders, (str, bytes)):
@@ -91,94 +311,197 @@ def combineRuns(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check
     else:
         # Repeat the single folders to match the length of runNumbers
         folders = folders * len(runNumbers)
-        
-    # Build the set of keys we actually need to load from each file
-    needed_keys = set(keys_to_combine) | set(keys_to_sum) | set(keys_to_check)
-    needed_keys.add('lightStatus/xray')  # Always needed for run_indicator
+    return runNumbers, folders
 
-    data_array = []
-    for i, runNumber in enumerate(tqdm(runNumbers, desc="Loading Runs")):
-        data = {}
-        experiment = folders[i].split('/')[6]
-        filename = f'{folders[i]}{experiment}_Run{runNumToString(runNumber)}.h5'
-        print('Loading: ' + filename)
+def _run_filename(folder, runNumber):
+    """Build the smalldata filename of a run, e.g. ``<folder>cxilv4418_Run0042.h5``.
+
+    The experiment name is taken from the seventh component of `folder`
+    (``/sdf/data/lcls/ds/<hutch>/<experiment>/...``).
+    """
+    experiment = folder.split('/')[6]
+    return f'{folder}{experiment}_Run{runNumToString(runNumber)}.h5'
+
+def _array_digest(arr):
+    """Return a content hash of an array, including its shape and dtype.
+
+    Used by :func:`combineRuns` to compare `keys_to_check` across runs without
+    keeping every run's copy in memory.
+    """
+    arr = np.asarray(arr)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{arr.dtype.str}{arr.shape}".encode())
+    if arr.dtype.hasobject:
+        h.update(repr(arr.tolist()).encode())
+    else:
+        h.update(np.ascontiguousarray(arr).view(np.uint8).reshape(-1).data)
+    return h.digest()
+
+def _squeeze_event_axis(arr):
+    """Drop singleton axes of `arr` while keeping the leading (event) axis."""
+    if arr.ndim <= 1:
+        return arr
+    return arr.reshape(arr.shape[0], *[s for s in arr.shape[1:] if s != 1])
+
+def _read_run_batches(runNumbers, folders, keys, batch_size, verbose):
+    """Generator behind :func:`iterRuns` that reads one batch at a time."""
+    for runNumber, folder in zip(runNumbers, folders):
+        filename = _run_filename(folder, runNumber)
+        if verbose:
+            print('Loading: ' + filename)
         with h5py.File(filename, 'r') as f:
-            # Print all keys and shapes without loading data
-            if verbose:
-                def _print_leaf(name):
-                    item = f[name]
-                    if isinstance(item, h5py.Dataset):
-                        print(f"  {name}  {item.shape}  {item.dtype}")
-                f.visit(_print_leaf)
-            # Only load the keys we need
-            for key in needed_keys:
-                if key in f:
-                    data[key] = f[key][()]
-                    if verbose: 
-                        print(f"  [loaded] {key}")
-            data_array.append(data)
-
-    data_combined = {}
-    for key in tqdm(keys_to_combine, desc="Combining Data"):
-        chunks = [np.squeeze(d[key]) for d in data_array]
-        data_combined[key] = np.concatenate(chunks, axis=0)
-
-    run_indicator = np.concatenate([
-        runNumber * np.ones_like(data_array[i]['lightStatus/xray'])
-        for i, runNumber in enumerate(runNumbers)
-    ])
-    data_combined['run_indicator'] = run_indicator
-
-    for key in tqdm(keys_to_sum, desc="Summing Data"):
-        arr = np.zeros_like(data_array[0][key])
-        for data in data_array:
-            arr += data[key]
-        data_combined[key] = arr
-
-    for key in tqdm(keys_to_check, desc="Checking Data"):
-        arr = data_array[0][key]
-        for i, data in enumerate(data_array):
-            if not np.array_equal(data[key], arr):
-                print(f'Problem with key {key} in run {runNumbers[i]}')
-        data_combined[key] = arr
-    # Import EPICS PV data from the archive if requested
-    if archPVs is not None:
-        if isinstance(archPVs, str):
-            archPVs = [archPVs]
-        archive = EpicsArchive()
-        unixTime = data_combined['unixTime']
-        for pv in tqdm(archPVs, desc="Loading EPICS PVs"):
-            pv_chunks = []
-            for i, runNumber in enumerate(runNumbers):
-                runUnixTime = unixTime[run_indicator == runNumber]
-                startTime = runUnixTime[0]
-                endTime = runUnixTime[-1]
-                [times, values] = archive.get_points(
-                    PV=pv, start=startTime, end=endTime,
-                    unit="seconds", raw=True, two_lists=True
-                )
-                interp_func = interp1d(times, values, kind='previous', fill_value='extrapolate')
-                pv_chunks.append(interp_func(runUnixTime))
-            data_combined[pv] = np.concatenate(pv_chunks)
-    print('Loaded Data')
-    return data_combined
+            missing = [key for key in keys if key not in f]
+            if missing:
+                raise KeyError(f"Keys {missing} not found in {filename}")
+            n_events = f['lightStatus/xray'].shape[0]
+            for key in keys:
+                if f[key].ndim == 0 or f[key].shape[0] != n_events:
+                    raise ValueError(
+                        f"Key '{key}' in {filename} has shape {f[key].shape}, which is not "
+                        f"per-event ({n_events} events). Use combineRuns for per-run keys."
+                    )
+            for start in range(0, n_events, batch_size):
+                stop = min(start + batch_size, n_events)
+                # Slicing an h5py dataset only reads (and decompresses) the chunks it touches
+                batch = {key: _squeeze_event_axis(f[key][start:stop]) for key in keys}
+                batch['run_indicator'] = np.full(stop - start, runNumber)
+                batch['runNumber'] = runNumber
+                yield batch
+
+def _prefetch(iterable, depth):
+    """Run `iterable` in a background thread, keeping up to `depth` items ready.
+
+    Exceptions raised by the producer are re-raised in the consumer. Closing the
+    returned generator early stops the producer thread.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def _put(item):
+        # Block in short intervals so a stopped consumer never leaves us hanging
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _producer():
+        try:
+            for item in iterable:
+                if not _put((item, None)):
+                    return
+        except BaseException as exc:  # forwarded to the consumer
+            _put((done, exc))
+            return
+        finally:
+            # Release the generator's resources (open HDF5 files) on every exit path
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        _put((done, None))
+
+    thread = threading.Thread(target=_producer, name='iterRuns-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = buffer.get()
+            if item is done:
+                if exc is not None:
+                    raise exc
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def iterRuns(runNumbers, folders, keys, batch_size=1000, prefetch=2, verbose=False):
+    """
+    Iterate over the events of multiple runs in fixed-size batches.
 
-def get_tree(f):
+    This is the bounded-memory counterpart of :func:`combineRuns`. Instead of
+    loading every run into memory, the HDF5 files are opened one at a time and
+    the per-event datasets in `keys` are sliced batch by batch, so only the
+    chunks needed for the current batch are read. Shot-by-shot reductions
+    (delay binning, running sums, filtering) can therefore process datasets far
+    larger than RAM.
+
+    Parameters
+    ----------
+    runNumbers : int or list of int
+        Run number(s) to iterate over, in order.
+    folders : str, bytes, list, or tuple
+        Path(s) to the folder(s) containing the data files, as in :func:`combineRuns`.
+    keys : str or list of str
+        Per-event keys to read. Each dataset must have the number of events as
+        its first dimension.
+    batch_size : int, optional
+        Maximum number of events per batch (default: 1000). Batches never span
+        two runs, so the last batch of each run may be shorter. Choosing a
+        multiple of the HDF5 chunk length avoids decompressing chunks twice.
+    prefetch : int, optional
+        Number of batches to read ahead in a background thread while the
+        current batch is being processed. ``0`` reads synchronously (default: 2).
+    verbose : bool, optional
+        If True, prints the name of each file as it is opened (default: False).
+
+    Yields
+    ------
+    batch : dict
+        Dictionary with one array per key in `keys` (singleton axes squeezed,
+        as in :func:`combineRuns`), a `'run_indicator'` array with the run
+        number of each event, and `'runNumber'`, the run the batch belongs to.
+
+    Raises
+    ------
+    ValueError
+        If `batch_size` is not positive, `prefetch` is negative, or a key is not per-event.
+    KeyError
+        If a key is missing from one of the files.
+
+    Examples
+    --------
+    >>> total = 0
+    >>> for batch in iterRuns([10, 11], folder, ['jungfrau4M/azav_azav'], batch_size=500):
+    ...     total = total + batch['jungfrau4M/azav_azav'].sum(axis=0)
+    """
+    if isinstance(keys, str):
+        keys = [keys]
+    if batch_size < 1:
+        raise ValueError(f"'batch_size' must be a positive integer, got {batch_size}.")
+    if prefetch < 0:
+        raise ValueError(f"'prefetch' must be non-negative, got {prefetch}.")
+    runNumbers, folders = _normalize_runs_and_folders(runNumbers, folders)
+    batches = _read_run_batches(runNumbers, folders, list(keys), int(batch_size), verbose)
+    if prefetch == 0:
+        yield from batches
+    else:
+        yield from _prefetch(batches, prefetch)
+
+def get_tree(f, cache=False):
     """List the full tree of the HDF5 file.
 
+    The tree is taken from the layout index (see
+    :func:`xrayscatteringtools.h5layout.get_layout`), so repeated calls on the
+    same unmodified file in one session do not walk the HDF5 hierarchy again.
+
     Parameters
     ----------
-    f : h5py.File
-        The HDF5 file object to traverse.
+    f : h5py.File or h5py.Group
+        The HDF5 file (or group) object to traverse.
+    cache : bool, optional
+        If True, also keep the layout of a whole file in the on-disk cache so
+        later sessions can reuse it (default: False). Groups are always walked.
 
     Returns
     -------
     None
         Prints the structure of the HDF5 file.
     """
-    def printname(name):
-        print(name, type(f[name]))
-    f.visit(printname)
+    for name, info in get_layout(f, persist=cache).nodes.items():
+        print(name, h5py.Dataset if info['kind'] == 'dataset' else h5py.Group)
     
 def is_leaf(dataset):
     """Check if an HDF5 node is a dataset (leaf node).
@@ -195,7 +518,7 @@ def is_leaf(dataset):
     """
     return isinstance(dataset, h5py.Dataset)
 
-def get_leaves(f, saveto=None, verbose=False):
+def get_leaves(f, saveto=None, verbose=False, cache=False):
     """Retrieve all leaf datasets from an HDF5 file and save them to a dictionary.
 
     Parameters
@@ -206,19 +529,26 @@ def get_leaves(f, saveto=None, verbose=False):
         Dictionary to store the retrieved datasets.
     verbose : bool, optional
         If True, print detailed information about each dataset (default: False).
+    cache : bool, optional
+        If True, also keep the layout of a whole file in the on-disk cache so
+        later sessions can reuse it (default: False). Groups are always walked.
 
     Returns
     -------
     None
         The datasets are stored in the provided dictionary.
+
+    Notes
+    -----
+    Dataset paths and shapes come from the layout index (see
+    :func:`xrayscatteringtools.h5layout.get_layout`); data is only read when
+    `saveto` is given.
     """
-    def return_leaf(name):
-        if is_leaf(f[name]):
-            if verbose:
-                print(name, f[name][()].shape)
-            if saveto is not None:
-                saveto[name] = f[name][()]
-    f.visit(return_leaf)
+    for name, info in get_layout(f, persist=cache).datasets.items():
+        if verbose:
+            print(name, info['shape'])
+        if saveto is not None:
+            saveto[name] = f[name][()]
 
 def get_data_paths(run_numbers, config_path='config.yaml'):
     """
@@ -278,9 +608,9 @@ def get_config(key, config_path='config.yaml'):
     yaml.YAMLError
         If there is an error parsing the YAML configuration file.
     """
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
-    return config[key]
+    config = load_config(config_path)
+    # Copy so callers cannot modify the cached configuration
+    return copy.deepcopy(config[key])
 
 def get_config_for_runs(run_numbers,key,subkey,config_path='config.yaml'):
     """
@@ -288,6 +618,9 @@ def get_config_for_runs(run_numbers,key,subkey,config_path='config.yaml'):
 
     Reads a YAML configuration file specifying run ranges and associated
     configuration values, returning the values corresponding to the provided key.
+    The parsed file and its run-range index are cached (see
+    :func:`xrayscatteringtools.config.load_config`) until the file changes.
+    If run ranges overlap, the first matching entry in the file wins.
 
     Parameters
     ----------
@@ -307,6 +640,8 @@ def get_config_for_runs(run_numbers,key,subkey,config_path='config.yaml'):
 
     Raises
     ------
+    ValueError
+        If any run number does not have a corresponding value.
     FileNotFoundError
         If the configuration file does not exist.
     yaml.YAMLError
@@ -316,24 +651,63 @@ def get_config_for_runs(run_numbers,key,subkey,config_path='config.yaml'):
     if isinstance(run_numbers, Number):
         run_numbers = [run_numbers]
 
-    with open(config_path) as f:
-        config = yaml.safe_load(f)
-
-    values = []
-    for run in run_numbers:
-        for entry in config[key]:
-            lower, upper = entry['runs']
-            if lower <= run <= upper:
-                values.append(entry[subkey])
-                break
-        else:
-            raise ValueError(f"No {key}/{subkey} value found for run number: {run}")
+    # Parsed once per file version; run ranges are looked up with a bisect index
+    config = load_config(config_path)
+    values = config.values_for_runs(list(run_numbers), key, subkey)
     # Return scalar if only one value
     if len(values) == 1:
         return values[0]
 
     return values
 
+def get_config_for_shots(run_indicator, key, subkeys, config_path='config.yaml'):
+    """
+    Map a per-shot run indicator to per-shot configuration values in one step.
+
+    The distinct runs in `run_indicator` are found with
+    ``np.unique(..., return_inverse=True)``, each distinct run is looked up once
+    in the run-range index of `key`, and the per-run values are gathered back to
+    every shot. No Python loop over shots or runs is involved.
+
+    Parameters
+    ----------
+    run_indicator : array_like
+        Per-shot run numbers, e.g. ``data_combined['run_indicator']`` from
+        :func:`combineRuns`.
+    key : str
+        The run-dependent configuration key, e.g. ``'tt_calibration'``.
+    subkeys : str or list of str
+        Entry field(s) to return, e.g. ``['slope', 'intercept']``.
+    config_path : str, optional
+        Path to the YAML configuration file (default is 'config.yaml').
+
+    Returns
+    -------
+    np.ndarray or dict of np.ndarray
+        For a single subkey, an array with one value per shot (shape of
+        `run_indicator`, plus any trailing dimensions of list-valued entries).
+        For a list of subkeys, a dictionary mapping each subkey to such an array.
+
+    Raises
+    ------
+    ValueError
+        If any run in `run_indicator` does not have a corresponding entry.
+    FileNotFoundError
+        If the configuration file does not exist.
+
+    Examples
+    --------
+    >>> cal = get_config_for_shots(data['run_indicator'], 'tt_calibration', ['slope', 'intercept'])
+    >>> delays = apply_timetool_correction(delays, edges, cal['slope'], cal['intercept'])
+    """
+    run_indicator = np.asarray(run_indicator)
+    index = load_config(config_path).index(key)
+    unique_runs, inverse = np.unique(run_indicator, return_inverse=True)
+    inverse = inverse.reshape(run_indicator.shape)
+    if isinstance(subkeys, str):
+        return index.values(unique_runs, subkeys)[inverse]
+    return {subkey: index.values(unique_runs, subkey)[inverse] for subkey in subkeys}
+
 def runNumToString(num):
     """Convert a run number to a zero-padded string of length 4.
 
@@ -0,0 +1,387 @@
+"""I/O throughput instrumentation for HDF5 run loading.
+
+:class:`IOStats` collects, for each file and each dataset read, the number of
+bytes read (in memory and on disk), the wall-clock read time, the resulting
+throughput and the peak resident set size of the process. Every read is also
+reported through the :mod:`logging` module (``xrayscatteringtools.iostats``
+logger), and the whole timeline can be exported in the Chrome trace event
+format for viewing in ``chrome://tracing`` or https://ui.perfetto.dev.
+
+With decompression measurement enabled, the regular read is timed first (so
+``read_time`` and the MB/s figures are not flattered by a warm page cache),
+and ``decompress_time`` is then the difference between a repeated filtered
+read and a raw chunk read of the now-cached data, i.e. the cost of the filter
+pipeline alone. Comparing ``read_time - decompress_time`` with
+``decompress_time`` and the time spent outside the reads tells whether a slow
+load is caused by the filesystem, by HDF5 chunking/compression, or by our own code.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_MB = 1e6
+
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process in bytes (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return int(peak if sys.platform == 'darwin' else peak * 1024)
+
+
+def _compression(dset):
+    """Describe the filter pipeline of a dataset, e.g. ``'gzip(4)'`` or None."""
+    if dset.compression is None:
+        return None
+    if dset.compression_opts is None:
+        return str(dset.compression)
+    return f"{dset.compression}({dset.compression_opts})"
+
+
+def _raw_chunk_read_time(dset):
+    """Time reading every stored chunk of `dset` without applying filters.
+
+    Returns None when the dataset is not chunked or the HDF5 build does not
+    expose the chunk query API.
+    """
+    if dset.chunks is None:
+        return None
+    try:
+        dsid = dset.id
+        n_chunks = dsid.get_num_chunks()
+        offsets = [dsid.get_chunk_info(i).chunk_offset for i in range(n_chunks)]
+        start = time.perf_counter()
+        for offset in offsets:
+            dsid.read_direct_chunk(offset)
+        return time.perf_counter() - start
+    except (AttributeError, TypeError, ValueError, RuntimeError):
+        return None
+
+
+class KeyReadStats:
+    """Statistics of one dataset read.
+
+    Attributes
+    ----------
+    key : str
+        Dataset path inside the file.
+    nbytes : int
+        Size of the data in memory after decompression.
+    storage_bytes : int
+        Size of the data on disk (compressed size for filtered datasets).
+    read_time : float
+        Wall-clock time of the read in seconds.
+    raw_read_time : float or None
+        Time to read the stored (still compressed) chunks without filters,
+        measured after the regular read (page cache warm), when measured.
+    decompress_time : float or None
+        Time spent in the HDF5 filter pipeline: a repeated filtered read minus
+        `raw_read_time`, both on cached data, when measured.
+    compression : str or None
+        Compression filter of the dataset.
+    chunks : tuple or None
+        HDF5 chunk shape of the dataset.
+    start : float
+        Start of the read, in seconds since the epoch.
+    """
+
+    def __init__(self, key, nbytes, storage_bytes, read_time, start, compression=None,
+                 chunks=None, raw_read_time=None, decompress_time=None):
+        self.key = key
+        self.nbytes = int(nbytes)
+        self.storage_bytes = int(storage_bytes)
+        self.read_time = float(read_time)
+        self.start = float(start)
+        self.compression = compression
+        self.chunks = chunks
+        self.raw_read_time = raw_read_time
+        self.decompress_time = decompress_time
+
+    @property
+    def mb_per_s(self):
+        """Throughput of the read in MB/s of in-memory data."""
+        return self.nbytes / _MB / self.read_time if self.read_time > 0 else float('inf')
+
+    def to_dict(self):
+        return {
+            'key': self.key,
+            'nbytes': self.nbytes,
+            'storage_bytes': self.storage_bytes,
+            'read_time': self.read_time,
+            'mb_per_s': self.mb_per_s,
+            'raw_read_time': self.raw_read_time,
+            'decompress_time': self.decompress_time,
+            'compression': self.compression,
+            'chunks': None if self.chunks is None else list(self.chunks),
+            'start': self.start,
+        }
+
+    def __repr__(self):
+        return (f"KeyReadStats({self.key!r}, {self.nbytes / _MB:.2f} MB, "
+                f"{self.read_time:.3f} s, {self.mb_per_s:.1f} MB/s)")
+
+
+class FileReadStats:
+    """Statistics of all reads from one file.
+
+    Attributes
+    ----------
+    filename : str
+        Path of the HDF5 file.
+    run : int or None
+        Run number the file belongs to.
+    keys : list of KeyReadStats
+        One entry per dataset read.
+    start, end : float
+        Time the file was opened and closed, in seconds since the epoch.
+    peak_rss : int or None
+        Peak resident set size of the process (bytes) after the file was read.
+    measure_decompression : bool
+        Whether raw chunk reads are timed to estimate decompression cost.
+    """
+
+    def __init__(self, filename, run=None, measure_decompression=False):
+        self.filename = filename
+        self.run = run
+        self.keys = []
+        self.start = time.time()
+        self.end = None
+        self.peak_rss = None
+        self.measure_decompression = measure_decompression
+
+    def read(self, dset, out=None):
+        """Read a whole dataset, recording its statistics.
+
+        Parameters
+        ----------
+        dset : h5py.Dataset
+            Dataset to read.
+        out : np.ndarray, optional
+            Preallocated buffer to read into with ``read_direct``.
+
+        Returns
+        -------
+        np.ndarray or scalar
+            The data read (`out` if given).
+        """
+        start_wall = time.time()
+        start = time.perf_counter()
+        if out is None:
+            data = dset[()]
+        else:
+            dset.read_direct(out)
+            data = out
+        read_time = time.perf_counter() - start
+        raw_read_time = decompress_time = None
+        if self.measure_decompression:
+            if dset.compression is None:
+                decompress_time = 0.0
+            else:
+                # The regular read above warmed the page cache, so a raw chunk read
+                # and a repeated filtered read now differ only by the filter pipeline.
+                raw_read_time = _raw_chunk_read_time(dset)
+                if raw_read_time is not None:
+                    start = time.perf_counter()
+                    dset[()]
+                    decompress_time = max(time.perf_counter() - start - raw_read_time, 0.0)
+        key_stats = KeyReadStats(
+            key=dset.name.lstrip('/'),
+            nbytes=np.asarray(data).nbytes,
+            storage_bytes=dset.id.get_storage_size(),
+            read_time=read_time,
+            start=start_wall,
+            compression=_compression(dset),
+            chunks=dset.chunks,
+            raw_read_time=raw_read_time,
+            decompress_time=decompress_time,
+        )
+        self.keys.append(key_stats)
+        logger.debug("%s: %s %.2f MB in %.3f s (%.1f MB/s)", self.filename, key_stats.key,
+                     key_stats.nbytes / _MB, read_time, key_stats.mb_per_s)
+        return data
+
+    def close(self):
+        """Mark the file as done, record peak RSS and log a summary line."""
+        self.end = time.time()
+        self.peak_rss = peak_rss_bytes()
+        logger.info("%s: %.2f MB in %.3f s (%.1f MB/s), peak RSS %s", self.filename,
+                    self.nbytes / _MB, self.read_time, self.mb_per_s,
+                    'n/a' if self.peak_rss is None else f"{self.peak_rss / _MB:.0f} MB")
+
+    @property
+    def nbytes(self):
+        return sum(k.nbytes for k in self.keys)
+
+    @property
+    def storage_bytes(self):
+        return sum(k.storage_bytes for k in self.keys)
+
+    @property
+    def read_time(self):
+        return sum(k.read_time for k in self.keys)
+
+    @property
+    def wall_time(self):
+        """Time between opening and closing the file, including non-read overhead."""
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    @property
+    def mb_per_s(self):
+        return self.nbytes / _MB / self.read_time if self.read_time > 0 else float('inf')
+
+    def to_dict(self):
+        return {
+            'filename': self.filename,
+            'run': self.run,
+            'nbytes': self.nbytes,
+            'storage_bytes': self.storage_bytes,
+            'read_time': self.read_time,
+            'wall_time': self.wall_time,
+            'mb_per_s': self.mb_per_s,
+            'peak_rss': self.peak_rss,
+            'start': self.start,
+            'end': self.end,
+            'keys': [k.to_dict() for k in self.keys],
+        }
+
+    def __repr__(self):
+        return (f"FileReadStats({self.filename!r}, {len(self.keys)} keys, "
+                f"{self.nbytes / _MB:.2f} MB, {self.read_time:.3f} s)")
+
+
+class IOStats:
+    """Collection of :class:`FileReadStats` for one multi-run load.
+
+    Parameters
+    ----------
+    measure_decompression : bool, optional
+        If True, compressed datasets are additionally re-read chunk by chunk
+        without filters and once more with filters, to separate filesystem time
+        from decompression time. This reads compressed data three times, so it
+        is off by default.
+
+    Examples
+    --------
+    >>> data, stats = combineRuns(runs, folder, keys, [], [], return_stats=True)
+    >>> print(stats.summary())
+    >>> stats.to_chrome_trace('load_trace.json')
+    """
+
+    def __init__(self, measure_decompression=False):
+        self.measure_decompression = measure_decompression
+        self.files = []
+
+    def open_file(self, filename, run=None):
+        """Start recording reads from `filename` and return its :class:`FileReadStats`."""
+        file_stats = FileReadStats(filename, run=run, measure_decompression=self.measure_decompression)
+        self.files.append(file_stats)
+        return file_stats
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for f in self.files)
+
+    @property
+    def read_time(self):
+        return sum(f.read_time for f in self.files)
+
+    @property
+    def mb_per_s(self):
+        return self.nbytes / _MB / self.read_time if self.read_time > 0 else float('inf')
+
+    @property
+    def peak_rss(self):
+        peaks = [f.peak_rss for f in self.files if f.peak_rss is not None]
+        return max(peaks) if peaks else None
+
+    def per_key(self):
+        """Aggregate bytes and read time per dataset key across all files.
+
+        Returns
+        -------
+        dict
+            ``{key: {'nbytes': int, 'read_time': float, 'mb_per_s': float}}``
+        """
+        totals = {}
+        for file_stats in self.files:
+            for k in file_stats.keys:
+                entry = totals.setdefault(k.key, {'nbytes': 0, 'read_time': 0.0})
+                entry['nbytes'] += k.nbytes
+                entry['read_time'] += k.read_time
+        for entry in totals.values():
+            t = entry['read_time']
+            entry['mb_per_s'] = entry['nbytes'] / _MB / t if t > 0 else float('inf')
+        return totals
+
+    def summary(self):
+        """Return a human-readable table of per-file and per-key throughput."""
+        lines = [f"{'file':<60} {'MB':>10} {'s':>8} {'MB/s':>8}"]
+        for f in self.files:
+            lines.append(f"{os.path.basename(f.filename):<60} {f.nbytes / _MB:>10.2f} "
+                         f"{f.read_time:>8.3f} {f.mb_per_s:>8.1f}")
+        lines.append(f"{'key':<60} {'MB':>10} {'s':>8} {'MB/s':>8}")
+        for key, entry in self.per_key().items():
+            lines.append(f"{key:<60} {entry['nbytes'] / _MB:>10.2f} "
+                         f"{entry['read_time']:>8.3f} {entry['mb_per_s']:>8.1f}")
+        rss = 'n/a' if self.peak_rss is None else f"{self.peak_rss / _MB:.0f} MB"
+        lines.append(f"total: {self.nbytes / _MB:.2f} MB in {self.read_time:.3f} s "
+                     f"({self.mb_per_s:.1f} MB/s), peak RSS {rss}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'nbytes': self.nbytes,
+            'read_time': self.read_time,
+            'mb_per_s': self.mb_per_s,
+            'peak_rss': self.peak_rss,
+            'files': [f.to_dict() for f in self.files],
+        }
+
+    def to_json(self, path):
+        """Write :meth:`to_dict` to `path` as JSON."""
+        with open(path, 'w') as fp:
+            json.dump(self.to_dict(), fp, indent=2)
+
+    def chrome_trace_events(self):
+        """Return the timeline as a list of Chrome trace ``complete`` events."""
+        pid = os.getpid()
+        events = []
+        for f in self.files:
+            end = f.end if f.end is not None else time.time()
+            events.append({
+                'name': os.path.basename(f.filename), 'cat': 'file', 'ph': 'X',
+                'ts': f.start * 1e6, 'dur': (end - f.start) * 1e6, 'pid': pid, 'tid': 0,
+                'args': {'run': f.run, 'nbytes': f.nbytes, 'mb_per_s': f.mb_per_s,
+                         'peak_rss': f.peak_rss},
+            })
+            for k in f.keys:
+                events.append({
+                    'name': k.key, 'cat': 'read', 'ph': 'X',
+                    'ts': k.start * 1e6, 'dur': k.read_time * 1e6, 'pid': pid, 'tid': 1,
+                    'args': {'nbytes': k.nbytes, 'storage_bytes': k.storage_bytes,
+                             'mb_per_s': k.mb_per_s, 'compression': k.compression,
+                             'decompress_time': k.decompress_time},
+                })
+        return events
+
+    def to_chrome_trace(self, path):
+        """Write the timeline to `path` in the Chrome trace event JSON format."""
+        with open(path, 'w') as fp:
+            json.dump({'traceEvents': self.chrome_trace_events(), 'displayTimeUnit': 'ms'}, fp)
+
+    def __repr__(self):
+        return f"IOStats({len(self.files)} files, {self.nbytes / _MB:.2f} MB, {self.read_time:.3f} s)"
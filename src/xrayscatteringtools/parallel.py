@@ -0,0 +1,94 @@
+"""Shard-and-reduce execution of multi-run analyses across worker processes.
+
+Run lists are split into contiguous shards, each shard is loaded and reduced by a
+worker (the same per-run streaming reductions :func:`~xrayscatteringtools.io.combineRuns`
+does), and the partial results are merged pairwise with a tree reduction.
+
+Workers are dispatched through a *backend*: any object with a
+``map(func, iterable)`` method that returns results in input order. The built-in
+:class:`ProcessPoolBackend` uses local processes, but a
+:class:`concurrent.futures.Executor` (e.g. ``mpi4py.futures.MPIPoolExecutor`` for
+multi-node jobs) can be passed directly. The backends and helpers are defined in
+:mod:`xrayscatteringtools._backends`, which does not import the loading code, and
+are re-exported here.
+"""
+
+import os
+
+import h5py
+
+from ._backends import ProcessPoolBackend, SerialBackend, shard, tree_reduce  # noqa: F401 (re-exported)
+from .io import _RunAccumulator, _add_archive_pvs, _normalize_runs_and_folders, _run_filename
+
+
+def _combine_shard(task):
+    """Worker: load and reduce one shard of runs, returning a compacted accumulator."""
+    runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check = task
+    accumulator = _RunAccumulator(keys_to_combine, keys_to_sum, keys_to_check)
+    for runNumber, folder in zip(runNumbers, folders):
+        with h5py.File(_run_filename(folder, runNumber), 'r') as f:
+            accumulator.add_file(f, runNumber)
+    return accumulator.compact()
+
+
+def combineRunsParallel(runNumbers, folders, keys_to_combine, keys_to_sum, keys_to_check,
+                        n_workers=None, backend=None, archPVs=None, archive_cache=True):
+    """
+    Combine data from multiple runs using several worker processes.
+
+    Produces the same `data_combined` dictionary as
+    :func:`~xrayscatteringtools.io.combineRuns`. The run list is split into
+    contiguous shards, each worker loads its shard and performs the
+    concatenation, summation and consistency hashing locally, and the partial
+    results are merged with :func:`tree_reduce`.
+
+    Parameters
+    ----------
+    runNumbers : int or list of int
+        Run number(s) to load and combine.
+    folders : str, bytes, list, or tuple
+        Path(s) to the folder(s) containing the data files, as in ``combineRuns``.
+    keys_to_combine : list of str
+        Keys whose arrays are concatenated along the first axis.
+    keys_to_sum : list of str
+        Keys whose arrays are summed element-wise across runs.
+    keys_to_check : list of str
+        Keys whose consistency across runs is verified. Discrepancies are printed.
+    n_workers : int, optional
+        Number of shards (and local worker processes when `backend` is None).
+        Defaults to ``os.cpu_count()``.
+    backend : object, optional
+        Object with an ordered ``map(func, iterable)`` method used to run the
+        shards, e.g. :class:`SerialBackend`, :class:`ProcessPoolBackend` or a
+        :class:`concurrent.futures.Executor`. Defaults to
+        ``ProcessPoolBackend(n_workers)``.
+    archPVs : str or list of str, optional
+        EPICS PV name(s) to fetch from the archive after the merge, as in ``combineRuns``.
+    archive_cache : bool, str or ArchiveCache, optional
+        Local cache used for `archPVs`, as in ``combineRuns`` (default: True).
+
+    Returns
+    -------
+    data_combined : dict
+        Dictionary containing the combined data from all runs.
+    """
+    runNumbers, folders = _normalize_runs_and_folders(runNumbers, folders)
+    n_workers = n_workers or os.cpu_count() or 1
+    if backend is None:
+        backend = ProcessPoolBackend(n_workers)
+
+    tasks = [
+        ([runNumbers[i] for i in idx], [folders[i] for i in idx],
+         keys_to_combine, keys_to_sum, keys_to_check)
+        for idx in shard(range(len(runNumbers)), n_workers)
+    ]
+    partials = backend.map(_combine_shard, tasks)
+    accumulator = tree_reduce(lambda a, b: a.merge(b), partials)
+    for key, run in accumulator.problems():
+        print(f'Problem with key {key} in run {run}')
+
+    data_combined = accumulator.result()
+    if archPVs is not None:
+        _add_archive_pvs(data_combined, runNumbers, archPVs, cache=archive_cache)
+    print('Loaded Data')
+    return data_combined
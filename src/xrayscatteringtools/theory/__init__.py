@@ -1,6 +1,8 @@
 from .iam import iam_total_pattern, iam_elastic_pattern, iam_inelastic_pattern
 from .iam import iam_total_pattern_oriented, iam_elastic_pattern_oriented, iam_inelastic_pattern_oriented
 from .iam import iam_compton_spectrum
+from .form_factors import form_factors, atomic_form_factor, FormFactorCache, form_factor_cache
+from .debye import debye_pattern, debye_sinc_sums, debye_distance_histograms, debye_histogram_sums, debye_trajectory
 
 from .geometries import SF6__CCSD_T_DHK__aug_cc_pV5Z_DK
 
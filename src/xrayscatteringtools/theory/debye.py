@@ -0,0 +1,383 @@
+"""Element-pair grouped Debye summation with bounded memory.
+
+The Debye formula
+
+    I(q) = sum_i f_i(q)**2 + 2 sum_{i<j} f_i(q) f_j(q) sinc(q r_ij)
+
+only depends on the atoms through their elements, so the pairs are grouped by
+element pair (Z_a, Z_b): the sinc sums ``S_ab(q) = sum sinc(q r_ij)`` are
+accumulated per group and the form factor product ``f_a f_b`` is applied once
+per group. Pair distances are generated in blocks of at most `pair_chunk`
+pairs and the sinc sums taken over `q_chunk` q values at a time, so memory
+stays at ``O(pair_chunk x q_chunk)`` however many atoms there are.
+
+For large clusters the exact sum over pairs can be replaced by a sum over a
+fine histogram of pair distances per element pair (``method='histogram'``).
+Each bin is evaluated at the mean distance of its pairs, and the spread of
+the distances within the bins gives an estimate of the error.
+"""
+
+import os
+
+import numpy as np
+
+from .._backends import ProcessPoolBackend, file_reader, shard
+from .form_factors import form_factor_cache
+
+
+def pair_distance_blocks(coords, rows, cols, same, pair_chunk=16384):
+    """
+    Yield the distances between two groups of atoms in blocks.
+
+    Parameters
+    ----------
+    coords : ndarray, shape (n_atoms, 3)
+        Atomic coordinates.
+    rows, cols : ndarray of int
+        Atom indices of the two groups.
+    same : bool
+        If True, `rows` and `cols` are the same group and only pairs
+        ``i < j`` are yielded.
+    pair_chunk : int, optional
+        Approximate number of pairs per block. Default is 16384.
+
+    Yields
+    ------
+    ndarray, shape (n_block,)
+        Distances of a block of pairs.
+    """
+    n_cols = len(cols)
+    col_coords = coords[cols]
+    block_rows = max(1, pair_chunk // max(1, n_cols))
+    for r0 in range(0, len(rows), block_rows):
+        r1 = min(r0 + block_rows, len(rows))
+        diff = coords[rows[r0:r1], np.newaxis, :] - col_coords[np.newaxis, :, :]
+        distances = np.sqrt(np.einsum('ijk,ijk->ij', diff, diff))
+        if same:
+            upper = np.arange(n_cols)[np.newaxis, :] > np.arange(r0, r1)[:, np.newaxis]
+            distances = distances[upper]
+        else:
+            distances = distances.ravel()
+        if distances.size:
+            yield distances
+
+
+def element_pairs(n_elements):
+    """Index pairs ``(a, b)`` with ``a <= b`` of `n_elements` unique elements, shape (n_groups, 2)."""
+    a, b = np.triu_indices(n_elements)
+    return np.stack([a, b], axis=1)
+
+
+def debye_sinc_sums(coords, element_index, q, q_chunk=256, pair_chunk=16384):
+    """
+    Sinc sums of the atom pairs of every element pair.
+
+    Parameters
+    ----------
+    coords : array_like, shape (n_atoms, 3)
+        Atomic coordinates in Angstroms.
+    element_index : array_like of int, shape (n_atoms,)
+        Unique-element index of every atom (e.g. the ``inverse`` of
+        :meth:`FormFactorCache.unique`).
+    q : array_like, shape (n_q,)
+        Momentum transfer values in inverse Angstroms.
+    q_chunk : int, optional
+        Number of q values evaluated at once. Default is 256.
+    pair_chunk : int, optional
+        Approximate number of pairs evaluated at once. Default is 16384.
+
+    Returns
+    -------
+    pairs : ndarray of int, shape (n_groups, 2)
+        Element pairs ``(a, b)``, ``a <= b`` (see :func:`element_pairs`).
+    sums : ndarray, shape (n_groups, n_q)
+        ``sum sinc(q r_ij)`` over the pairs ``i < j`` of each element pair.
+    """
+    coords = np.asarray(coords, dtype=float)
+    element_index = np.asarray(element_index)
+    q = np.asarray(q, dtype=float)
+    n_elements = int(element_index.max()) + 1 if element_index.size else 0
+    members = [np.flatnonzero(element_index == e) for e in range(n_elements)]
+    pairs = element_pairs(n_elements)
+    sums = np.zeros((len(pairs), q.size))
+    q_over_pi = q / np.pi  # np.sinc(x) = sin(pi x) / (pi x)
+    for g, (a, b) in enumerate(pairs):
+        for r in pair_distance_blocks(coords, members[a], members[b], a == b, pair_chunk):
+            for q0 in range(0, q.size, q_chunk):
+                q1 = min(q0 + q_chunk, q.size)
+                sums[g, q0:q1] += np.sinc(r[:, np.newaxis] * q_over_pi[np.newaxis, q0:q1]).sum(axis=0)
+    return pairs, sums
+
+
+def debye_distance_histograms(coords, element_index, bin_width=0.01, pair_chunk=65536):
+    """
+    Histogram the pair distances of every element pair.
+
+    Parameters
+    ----------
+    coords : array_like, shape (n_atoms, 3)
+        Atomic coordinates in Angstroms.
+    element_index : array_like of int, shape (n_atoms,)
+        Unique-element index of every atom.
+    bin_width : float, optional
+        Width of the distance bins in Angstroms. Default is 0.01.
+    pair_chunk : int, optional
+        Approximate number of pair distances computed at once. Default is 65536.
+
+    Returns
+    -------
+    pairs : ndarray of int, shape (n_groups, 2)
+        Element pairs ``(a, b)``, ``a <= b`` (see :func:`element_pairs`).
+    counts : ndarray, shape (n_groups, n_bins)
+        Number of pairs ``i < j`` in every distance bin ``[k, k + 1) * bin_width``.
+    mean_r : ndarray, shape (n_groups, n_bins)
+        Mean distance of the pairs in every bin (NaN for empty bins).
+    spread : ndarray, shape (n_groups,)
+        Sum over the pairs of ``(r - mean_r)**2``, the within-bin spread.
+    """
+    if bin_width <= 0:
+        raise ValueError(f"bin_width must be positive, got {bin_width}.")
+    coords = np.asarray(coords, dtype=float)
+    element_index = np.asarray(element_index)
+    n_elements = int(element_index.max()) + 1 if element_index.size else 0
+    members = [np.flatnonzero(element_index == e) for e in range(n_elements)]
+    pairs = element_pairs(n_elements)
+    r_max = np.linalg.norm(np.ptp(coords, axis=0)) if coords.size else 0.0
+    n_bins = int(r_max // bin_width) + 1
+    counts = np.zeros((len(pairs), n_bins))
+    # Offsets from the left bin edge, so the spread does not cancel badly
+    offset_sum = np.zeros((len(pairs), n_bins))
+    offset_sq = np.zeros((len(pairs), n_bins))
+    for g, (a, b) in enumerate(pairs):
+        for r in pair_distance_blocks(coords, members[a], members[b], a == b, pair_chunk):
+            k = np.minimum((r // bin_width).astype(np.intp), n_bins - 1)
+            d = r - k * bin_width
+            counts[g] += np.bincount(k, minlength=n_bins)
+            offset_sum[g] += np.bincount(k, weights=d, minlength=n_bins)
+            offset_sq[g] += np.bincount(k, weights=d * d, minlength=n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_offset = offset_sum / counts
+        spread = np.where(counts > 0, offset_sq - offset_sum * mean_offset, 0.0)
+    mean_r = np.arange(n_bins) * bin_width + mean_offset
+    return pairs, counts, mean_r, np.maximum(spread, 0).sum(axis=1)
+
+
+def debye_histogram_sums(counts, mean_r, q, q_chunk=256, bin_chunk=4096):
+    """
+    Sinc sums of every element pair from its distance histogram.
+
+    Parameters
+    ----------
+    counts, mean_r : ndarray, shape (n_groups, n_bins)
+        Output of :func:`debye_distance_histograms`.
+    q : array_like, shape (n_q,)
+        Momentum transfer values in inverse Angstroms.
+    q_chunk, bin_chunk : int, optional
+        Number of q values and occupied bins evaluated at once.
+
+    Returns
+    -------
+    sums : ndarray, shape (n_groups, n_q)
+        ``sum_k counts_k sinc(q mean_r_k)`` for each element pair.
+    """
+    q = np.asarray(q, dtype=float)
+    q_over_pi = q / np.pi
+    sums = np.zeros((counts.shape[0], q.size))
+    for g in range(counts.shape[0]):
+        occupied = np.flatnonzero(counts[g])
+        for b0 in range(0, occupied.size, bin_chunk):
+            bins = occupied[b0:b0 + bin_chunk]
+            n, r = counts[g, bins], mean_r[g, bins]
+            for q0 in range(0, q.size, q_chunk):
+                q1 = min(q0 + q_chunk, q.size)
+                sums[g, q0:q1] += n @ np.sinc(r[:, np.newaxis] * q_over_pi[np.newaxis, q0:q1])
+    return sums
+
+
+def debye_pattern(atoms, coords, q, method='exact', bin_width=0.01, return_error=False, q_chunk=256,
+                  pair_chunk=None):
+    """
+    Elastic IAM (Debye) scattering of a set of atoms, grouped by element pair.
+
+    Parameters
+    ----------
+    atoms : sequence of str or int
+        Element symbols or atomic numbers.
+    coords : array_like, shape (n_atoms, 3)
+        Atomic coordinates in Angstroms.
+    q : array_like, shape (n_q,)
+        Momentum transfer values in inverse Angstroms.
+    method : {'exact', 'histogram'}, optional
+        ``'exact'`` (default) sums over every pair. ``'histogram'`` sums over
+        pair-distance bins of width `bin_width`, which costs
+        ``O(n_bins x n_q)`` after histogramming and suits clusters with 10^4+
+        atoms.
+    bin_width : float, optional
+        Distance bin width in Angstroms for ``method='histogram'``. Default is
+        0.01.
+    return_error : bool, optional
+        Also return an estimate of the absolute error of the histogram
+        approximation (zeros for ``'exact'``). Default is False.
+    q_chunk, pair_chunk : int, optional
+        Block sizes of :func:`debye_sinc_sums` / :func:`debye_distance_histograms`;
+        for the exact sum they bound the memory use to about
+        ``8 * q_chunk * pair_chunk`` bytes.
+
+    Returns
+    -------
+    pattern : ndarray, shape (n_q,)
+        Elastic scattering intensity.
+    error : ndarray, shape (n_q,)
+        Only if `return_error`. Conservative (worst-case) bound on the
+        second-order histogram error,
+        ``sum_ab 2 |f_a f_b| q**2 / 6 * sum (r - mean_r)**2`` (``|sinc''| <= 1/3``);
+        the actual error is usually far smaller since the terms cancel.
+    """
+    q = np.asarray(q, dtype=float)
+    _, f, element_index = form_factor_cache.unique(atoms, q)
+    pattern, error = _debye_from_factors(f, element_index, np.asarray(coords, dtype=float), q, method,
+                                         bin_width, q_chunk, pair_chunk)
+    if return_error:
+        return pattern, error
+    return pattern
+
+
+def _debye_from_factors(f, element_index, coords, q, method, bin_width, q_chunk, pair_chunk):
+    """Debye pattern and error estimate of one structure from precomputed unique form factors."""
+    counts = np.bincount(element_index, minlength=f.shape[0])
+    pattern = counts @ (f * f)
+    error = np.zeros(q.size)
+    if method == 'exact':
+        pairs, sums = debye_sinc_sums(coords, element_index, q, q_chunk, pair_chunk or 16384)
+    elif method == 'histogram':
+        pairs, hist, mean_r, spread = debye_distance_histograms(coords, element_index, bin_width,
+                                                                pair_chunk or 65536)
+        sums = debye_histogram_sums(hist, mean_r, q, q_chunk)
+        f_products = np.abs(f[pairs[:, 0]] * f[pairs[:, 1]])
+        error = 2 * (spread @ f_products) * q ** 2 / 6
+    else:
+        raise ValueError(f"Unknown method {method!r}; use 'exact' or 'histogram'.")
+    pattern += 2 * np.einsum('gq,gq,gq->q', f[pairs[:, 0]], f[pairs[:, 1]], sums)
+    return pattern, error
+
+
+def _trajectory_task(task):
+    """Worker: Debye patterns of frames[start:stop] (see :func:`debye_trajectory`)."""
+    frames, start, stop, f, element_index, q, method, bin_width, q_chunk, max_elements = task
+    n_frames, n_atoms = stop - start, frames.shape[1]
+    patterns = np.empty((n_frames, q.size))
+    n_pairs = n_atoms * (n_atoms - 1) // 2
+    q_chunk = min(q_chunk, q.size)
+
+    if method != 'exact' or n_pairs * q_chunk > max_elements:
+        # Large systems: one frame at a time with the pair-blocked engine
+        for k in range(n_frames):
+            patterns[k] = _debye_from_factors(f, element_index, np.asarray(frames[start + k], dtype=float), q,
+                                              method, bin_width, q_chunk, None)[0]
+        return patterns
+
+    # Small systems: all pairs of a block of frames at once, grouped by element pair
+    n_elements = f.shape[0]
+    pairs = element_pairs(n_elements)
+    group_of = np.zeros((n_elements, n_elements), dtype=np.intp)
+    group_of[pairs[:, 0], pairs[:, 1]] = np.arange(len(pairs))
+    i_idx, j_idx = np.triu_indices(n_atoms, k=1)
+    ei, ej = element_index[i_idx], element_index[j_idx]
+    pair_group = group_of[np.minimum(ei, ej), np.maximum(ei, ej)]
+    order = np.argsort(pair_group, kind='stable')
+    i_idx, j_idx, pair_group = i_idx[order], j_idx[order], pair_group[order]
+    starts = np.flatnonzero(np.r_[True, pair_group[1:] != pair_group[:-1]]) if n_pairs else np.array([], int)
+    groups = pair_group[starts]
+    f_products = 2 * f[pairs[groups, 0]] * f[pairs[groups, 1]]  # (n_present, n_q)
+    self_term = np.bincount(element_index, minlength=n_elements) @ (f * f)
+    q_over_pi = q / np.pi
+
+    frame_chunk = max(1, max_elements // max(1, n_pairs * q_chunk))
+    for f0 in range(0, n_frames, frame_chunk):
+        f1 = min(f0 + frame_chunk, n_frames)
+        coords = np.asarray(frames[start + f0:start + f1], dtype=float)
+        diff = coords[:, i_idx] - coords[:, j_idx]
+        r = np.sqrt(np.einsum('fpk,fpk->fp', diff, diff))  # (frames, pairs)
+        patterns[f0:f1] = self_term
+        if not n_pairs:
+            continue
+        for q0 in range(0, q.size, q_chunk):
+            q1 = min(q0 + q_chunk, q.size)
+            sinc = np.sinc(r[:, :, np.newaxis] * q_over_pi[q0:q1])
+            sums = np.add.reduceat(sinc, starts, axis=1)  # (frames, n_present, q)
+            patterns[f0:f1, q0:q1] += np.einsum('fgq,gq->fq', sums, f_products[:, q0:q1])
+    return patterns
+
+
+def debye_trajectory(atoms, frames, q, method='exact', bin_width=0.01, q_chunk=256, max_elements=2 ** 22,
+                     n_workers=1, backend=None):
+    """
+    Elastic IAM (Debye) patterns of every frame of a trajectory.
+
+    Form factors are evaluated once for the whole trajectory. For molecules,
+    pair distances and sinc sums of a block of frames are computed at once,
+    with blocks sized to hold about `max_elements` values; systems too large
+    for that are computed frame by frame with :func:`debye_pattern`'s
+    pair-blocked engine.
+
+    Parameters
+    ----------
+    atoms : sequence of str or int
+        Element symbols or atomic numbers, shared by all frames.
+    frames : array_like, shape (n_frames, n_atoms, 3)
+        Coordinates in Angstroms, e.g. from molecular dynamics or wavepacket
+        simulations. HDF5 datasets and memory-mapped arrays are read in
+        blocks.
+    q : array_like, shape (n_q,)
+        Momentum transfer values in inverse Angstroms.
+    method : {'exact', 'histogram'}, optional
+        Debye summation method, see :func:`debye_pattern`. Default is 'exact'.
+    bin_width : float, optional
+        Distance bin width for ``method='histogram'``. Default is 0.01.
+    q_chunk : int, optional
+        Number of q values evaluated at once. Default is 256.
+    max_elements : int, optional
+        Approximate number of array elements of the largest temporary.
+        Default is 2**22 (32 MB of float64).
+    n_workers : int, optional
+        Number of contiguous frame shards, each run as one task. Default is 1
+        (run in the calling process); None uses ``os.cpu_count()``. HDF5
+        datasets and memory-mapped files are reopened by every task, which
+        then reads only its own frames; other arrays are sent as one slice
+        per task.
+    backend : object, optional
+        Object with an ordered ``map(func, iterable)`` method, see
+        :mod:`xrayscatteringtools.parallel`. Defaults to
+        ``ProcessPoolBackend(n_workers)`` when `n_workers` > 1.
+
+    Returns
+    -------
+    ndarray, shape (n_frames, n_q)
+        Elastic scattering intensity of every frame.
+    """
+    q = np.asarray(q, dtype=float)
+    if q.ndim != 1:
+        raise ValueError(f"'q' must be a 1D array, got shape {q.shape}.")
+    if method not in ('exact', 'histogram'):
+        raise ValueError(f"Unknown method {method!r}; use 'exact' or 'histogram'.")
+    if not hasattr(frames, 'shape'):
+        frames = np.asarray(frames, dtype=float)
+    n_frames = frames.shape[0]
+    if len(frames.shape) != 3 or frames.shape[2] != 3 or frames.shape[1] != len(atoms):
+        raise ValueError(f"frames must have shape (n_frames, {len(atoms)}, 3), got {tuple(frames.shape)}.")
+    _, f, element_index = form_factor_cache.unique(atoms, q)
+
+    n_workers = n_workers or os.cpu_count() or 1
+    if backend is None:
+        if n_workers == 1:
+            return _trajectory_task((frames, 0, n_frames, f, element_index, q, method, bin_width, q_chunk,
+                                     max_elements))
+        backend = ProcessPoolBackend(n_workers)
+    reader = file_reader(frames)
+    tasks = []
+    for part in shard(range(n_frames), n_workers):
+        start, stop = part[0], part[-1] + 1
+        source = (reader, start, stop) if reader is not None else (frames[start:stop], 0, stop - start)
+        tasks.append(source + (f, element_index, q, method, bin_width, q_chunk, max_elements))
+    results = backend.map(_trajectory_task, tasks)
+    return np.concatenate(results) if results else np.empty((0, q.size))
@@ -0,0 +1,194 @@
+"""Cached atomic form factors f(q) from the Cromer-Mann coefficients.
+
+The coefficient table is read from ``data/IAM/Scattering_Factors.npy`` once
+per process. Form factors are evaluated for every *unique* element of a
+system with broadcasting (atoms of the same element share a row), and each
+``(element, q grid)`` result is memoized in a bounded LRU cache, so repeated
+theory calls on the same q grid skip the evaluation entirely.
+"""
+
+import hashlib
+import pathlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ..utils import element_symbol_to_number
+
+_coefficients_path = pathlib.Path(__file__).parent / 'data/IAM/Scattering_Factors.npy'
+_coefficients = None
+_coefficients_lock = threading.Lock()
+
+
+def cromer_mann_coefficients():
+    """
+    Return the Cromer-Mann coefficient table, loading it on first use.
+
+    Returns
+    -------
+    ndarray, shape (n_elements, 9)
+        Row ``Z - 1`` holds ``a1..a4, b1..b4, c`` of element Z, with
+        ``f(q) = sum_i a_i exp(-b_i (q / 4 pi)**2) + c``. Read-only.
+    """
+    global _coefficients
+    if _coefficients is None:
+        with _coefficients_lock:
+            if _coefficients is None:
+                table = np.load(_coefficients_path, allow_pickle=True).astype(float)
+                table.setflags(write=False)
+                _coefficients = table
+    return _coefficients
+
+
+def _atomic_numbers(elements):
+    """Atomic numbers of element symbols and/or numbers, as an int array."""
+    elements = np.atleast_1d(np.asarray(elements, dtype=object))
+    Z = np.array([element_symbol_to_number(e) if isinstance(e, str) else int(e) for e in elements],
+                 dtype=int)
+    n_tabulated = cromer_mann_coefficients().shape[0]
+    bad = (Z < 1) | (Z > n_tabulated)
+    if np.any(bad):
+        raise ValueError(f"No form factor coefficients for Z = {Z[bad][0]} (tabulated: 1-{n_tabulated}).")
+    return Z
+
+
+def _evaluate(Z, q):
+    """Form factors of the elements `Z` on `q`, shape ``(len(Z),) + q.shape``."""
+    coeffs = cromer_mann_coefficients()[Z - 1]
+    s2 = (q.ravel() / (4 * np.pi)) ** 2
+    a, b, c = coeffs[:, :4], coeffs[:, 4:8], coeffs[:, 8]
+    f = np.einsum('ek,ekq->eq', a, np.exp(-b[:, :, np.newaxis] * s2)) + c[:, np.newaxis]
+    return f.reshape((len(Z),) + q.shape)
+
+
+class FormFactorCache:
+    """Bounded LRU cache of atomic form factors keyed by (element, q grid).
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of (element, q grid) entries kept. Default is 256.
+
+    Notes
+    -----
+    q grids are keyed by a hash of their bytes, shape and dtype, so equal
+    grids built separately share entries. Cached arrays are read-only.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _q_key(q):
+        return (q.shape, hashlib.sha1(q.tobytes()).hexdigest())
+
+    def unique(self, elements, q):
+        """
+        Form factors of the unique elements of `elements`.
+
+        Parameters
+        ----------
+        elements : sequence of str or int
+            Element symbols or atomic numbers, e.g. one per atom.
+        q : array_like
+            Momentum transfer grid (any shape), in inverse Angstroms.
+
+        Returns
+        -------
+        Z : ndarray of int, shape (n_unique,)
+            Sorted unique atomic numbers.
+        f : ndarray, shape (n_unique,) + q.shape
+            Form factor of each unique element.
+        inverse : ndarray of int, shape (len(elements),)
+            Row of `f` for every entry of `elements`.
+        """
+        q = np.ascontiguousarray(q, dtype=float)
+        Z, inverse = np.unique(_atomic_numbers(elements), return_inverse=True)
+        q_key = self._q_key(q)
+        f = np.empty((Z.size,) + q.shape)
+        missing = []
+        with self._lock:
+            for i, z in enumerate(Z):
+                entry = self._entries.get((int(z), q_key))
+                if entry is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end((int(z), q_key))
+                    f[i] = entry
+            self.hits += Z.size - len(missing)
+            self.misses += len(missing)
+        if missing:
+            f[missing] = _evaluate(Z[missing], q)
+            with self._lock:
+                for i in missing:
+                    entry = f[i].copy()
+                    entry.setflags(write=False)
+                    self._entries[(int(Z[i]), q_key)] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return Z, f, inverse.reshape(-1)
+
+    def __call__(self, elements, q):
+        """Form factor of every entry of `elements`, shape ``(len(elements),) + q.shape``."""
+        _, f, inverse = self.unique(elements, q)
+        return f[inverse]
+
+    def clear(self):
+        """Drop all entries and reset the hit/miss counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (f"FormFactorCache(maxsize={self.maxsize}, size={len(self)}, "
+                f"hits={self.hits}, misses={self.misses})")
+
+
+# Process-wide cache used by the IAM functions
+form_factor_cache = FormFactorCache()
+
+
+def form_factors(elements, q):
+    """
+    Atomic form factors f(q) of a list of atoms, served from the shared cache.
+
+    Parameters
+    ----------
+    elements : sequence of str or int
+        Element symbols or atomic numbers of the atoms.
+    q : array_like
+        Momentum transfer values (any shape), in inverse Angstroms.
+
+    Returns
+    -------
+    ndarray, shape (len(elements),) + q.shape
+        Form factor of every atom.
+    """
+    return form_factor_cache(elements, q)
+
+
+def atomic_form_factor(element, q):
+    """
+    Atomic form factor f(q) of a single element.
+
+    Parameters
+    ----------
+    element : str or int
+        Element symbol or atomic number.
+    q : array_like
+        Momentum transfer values, in inverse Angstroms.
+
+    Returns
+    -------
+    ndarray
+        f(q) with the shape of `q`.
+    """
+    return form_factor_cache([element], q)[0]
@@ -6,6 +6,8 @@ import pathlib
 import xraylib
 from scipy.constants import physical_constants
 import types
+from .form_factors import form_factors
+from .debye import debye_pattern
 
 base_path = pathlib.Path(__file__).parent
 
@@ -43,7 +45,7 @@ def _iam_loader(system):
         )
     return num_atoms, atoms, coords
 
-def iam_elastic_pattern(system, q_arr):
+def iam_elastic_pattern(system, q_arr, method='exact', bin_width=0.01):
     """
     Compute the elastic (coherent) X-ray scattering intensity (Debye scattering) 
     for a molecule or atomic cluster.
@@ -54,6 +56,12 @@ def iam_elastic_pattern(system, q_arr):
         Path to an XYZ or MOL file containing the atomic coordinates and element symbols, or xrayscatteringtools.theory.geometries object.
     q_arr : array_like
         Array of momentum transfer values (q) at which to evaluate the scattering intensity.
+    method : {'exact', 'histogram'}, optional
+        'exact' (default) sums over every atom pair. 'histogram' sums over a
+        per-element-pair histogram of pair distances, an approximation for
+        clusters with 10^4+ atoms (see :func:`~xrayscatteringtools.theory.debye.debye_pattern`).
+    bin_width : float, optional
+        Distance bin width in Angstroms for method='histogram' (default 0.01).
 
     Returns
     -------
@@ -62,46 +70,21 @@ def iam_elastic_pattern(system, q_arr):
 
     Notes
     -----
-    - Uses atomic scattering factors loaded from 'Scattering_Factors.npy'.
+    - Uses atomic scattering factors from 'Scattering_Factors.npy', served by the
+      cached :func:`~xrayscatteringtools.theory.form_factors.form_factors`.
     - Includes both atomic self-scattering and molecular interference terms.
-    - The molecular interference term is calculated using the Debye formula with np.sinc.
+    - The molecular interference term is calculated using the Debye formula with np.sinc,
+      grouped by element pair (see :func:`~xrayscatteringtools.theory.debye.debye_pattern`),
+      so memory stays bounded for systems with thousands of atoms.
     """
     q_arr = np.asarray(q_arr, dtype=float)
     if q_arr.ndim != 1:
         raise ValueError(f"'q_arr' must be a 1D array, got shape {q_arr.shape}.")
     num_atoms, atoms, coords = _iam_loader(system)
     
-    coords = np.array(coords)  # Ensure coords is a NumPy array for advanced indexing
-    atomic_numbers = [element_symbol_to_number(atom) for atom in atoms] # Get atomic numbers using mendeleev
-    scattering_factors_coeffs = np.load(base_path / 'data/IAM/Scattering_Factors.npy', allow_pickle=True)
-    scattering_factors = np.zeros((num_atoms, len(q_arr))) # Preallocation for the structure factor array
-    q4pi = q_arr / (4 * np.pi)
-    for i, atom in enumerate(atomic_numbers): # Loop all atoms
-        factor_coeff = scattering_factors_coeffs[atom-1] # Grab the factor coefficients for that element, -1 for zero-based indexing
-        # Calculate atomic scattering factor for each q in q_arr
-        scattering_factors[i,:] = (
-            factor_coeff[0] * np.exp(-factor_coeff[4] * q4pi ** 2) +
-            factor_coeff[1] * np.exp(-factor_coeff[5] * q4pi ** 2) +
-            factor_coeff[2] * np.exp(-factor_coeff[6] * q4pi ** 2) +
-            factor_coeff[3] * np.exp(-factor_coeff[7] * q4pi ** 2) +
-            factor_coeff[8]
-        )
-    # Compute all pairwise distance vectors between atoms
-    r_vectors = coords[:, np.newaxis, :] - coords[np.newaxis, :, :]  # shape: (num_atoms, num_atoms, 3)
-    distances = np.linalg.norm(r_vectors, axis=2)  # shape: (num_atoms, num_atoms)
-
-    # Atomic contribution (self-scattering)
-    atomic_contribution = np.sum(scattering_factors**2, axis=0)
-    elastic_pattern = np.copy(atomic_contribution)
-
-    # Molecular contribution (interference terms) — vectorized Debye sum
-    i_idx, j_idx = np.triu_indices(num_atoms, k=1)
-    r_ij = distances[i_idx, j_idx]  # shape: (n_pairs,)
-    fi = scattering_factors[i_idx, :]  # shape: (n_pairs, n_q)
-    fj = scattering_factors[j_idx, :]  # shape: (n_pairs, n_q)
-    # np.sinc(x) = sin(pi*x)/(pi*x), so argument is q*r/pi
-    sinc_term = np.sinc(q_arr[np.newaxis, :] * r_ij[:, np.newaxis] / np.pi)
-    elastic_pattern += np.sum(2 * fi * fj * sinc_term, axis=0)
+    coords = np.array(coords, dtype=float)
+    # Debye sum grouped by element pair, in bounded-memory pair and q blocks
+    elastic_pattern = debye_pattern(atoms, coords, q_arr, method=method, bin_width=bin_width)
 
     return elastic_pattern
 
@@ -280,23 +263,14 @@ def iam_elastic_pattern_oriented(system, q_arr, phi_arr):
     # 1. Read atomic data
     num_atoms, atoms, coords = _iam_loader(system)
     coords = np.array(coords)
-    atomic_numbers = [element_symbol_to_number(atom) for atom in atoms]
-    scattering_factors_coeffs = np.load(base_path / 'data/IAM/Scattering_Factors.npy', allow_pickle=True)
 
     # 2. Create a polar grid of q-vectors in the qx-qy plane
     q_grid, phi_grid = np.meshgrid(q_arr, phi_arr, indexing='ij')
 
     # 3. Calculate q-dependent atomic scattering factors F(q)
-    # F(q) depends only on the magnitude of q, which is our radial coordinate.
-    scattering_factors = np.zeros((num_atoms, len(q_arr), len(phi_arr)))
-    q4pi_sq_grid = (q_grid / (4 * np.pi))**2
-    for i, atom_num in enumerate(atomic_numbers):
-        fc = scattering_factors_coeffs[atom_num - 1]
-        scattering_factors[i, :, :] = (
-            fc[0] * np.exp(-fc[4] * q4pi_sq_grid) + fc[1] * np.exp(-fc[5] * q4pi_sq_grid) +
-            fc[2] * np.exp(-fc[6] * q4pi_sq_grid) + fc[3] * np.exp(-fc[7] * q4pi_sq_grid) +
-            fc[8]
-        )
+    # F(q) depends only on the magnitude of q, which is our radial coordinate,
+    # so it is evaluated (and cached) on q_arr and broadcast over phi.
+    scattering_factors = form_factors(atoms, np.asarray(q_arr, dtype=float))[:, :, np.newaxis]
 
     # 4. Calculate the total scattering amplitude
     # Define the q-vectors for our planar slice (qz = 0)
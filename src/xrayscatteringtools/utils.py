@@ -1,3 +1,4 @@
+import os
 import re
 from IPython import get_ipython
 import numpy as np
@@ -7,6 +8,18 @@ import pathlib
 
 _data_path = pathlib.Path(__file__).parent / "data"
 
+def _cache_dir(*parts):
+    """Return (and create) a per-user cache directory for derived data.
+
+    The root defaults to ``~/.cache/xrayscatteringtools`` and can be moved with
+    the ``XRAYSCATTERINGTOOLS_CACHE`` environment variable.
+    """
+    root = os.environ.get("XRAYSCATTERINGTOOLS_CACHE")
+    root = pathlib.Path(root) if root else pathlib.Path.home() / ".cache" / "xrayscatteringtools"
+    path = root.joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
 def enable_underscore_cleanup():
     """
     Register a Jupyter Notebook post-cell hook to automatically delete user-defined 
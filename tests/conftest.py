@@ -0,0 +1,9 @@
+"""Shared pytest fixtures."""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache(tmp_path, monkeypatch):
+    """Keep on-disk caches (layouts, archive data) out of the real home directory."""
+    monkeypatch.setenv("XRAYSCATTERINGTOOLS_CACHE", str(tmp_path / "xst_cache"))
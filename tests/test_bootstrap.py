@@ -0,0 +1,88 @@
+"""Tests for xrayscatteringtools.analysis.bootstrap."""
+
+import numpy as np
+import pytest
+
+from xrayscatteringtools.analysis import (
+    bin_difference_signal,
+    bootstrap_difference_signal,
+    bootstrap_weights,
+)
+from xrayscatteringtools.parallel import SerialBackend
+
+
+@pytest.fixture
+def shots():
+    rng = np.random.default_rng(0)
+    n, n_q = 3000, 12
+    q = np.linspace(0.5, 4, n_q)
+    delays = rng.uniform(-1, 3, n)
+    laser_on = rng.random(n) < 0.6
+    i0 = rng.uniform(0.5, 1.5, n)
+    signal = np.where(laser_on & (delays > 0), 0.1, 0.0)[:, None] * np.sin(q)
+    azav = i0[:, None] * (1 / q + signal + rng.normal(0, 0.05, (n, n_q)))
+    return azav, delays, laser_on, i0
+
+
+class TestBootstrapWeights:
+    def test_stratified_counts(self):
+        starts, counts = np.array([0, 5, 5]), np.array([5, 0, 7])
+        w = bootstrap_weights(np.random.default_rng(0), starts, counts)
+        assert w.size == 12
+        assert w[:5].sum() == 5 and w[5:].sum() == 7
+
+
+class TestBootstrapDifferenceSignal:
+    def test_same_point_estimate(self, shots):
+        azav, delays, laser_on, i0 = shots
+        boot = bootstrap_difference_signal(azav, delays, laser_on, norm=i0, bins=6, n_boot=50,
+                                           seed=0, n_workers=1)
+        ref = bin_difference_signal(azav, delays, laser_on, norm=i0, bins=6)
+        np.testing.assert_allclose(boot['dS'], ref['dS'])
+        assert boot['dS_lower'].shape == boot['dS_upper'].shape == ref['dS'].shape
+        assert np.all(boot['dS_lower'] <= boot['dS_upper'])
+
+    @pytest.mark.parametrize("reference", ["global", "binned"])
+    def test_std_matches_analytic_error(self, shots, reference):
+        azav, delays, laser_on, i0 = shots
+        boot = bootstrap_difference_signal(azav, delays, laser_on, norm=i0, bins=4, n_boot=300,
+                                           seed=1, n_workers=1, reference=reference)
+        np.testing.assert_allclose(boot['dS_boot_std'], boot['dS_err'], rtol=0.25)
+
+    def test_reproducible_for_any_worker_count(self, shots):
+        azav, delays, laser_on, _ = shots
+        kwargs = dict(bins=3, n_boot=40, seed=7, return_samples=True)
+        one = bootstrap_difference_signal(azav, delays, laser_on, n_workers=1, **kwargs)
+        four = bootstrap_difference_signal(azav, delays, laser_on, n_workers=4,
+                                           backend=SerialBackend(), batch_size=3, **kwargs)
+        np.testing.assert_allclose(one['dS_samples'], four['dS_samples'])
+
+    def test_process_pool(self, shots):
+        azav, delays, laser_on, _ = shots
+        kwargs = dict(bins=3, n_boot=20, seed=3)
+        serial = bootstrap_difference_signal(azav, delays, laser_on, n_workers=1, **kwargs)
+        pooled = bootstrap_difference_signal(azav, delays, laser_on, n_workers=2, **kwargs)
+        np.testing.assert_allclose(serial['dS_lower'], pooled['dS_lower'])
+        np.testing.assert_allclose(serial['dS_upper'], pooled['dS_upper'])
+
+    def test_process_pool_memmap_source(self, shots, tmp_path):
+        azav, delays, laser_on, i0 = shots
+        np.save(tmp_path / "azav.npy", azav)
+        kwargs = dict(norm=i0, bins=3, n_boot=20, seed=4, return_samples=True)
+        serial = bootstrap_difference_signal(azav, delays, laser_on, n_workers=1, **kwargs)
+        pooled = bootstrap_difference_signal(np.load(tmp_path / "azav.npy", mmap_mode="r"), delays,
+                                             laser_on, n_workers=2, **kwargs)
+        np.testing.assert_allclose(serial['dS_samples'], pooled['dS_samples'])
+
+    def test_confidence_band_coverage(self, shots):
+        azav, delays, laser_on, i0 = shots
+        narrow = bootstrap_difference_signal(azav, delays, laser_on, norm=i0, bins=3, n_boot=200,
+                                             seed=2, n_workers=1, confidence=0.5)
+        wide = bootstrap_difference_signal(azav, delays, laser_on, norm=i0, bins=3, n_boot=200,
+                                           seed=2, n_workers=1, confidence=0.99)
+        assert np.all(wide['dS_upper'] - wide['dS_lower'] > narrow['dS_upper'] - narrow['dS_lower'])
+
+    def test_too_few_resamples(self, shots):
+        azav, delays, laser_on, _ = shots
+        with pytest.raises(ValueError, match="n_boot"):
+            bootstrap_difference_signal(azav, delays, laser_on, n_boot=1)
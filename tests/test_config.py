@@ -0,0 +1,157 @@
+"""Tests for xrayscatteringtools.config."""
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+from xrayscatteringtools import config as config_mod
+from xrayscatteringtools.config import RunRangeIndex, ExperimentConfig, load_config
+from xrayscatteringtools.io import get_config, get_config_for_runs
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    """Write a config with closed, open-ended and overlapping run ranges."""
+    config = {
+        "data_paths": [
+            {"runs": [1, 50], "path": "/data/exp1/"},
+            {"runs": [51, float("inf")], "path": "/data/exp2/"},
+        ],
+        "tt_calibration": [
+            {"runs": [10, 20], "slope": 1.0, "intercept": 0.0},
+            {"runs": [15, 30], "slope": 2.0, "intercept": 1.0},  # overlaps the first
+            {"runs": [40, 40], "slope": 3.0, "intercept": 2.0},
+        ],
+        "beamline": "CXI",
+    }
+    path = str(tmp_path / "config.yaml")
+    with open(path, "w") as f:
+        yaml.dump(config, f)
+    return path
+
+
+def _linear_scan(entries, run):
+    for i, entry in enumerate(entries):
+        lower, upper = entry["runs"]
+        if lower <= run <= upper:
+            return i
+    return -1
+
+
+class TestRunRangeIndex:
+    ENTRIES = [
+        {"runs": [10, 20], "v": "a"},
+        {"runs": [15, 30], "v": "b"},
+        {"runs": [40, 40], "v": "c"},
+        {"runs": [5, 12], "v": "d"},
+        {"runs": [60, float("inf")], "v": "e"},
+    ]
+
+    def test_matches_linear_scan(self):
+        index = RunRangeIndex(self.ENTRIES)
+        runs = np.arange(0, 120)
+        expected = [_linear_scan(self.ENTRIES, r) for r in runs]
+        np.testing.assert_array_equal(index.lookup(runs), expected)
+
+    def test_inclusive_bounds(self):
+        index = RunRangeIndex(self.ENTRIES)
+        assert index.lookup(30) == 1
+        assert index.lookup(31) == -1
+        assert index.lookup(40) == 2
+        assert index.lookup(41) == -1
+
+    def test_open_ended(self):
+        index = RunRangeIndex(self.ENTRIES)
+        assert index.lookup(10**9) == 4
+
+    def test_scalar_returns_int(self):
+        assert isinstance(RunRangeIndex(self.ENTRIES).lookup(12), int)
+
+    def test_values_vectorized(self):
+        index = RunRangeIndex(self.ENTRIES)
+        np.testing.assert_array_equal(index.values([11, 25, 40, 99], "v"), ["a", "b", "c", "e"])
+
+    def test_values_shape(self):
+        index = RunRangeIndex(self.ENTRIES)
+        assert index.values(np.full((2, 3), 16), "v").shape == (2, 3)
+
+    def test_values_missing_raises(self):
+        index = RunRangeIndex(self.ENTRIES, key="k")
+        with pytest.raises(ValueError, match="No k/v value found for run number: 35"):
+            index.values([11, 35], "v")
+
+    def test_values_only_reads_matched_entries(self):
+        entries = [
+            {"runs": [1, 10], "v": [1, 2]},
+            {"runs": [11, 20]},               # lacks the subkey
+            {"runs": [21, 30], "v": [1, 2, 3]},  # ragged w.r.t. the first entry
+        ]
+        index = RunRangeIndex(entries)
+        np.testing.assert_array_equal(index.values([1, 5], "v"), [[1, 2], [1, 2]])
+        np.testing.assert_array_equal(index.values([25], "v"), [[1, 2, 3]])
+
+    def test_empty(self):
+        index = RunRangeIndex([])
+        assert index.lookup(5) == -1
+        np.testing.assert_array_equal(index.lookup([1, 2]), [-1, -1])
+
+
+class TestLoadConfig:
+    def test_cached(self, config_file):
+        assert load_config(config_file) is load_config(config_file)
+
+    def test_reloaded_on_change(self, config_file):
+        first = load_config(config_file)
+        with open(config_file, "a") as f:
+            f.write("extra: 1\n")
+        st = os.stat(config_file)
+        os.utime(config_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        second = load_config(config_file)
+        assert second is not first
+        assert second["extra"] == 1
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            load_config(str(tmp_path / "nope.yaml"))
+
+    def test_index_cached(self, config_file):
+        config = load_config(config_file)
+        assert config.index("data_paths") is config.index("data_paths")
+
+    def test_values_for_runs(self, config_file):
+        config = ExperimentConfig(config_file)
+        assert config.values_for_runs([1, 51, 5000], "data_paths", "path") == [
+            "/data/exp1/", "/data/exp2/", "/data/exp2/"]
+
+    def test_values_for_runs_returns_copies(self, tmp_path):
+        path = tmp_path / "cfg.yaml"
+        path.write_text("masks:\n  - runs: [1, 10]\n    pixels: [1, 2]\n")
+        config = ExperimentConfig(str(path))
+        config.values_for_runs([3], "masks", "pixels")[0].append(99)
+        assert config.values_for_runs([3], "masks", "pixels") == [[1, 2]]
+
+
+class TestIOIntegration:
+    def test_first_match_on_overlap(self, config_file):
+        assert get_config_for_runs([12, 17, 25], "tt_calibration", "slope",
+                                   config_path=config_file) == [1.0, 1.0, 2.0]
+
+    def test_open_ended_range(self, config_file):
+        assert get_config_for_runs(10**6, "data_paths", "path", config_path=config_file) == "/data/exp2/"
+
+    def test_numpy_run_numbers(self, config_file):
+        assert get_config_for_runs(np.array([5, 60]), "data_paths", "path",
+                                   config_path=config_file) == ["/data/exp1/", "/data/exp2/"]
+
+    def test_get_config_returns_copy(self, config_file):
+        paths = get_config("data_paths", config_path=config_file)
+        paths.clear()
+        assert len(get_config("data_paths", config_path=config_file)) == 2
+
+    def test_no_reparse_between_calls(self, config_file, monkeypatch):
+        get_config("beamline", config_path=config_file)
+        monkeypatch.setattr(config_mod.yaml, "safe_load",
+                            lambda f: pytest.fail("config parsed twice"))
+        assert get_config("beamline", config_path=config_file) == "CXI"
@@ -0,0 +1,180 @@
+"""Tests for xrayscatteringtools.theory.debye."""
+
+import pickle
+
+import h5py
+import numpy as np
+import pytest
+
+from xrayscatteringtools.theory.debye import (
+    debye_pattern,
+    debye_distance_histograms,
+    debye_sinc_sums,
+    debye_trajectory,
+    element_pairs,
+    pair_distance_blocks,
+)
+from xrayscatteringtools.parallel import ProcessPoolBackend, SerialBackend
+from xrayscatteringtools.theory.form_factors import form_factors
+
+
+def _naive_debye(atoms, coords, q):
+    """Full double sum over all atom pairs."""
+    f = form_factors(atoms, q)
+    r = np.linalg.norm(coords[:, None] - coords[None], axis=-1)
+    return np.einsum('iq,jq,ijq->q', f, f, np.sinc(r[:, :, None] * q / np.pi))
+
+
+@pytest.fixture
+def cluster():
+    rng = np.random.default_rng(0)
+    atoms = list(rng.choice(['C', 'O', 'H', 'S'], 60))
+    coords = rng.uniform(-6, 6, (60, 3))
+    return atoms, coords
+
+
+class TestPairDistanceBlocks:
+    def test_covers_every_pair_once(self, cluster):
+        _, coords = cluster
+        rows = np.arange(0, 60, 2)
+        cols = np.arange(1, 60, 2)
+        same = np.concatenate(list(pair_distance_blocks(coords, rows, rows, True, pair_chunk=50)))
+        cross = np.concatenate(list(pair_distance_blocks(coords, rows, cols, False, pair_chunk=50)))
+        r = np.linalg.norm(coords[:, None] - coords[None], axis=-1)
+        i, j = np.triu_indices(30, k=1)
+        np.testing.assert_allclose(np.sort(same), np.sort(r[rows[i], rows[j]]))
+        np.testing.assert_allclose(np.sort(cross), np.sort(r[np.ix_(rows, cols)].ravel()))
+
+
+class TestDebye:
+    def test_matches_naive_sum(self, cluster):
+        atoms, coords = cluster
+        q = np.linspace(0.0, 8.0, 70)
+        expected = _naive_debye(atoms, coords, q)
+        np.testing.assert_allclose(debye_pattern(atoms, coords, q), expected, rtol=1e-10)
+        # Tiny blocks exercise the pair and q chunking
+        np.testing.assert_allclose(debye_pattern(atoms, coords, q, q_chunk=7, pair_chunk=5), expected, rtol=1e-10)
+
+    def test_forward_scattering_is_total_squared(self, cluster):
+        atoms, coords = cluster
+        f0 = form_factors(atoms, [0.0])[:, 0]
+        assert debye_pattern(atoms, coords, [0.0])[0] == pytest.approx(f0.sum() ** 2)
+
+    def test_group_sums(self):
+        coords = np.array([[0.0, 0, 0], [1.0, 0, 0], [0, 2.0, 0], [0, 0, 0]])  # last atom overlaps the first
+        q = np.array([0.0, 1.0, 3.0])
+        pairs, sums = debye_sinc_sums(coords, [0, 0, 1, 1], q)
+        np.testing.assert_array_equal(pairs, element_pairs(2))
+
+        def sinc(r):
+            return np.sinc(q * r / np.pi)
+
+        np.testing.assert_allclose(sums[0], sinc(1.0))
+        np.testing.assert_allclose(sums[1], sinc(2.0) + sinc(0.0) + sinc(np.sqrt(5)) + sinc(1.0))
+        np.testing.assert_allclose(sums[2], sinc(2.0))
+
+
+class TestHistogramDebye:
+    def test_histogram_counts_and_means(self):
+        coords = np.array([[0.0, 0, 0], [1.0, 0, 0], [1.004, 0, 0], [0, 0, 2.5]])
+        pairs, counts, mean_r, spread = debye_distance_histograms(coords, [0, 0, 0, 1], bin_width=0.5)
+        assert counts.sum() == 6
+        g_aa = 0  # (0, 0) group: distances 1.0, 1.004, 0.004
+        np.testing.assert_array_equal(counts[g_aa, :3], [1, 0, 2])
+        assert mean_r[g_aa, 2] == pytest.approx(1.002)
+        assert spread[g_aa] == pytest.approx(2 * 0.002 ** 2)
+        assert np.isnan(mean_r[g_aa, 1])
+
+    def test_converges_to_exact(self, cluster):
+        atoms, coords = cluster
+        q = np.linspace(0.0, 8.0, 70)
+        exact = debye_pattern(atoms, coords, q)
+        coarse, coarse_err = debye_pattern(atoms, coords, q, method='histogram', bin_width=0.2, return_error=True)
+        fine, fine_err = debye_pattern(atoms, coords, q, method='histogram', bin_width=0.005, return_error=True)
+        assert np.all(np.abs(coarse - exact) <= coarse_err + 1e-9)
+        assert np.all(np.abs(fine - exact) <= fine_err + 1e-9)
+        assert np.abs(fine - exact).max() < np.abs(coarse - exact).max()
+        assert fine_err.max() < 1e-3 * exact.max()
+        _, exact_err = debye_pattern(atoms, coords, q, return_error=True)
+        np.testing.assert_array_equal(exact_err, 0)
+
+    def test_iam_histogram_mode(self):
+        from xrayscatteringtools.theory.iam import iam_elastic_pattern
+        from types import SimpleNamespace
+        rng = np.random.default_rng(3)
+        system = SimpleNamespace(atoms=['O', 'H', 'H'] * 100, geometry=rng.uniform(0, 15, (300, 3)))
+        q = np.linspace(0.1, 5, 40)
+        exact = iam_elastic_pattern(system, q)
+        approx = iam_elastic_pattern(system, q, method='histogram', bin_width=0.002)
+        np.testing.assert_allclose(approx, exact, rtol=1e-4)
+        with pytest.raises(ValueError, match="method"):
+            iam_elastic_pattern(system, q, method='fast')
+
+
+class TestDebyeTrajectory:
+    @pytest.fixture
+    def trajectory(self):
+        rng = np.random.default_rng(4)
+        atoms = ['S'] + ['F'] * 6
+        base = rng.uniform(-1.5, 1.5, (7, 3))
+        frames = base + rng.normal(0, 0.1, (25, 7, 3))
+        return atoms, frames
+
+    def test_matches_per_frame(self, trajectory):
+        atoms, frames = trajectory
+        q = np.linspace(0.0, 10.0, 45)
+        expected = np.stack([debye_pattern(atoms, frame, q) for frame in frames])
+        # Small blocks: several frame blocks and q chunks
+        result = debye_trajectory(atoms, frames, q, q_chunk=8, max_elements=2000)
+        assert result.shape == (25, 45)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+        # Too small for one frame: falls back to the per-frame engine
+        np.testing.assert_allclose(debye_trajectory(atoms, frames, q, max_elements=10), expected, rtol=1e-12)
+
+    def test_histogram_and_backends(self, trajectory, tmp_path):
+        atoms, frames = trajectory
+        q = np.linspace(0.1, 6.0, 30)
+        expected = np.stack([debye_pattern(atoms, frame, q, method='histogram') for frame in frames])
+        result = debye_trajectory(atoms, frames, q, method='histogram', n_workers=3, backend=SerialBackend())
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+        mm = np.lib.format.open_memmap(tmp_path / "traj.npy", mode="w+", dtype=np.float32, shape=frames.shape)
+        mm[:] = frames
+        mm.flush()
+        pooled = debye_trajectory(atoms, mm, q, n_workers=2, backend=ProcessPoolBackend(2))
+        serial = debye_trajectory(atoms, np.asarray(mm), q)
+        np.testing.assert_allclose(pooled, serial, rtol=1e-12)
+
+    def test_workers_read_their_own_frames(self, trajectory, tmp_path):
+        atoms, frames = trajectory
+        q = np.linspace(0.1, 6.0, 30)
+        expected = debye_trajectory(atoms, frames, q)
+        tasks = []
+
+        class RecordingBackend(SerialBackend):
+            def map(self, func, iterable):
+                iterable = list(iterable)
+                tasks.extend(iterable)
+                return super().map(func, iterable)
+
+        np.save(tmp_path / "traj.npy", frames)
+        with h5py.File(tmp_path / "traj.h5", "w") as f:
+            f["md/coords"] = frames
+        with h5py.File(tmp_path / "traj.h5", "r") as f:
+            # In-memory frames are sliced; files are reopened with a frame range
+            cases = [(frames, [(0, 9), (0, 8), (0, 8)]),
+                     (np.load(tmp_path / "traj.npy", mmap_mode="r"), [(0, 9), (9, 17), (17, 25)]),
+                     (f["md/coords"], [(0, 9), (9, 17), (17, 25)])]
+            for source, ranges in cases:
+                tasks.clear()
+                result = debye_trajectory(atoms, source, q, n_workers=3, backend=RecordingBackend())
+                np.testing.assert_allclose(result, expected, rtol=1e-12)
+                assert [task[1:3] for task in tasks] == ranges
+                # No task carries the whole trajectory
+                assert all(len(pickle.dumps(task[0])) < frames.nbytes / 2 for task in tasks)
+
+    def test_shape_errors(self, trajectory):
+        atoms, frames = trajectory
+        with pytest.raises(ValueError, match="frames must have shape"):
+            debye_trajectory(atoms[:-1], frames, np.linspace(0, 1, 5))
+        with pytest.raises(ValueError, match="1D"):
+            debye_trajectory(atoms, frames, np.ones((2, 2)))
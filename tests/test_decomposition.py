@@ -0,0 +1,68 @@
+"""Tests for xrayscatteringtools.analysis.decomposition."""
+
+import h5py
+import numpy as np
+import pytest
+
+from xrayscatteringtools.analysis import randomized_svd
+
+
+@pytest.fixture
+def low_rank():
+    """Shots built from three q components plus small noise."""
+    rng = np.random.default_rng(0)
+    n, n_q = 5000, 60
+    q = np.linspace(0.5, 4, n_q)
+    basis = np.stack([np.sin(q), np.exp(-q), np.cos(3 * q)])
+    weights = rng.normal(size=(n, 3)) * [10.0, 5.0, 2.0]
+    return weights @ basis + 3.0 + rng.normal(0, 0.01, (n, n_q))
+
+
+def _reference(data):
+    centered = data - data.mean(axis=0)
+    _, s, vt = np.linalg.svd(centered, full_matrices=False)
+    return s, vt, (s ** 2).sum()
+
+
+class TestRandomizedSvd:
+    def test_matches_full_svd(self, low_rank):
+        s_ref, vt_ref, total = _reference(low_rank)
+        res = randomized_svd(low_rank, n_components=3, chunk_size=700, seed=1)
+        np.testing.assert_allclose(res['singular_values'], s_ref[:3], rtol=1e-8)
+        for comp, ref in zip(res['components'], vt_ref[:3]):
+            assert abs(comp @ ref) == pytest.approx(1, abs=1e-8)
+        np.testing.assert_allclose(res['explained_variance_ratio'], s_ref[:3] ** 2 / total, rtol=1e-8)
+        np.testing.assert_allclose(res['explained_variance'], s_ref[:3] ** 2 / (len(low_rank) - 1), rtol=1e-8)
+        np.testing.assert_allclose(res['mean'], low_rank.mean(axis=0))
+
+    def test_chunk_size_and_seed_invariance(self, low_rank):
+        a = randomized_svd(low_rank, n_components=3, chunk_size=10**6, seed=1)
+        b = randomized_svd(low_rank, n_components=3, chunk_size=333, seed=2)
+        np.testing.assert_allclose(a['components'], b['components'], atol=1e-8)
+
+    def test_scores_and_mask(self, low_rank):
+        mask = np.ones(len(low_rank), dtype=bool)
+        mask[::7] = False
+        res = randomized_svd(low_rank, n_components=2, mask=mask, return_scores=True, chunk_size=512)
+        kept = low_rank[mask]
+        assert res['n_samples'] == mask.sum()
+        np.testing.assert_allclose(res['mean'], kept.mean(axis=0))
+        expected = (kept - kept.mean(axis=0)) @ res['components'].T
+        np.testing.assert_allclose(res['scores'][mask], expected)
+        assert np.isnan(res['scores'][~mask]).all()
+
+    def test_hdf5_multidim_uncentered(self, low_rank, tmp_path):
+        stack = low_rank.reshape(-1, 2, 30)
+        with h5py.File(tmp_path / "azav.h5", "w") as f:
+            f.create_dataset("azav", data=stack, chunks=(256, 2, 30))
+        with h5py.File(tmp_path / "azav.h5", "r") as f:
+            res = randomized_svd(f["azav"], n_components=2, center=False, chunk_size=1000)
+        _, s, vt = np.linalg.svd(low_rank, full_matrices=False)
+        assert res['components'].shape == (2, 2, 30)
+        np.testing.assert_allclose(res['singular_values'], s[:2], rtol=1e-8)
+        assert abs(res['components'][0].ravel() @ vt[0]) == pytest.approx(1)
+        np.testing.assert_array_equal(res['mean'], 0)
+
+    def test_invalid_components(self, low_rank):
+        with pytest.raises(ValueError, match="n_components"):
+            randomized_svd(low_rank, n_components=61)
@@ -0,0 +1,140 @@
+"""Tests for xrayscatteringtools.analysis.delay_binning."""
+
+import numpy as np
+import pytest
+
+from xrayscatteringtools.analysis import (
+    delay_bin_edges,
+    assign_delay_bins,
+    binned_mean,
+    bin_difference_signal,
+)
+
+
+def _loop_binning(data, bin_idx, n_bins):
+    """Reference per-bin loop the vectorized binning must reproduce."""
+    mean = np.full((n_bins,) + data.shape[1:], np.nan)
+    sem = np.full_like(mean, np.nan)
+    for b in range(n_bins):
+        rows = data[bin_idx == b]
+        if len(rows):
+            mean[b] = rows.mean(axis=0)
+        if len(rows) > 1:
+            sem[b] = rows.std(axis=0, ddof=1) / np.sqrt(len(rows))
+    return mean, sem
+
+
+@pytest.fixture
+def shots():
+    """Synthetic pump-probe data: ΔS(q, t) = step(t) * sin(q) on top of a static pattern."""
+    rng = np.random.default_rng(0)
+    n, n_q = 4000, 30
+    q = np.linspace(0.5, 4, n_q)
+    delays = rng.uniform(-1, 3, n)
+    laser_on = rng.random(n) < 0.7
+    i0 = rng.uniform(0.5, 1.5, n)
+    signal = np.where(laser_on & (delays > 0), 1.0, 0.0)[:, None] * 0.1 * np.sin(q)
+    azav = i0[:, None] * (1 / q + signal + rng.normal(0, 0.01, (n, n_q)))
+    return azav, delays, laser_on, i0, q
+
+
+class TestDelayBinEdges:
+    def test_uniform(self):
+        np.testing.assert_allclose(delay_bin_edges([0.0, 1.0, 4.0], bins=4), [0, 1, 2, 3, 4])
+
+    def test_equal_population(self):
+        delays = np.random.default_rng(1).exponential(1.0, 10000)
+        edges = delay_bin_edges(delays, bins=10, mode='equal')
+        counts = np.bincount(assign_delay_bins(delays, edges), minlength=10)
+        assert counts.min() >= 999 and counts.max() <= 1001
+
+    def test_explicit_edges_and_range(self):
+        np.testing.assert_array_equal(delay_bin_edges(None, bins=[0, 1, 5]), [0, 1, 5])
+        np.testing.assert_allclose(delay_bin_edges([0.0, 10.0], bins=2, delay_range=(2, 4)), [2, 3, 4])
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            delay_bin_edges([1.0], bins=[0, 0, 1])
+        with pytest.raises(ValueError, match="Unknown mode"):
+            delay_bin_edges([1.0, 2.0], mode='log')
+
+
+class TestAssignDelayBins:
+    def test_edges_and_outside(self):
+        idx = assign_delay_bins([-1, 0, 0.5, 1, 2, 2.1, np.nan], [0, 1, 2])
+        np.testing.assert_array_equal(idx, [-1, 0, 0, 1, 1, -1, -1])
+
+
+class TestBinnedMean:
+    def test_matches_loop(self):
+        rng = np.random.default_rng(2)
+        data = rng.normal(1e4, 1, (500, 3, 7))  # large offset checks the shifted sums
+        bin_idx = rng.integers(-1, 6, 500)
+        bin_idx[bin_idx == 4] = 5  # empty bin 4
+        mean, sem, counts = binned_mean(data, bin_idx, 6)
+        ref_mean, ref_sem = _loop_binning(data, bin_idx, 6)
+        np.testing.assert_allclose(mean, ref_mean)
+        np.testing.assert_allclose(sem, ref_sem, rtol=1e-6)
+        np.testing.assert_array_equal(counts, np.bincount(bin_idx[bin_idx >= 0], minlength=6))
+        assert np.all(np.isnan(mean[4]))
+
+    def test_single_shot_bin(self):
+        mean, sem, counts = binned_mean(np.array([[1.0, 2.0]]), np.array([0]), 2)
+        np.testing.assert_array_equal(mean[0], [1, 2])
+        assert np.all(np.isnan(sem[0])) and counts.tolist() == [1, 0]
+
+    def test_nan_shot_only_affects_its_bin(self):
+        rng = np.random.default_rng(3)
+        data = rng.normal(5, 1, (60, 4))
+        bin_idx = np.repeat([0, 1, 2], 20)
+        data[25, 2] = np.nan  # one bad shot in bin 1
+        mean, sem, _ = binned_mean(data, bin_idx, 3)
+        assert np.isnan(mean[1, 2]) and np.isnan(sem[1, 2])
+        assert np.isfinite(np.delete(mean.ravel(), 1 * 4 + 2)).all()
+        assert np.isfinite(np.delete(sem.ravel(), 1 * 4 + 2)).all()
+        ref_mean, ref_sem = _loop_binning(data, bin_idx, 3)
+        np.testing.assert_allclose(mean[[0, 2]], ref_mean[[0, 2]])
+        np.testing.assert_allclose(sem[[0, 2]], ref_sem[[0, 2]], rtol=1e-6)
+
+
+class TestBinDifferenceSignal:
+    def test_recovers_signal(self, shots):
+        azav, delays, laser_on, i0, q = shots
+        result = bin_difference_signal(azav, delays, laser_on, norm=i0, bins=8)
+        expected = np.where(result['delay'] > 0, 1.0, 0.0)[:, None] * 0.1 * np.sin(q)
+        # Bins straddling t = 0 are mixtures
+        clean = (result['edges'][:-1] >= 0) | (result['edges'][1:] <= 0)
+        np.testing.assert_allclose(result['dS'][clean], expected[clean], atol=5 * result['dS_err'].max())
+        assert result['dS'].shape == (8, q.size)
+        assert result['counts_on'].sum() == laser_on.sum()
+        assert result['counts_off'] == (~laser_on).sum()
+
+    def test_matches_loop(self, shots):
+        azav, delays, laser_on, i0, _ = shots
+        result = bin_difference_signal(azav, delays, laser_on, norm=i0, bins=5, reference='binned')
+        data = azav / i0[:, None]
+        bin_idx = assign_delay_bins(delays, result['edges'])
+        on_mean, on_sem = _loop_binning(data, np.where(laser_on, bin_idx, -1), 5)
+        off_mean, off_sem = _loop_binning(data, np.where(~laser_on, bin_idx, -1), 5)
+        np.testing.assert_allclose(result['dS'], on_mean - off_mean)
+        np.testing.assert_allclose(result['dS_err'], np.sqrt(on_sem ** 2 + off_sem ** 2), rtol=1e-6)
+
+    def test_xray_off_and_bad_norm_dropped(self, shots):
+        azav, delays, laser_on, i0, _ = shots
+        xray_on = np.ones(len(delays), dtype=bool)
+        xray_on[:100] = False
+        i0 = i0.copy()
+        i0[100:110] = 0
+        result = bin_difference_signal(azav, delays, laser_on, xray_on=xray_on, norm=i0)
+        assert result['counts_on'].sum() == laser_on[110:].sum()
+        assert np.all(np.isfinite(result['dS']))
+
+    def test_equal_population(self, shots):
+        azav, delays, laser_on, _, _ = shots
+        result = bin_difference_signal(azav, delays, laser_on, bins=10, mode='equal')
+        assert result['counts_on'].max() - result['counts_on'].min() <= 1
+
+    def test_shape_validation(self, shots):
+        azav, delays, laser_on, _, _ = shots
+        with pytest.raises(ValueError, match="one entry per shot"):
+            bin_difference_signal(azav, delays[:-1], laser_on)
@@ -0,0 +1,521 @@
+"""Tests for xrayscatteringtools.epicsArch.
+
+The archiver is replaced by a local stand-in HTTP server that implements the
+``getData.json`` retrieval endpoint for a few synthetic PVs.
+"""
+
+import datetime
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import h5py
+import numpy as np
+import pytest
+
+from scipy.interpolate import interp1d
+
+import xrayscatteringtools.io as io_mod
+from xrayscatteringtools.epicsArch import (
+    ArchiveCache,
+    EpicsArchive,
+    json_to_arrays,
+    url_query,
+    merge_windows,
+    previous_value,
+)
+
+# Synthetic archive: PV name -> sampling period in seconds. The value of a PV
+# at sample time t is t % 1000, so expected values are easy to compute.
+PVS = {"TEST:PV:SLOW": 10, "TEST:PV:FAST": 1, "TEST:PV:GAP": 10}
+T0 = 1_700_000_000  # first archived sample of every PV
+# PV -> {sample time: cnxlostepsecs}: TEST:PV:GAP lost its connection at T0 + 150
+# and the sample at T0 + 200 is the first one after it came back.
+DISCONNECTS = {"TEST:PV:GAP": {T0 + 200: T0 + 150}}
+
+
+def pv_value(t):
+    return float(t % 1000)
+
+
+def _parse_time(text):
+    m = re.match(r"(\d+)-(\d+)-(\d+)T(\d+):(\d+):(\d+)", text)
+    dt = datetime.datetime(*map(int, m.groups()), tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+class _ArchiverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        with server.lock:
+            server.requests.append(url.path + "?" + url.query)
+            server.connections.add(self.client_address)
+        if url.path != "/retrieval/data/getData.json":
+            return self._send(404, b"")
+        pv = query["pv"][0]
+        if pv not in PVS:
+            return self._send(200, b"[]")
+        if server.delay:
+            time.sleep(server.delay)
+        start, end = _parse_time(query["from"][0]), _parse_time(query["to"][0])
+        period = PVS[pv]
+        # Like the real archiver: the last sample at or before `start`, then all samples up to `end`
+        times = np.arange(T0, int(end) + 1, period)
+        if pv == "TEST:PV:GAP":
+            times = times[(times <= T0 + 150) | (times >= T0 + 200)]
+        times = times[max(np.searchsorted(times, start, side="right") - 1, 0):]
+        data = [{"secs": int(t), "nanos": 0, "val": pv_value(t), "severity": 0, "status": 0}
+                for t in times]
+        for sample in data:
+            lost = DISCONNECTS.get(pv, {}).get(sample["secs"])
+            if lost is not None:
+                sample["fields"] = {"cnxlostepsecs": str(lost)}
+        body = json.dumps([{"meta": {"name": pv, "PREC": "0"}, "data": data}]).encode()
+        self._send(200, body)
+
+    def _send(self, code, body):
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def archiver():
+    """Start the stand-in archiver and return the server (``server.url`` is its base URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ArchiverHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.connections = set()
+    server.delay = 0.0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# ── url_query ──────────────────────────────────────────────────────────
+
+
+class TestUrlQuery:
+    def test_returns_json(self, archiver):
+        url = archiver.url + "/retrieval/data/getData.json?pv=UNKNOWN&from=x&to=y"
+        assert url_query(url) == []
+
+    def test_returns_status_code_on_error(self, archiver):
+        assert url_query(archiver.url + "/nope") == 404
+
+
+# ── get_points ─────────────────────────────────────────────────────────
+
+
+class TestGetPoints:
+    def test_raw_two_lists(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            t, v = archive.get_points("TEST:PV:SLOW", start=T0 + 100, end=T0 + 200,
+                                      unit="seconds", raw=True, two_lists=True)
+        assert t[0] == T0 + 100 and t[-1] == T0 + 200
+        assert v == [pv_value(x) for x in t]
+
+    def test_string_times(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            pts = archive.get_points("TEST:PV:SLOW", start=T0 + 100, end=T0 + 120, unit="seconds")
+        assert isinstance(pts[0][0], str)
+
+    def test_session_keeps_connection_alive(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            for k in range(5):
+                archive.get_points("TEST:PV:SLOW", start=T0 + 100 * k, end=T0 + 100 * k + 50,
+                                   unit="seconds", raw=True)
+        assert len(archiver.requests) == 5
+        assert len(archiver.connections) == 1
+
+
+# ── json_to_arrays ─────────────────────────────────────────────────────
+
+
+class TestJsonToArrays:
+    PAYLOAD = json.dumps([{
+        "meta": {"name": "TEST:PV", "EGU": "µJ"},
+        "data": [
+            {"secs": 100, "nanos": 500000000, "val": 1.5, "severity": 0, "status": 0},
+            {"secs": 101, "nanos": 0, "val": 2, "severity": 0, "status": 0,
+             "fields": {"cnxlostepsecs": "99", "cnxregainedepsecs": "101"}},
+            {"secs": 103, "nanos": 250000000, "val": -3.0, "severity": 0, "status": 0},
+        ],
+    }]).encode()
+
+    def _check(self, result):
+        times, values, cnxlost = result
+        np.testing.assert_array_equal(times, [100.5, 101.0, 103.25])
+        np.testing.assert_array_equal(values, [1.5, 2.0, -3.0])
+        np.testing.assert_array_equal(cnxlost, [np.nan, 99.0, np.nan])
+        assert times.dtype == values.dtype == np.float64
+
+    def test_whole_body(self):
+        self._check(json_to_arrays(self.PAYLOAD))
+
+    @pytest.mark.parametrize("size", [1, 3, 7, 64])
+    def test_split_into_pieces(self, size):
+        pieces = [self.PAYLOAD[i:i + size] for i in range(0, len(self.PAYLOAD), size)]
+        self._check(json_to_arrays(iter(pieces)))
+
+    def test_seconds_only(self):
+        times, _, _ = json_to_arrays(self.PAYLOAD, useMS=False)
+        np.testing.assert_array_equal(times, [100, 101, 103])
+
+    def test_matches_json_to_pts(self):
+        data = [{"secs": 1000 + i, "nanos": i * 1000, "val": float(i) ** 0.5} for i in range(5000)]
+        body = json.dumps([{"meta": {}, "data": data}])
+        pts = EpicsArchive()._json_to_pts(json.loads(body), True)
+        times, values, _ = json_to_arrays(body)
+        np.testing.assert_array_equal(times, [t for t, _ in pts])
+        np.testing.assert_array_equal(values, [v for _, v in pts])
+
+    def test_empty(self):
+        for body in (b"[]", b'[{"meta": {}, "data": []}]'):
+            times, values, cnxlost = json_to_arrays(body)
+            assert times.size == values.size == cnxlost.size == 0
+
+    def test_non_scalar_values(self):
+        body = json.dumps([{"meta": {}, "data": [{"secs": 1, "nanos": 0, "val": [1, 2]}]}])
+        with pytest.raises(ValueError):
+            json_to_arrays(body)
+
+    def test_get_points_arrays(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            times, values = archive.get_points("TEST:PV:FAST", T0 + 100, T0 + 5000,
+                                               unit="seconds", arrays=True)
+            t, v = archive.get_points("TEST:PV:FAST", T0 + 100, T0 + 5000,
+                                      unit="seconds", raw=True, two_lists=True)
+        assert isinstance(times, np.ndarray) and times.dtype == np.float64
+        np.testing.assert_array_equal(times, t)
+        np.testing.assert_array_equal(values, v)
+
+
+# ── get_points_at ──────────────────────────────────────────────────────
+
+
+class TestGetPointsAt:
+    def test_matches_get_point(self, archiver):
+        instants = [T0 + 105.5, T0 + 110, T0 + 145, T0 + 155, T0 + 199, T0 + 200, T0 + 230]
+        with EpicsArchive(base_url=archiver.url) as archive:
+            expected = [archive.get_point("TEST:PV:GAP", t) for t in instants]
+            times, values = archive.get_points_at("TEST:PV:GAP", instants)
+        for e, t, v in zip(expected, times, values):
+            if e is None:
+                assert np.isnan(t) and np.isnan(v)
+            else:
+                assert (t, v) == e
+
+    def test_disconnect(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            values = archive.get_points_at("TEST:PV:GAP", [T0 + 145, T0 + 160, T0 + 205],
+                                           value_only=True)
+        np.testing.assert_array_equal(values, [pv_value(T0 + 140), np.nan, pv_value(T0 + 200)])
+
+    def test_one_query_for_many_instants(self, archiver):
+        instants = np.random.default_rng(0).uniform(T0 + 100, T0 + 5000, 500)
+        with EpicsArchive(base_url=archiver.url) as archive:
+            values = archive.get_points_at("TEST:PV:SLOW", instants, value_only=True)
+        assert len(archiver.requests) == 1
+        np.testing.assert_array_equal(values, ((instants.astype(int) - T0) // 10 * 10 + T0) % 1000.0)
+
+    def test_before_archiving(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            times, values = archive.get_points_at("TEST:PV:SLOW", [T0 - 100, T0 + 5])
+        assert np.isnan(values[0]) and np.isnan(times[0])
+        assert values[1] == pv_value(T0) and times[1] == T0
+
+    def test_datetimes_and_shape(self, archiver):
+        instants = [datetime.datetime.fromtimestamp(T0 + 100 + 10 * i) for i in range(6)]
+        with EpicsArchive(base_url=archiver.url) as archive:
+            values = archive.get_points_at("TEST:PV:SLOW", np.reshape(instants, (2, 3)),
+                                           value_only=True)
+        assert values.shape == (2, 3)
+        np.testing.assert_array_equal(values.ravel(), [pv_value(T0 + 100 + 10 * i) for i in range(6)])
+
+    def test_served_from_cache(self, archiver, tmp_path):
+        instants = [T0 + 100, T0 + 150, T0 + 300]
+        with EpicsArchive(base_url=archiver.url, cache=tmp_path) as archive:
+            first = archive.get_points_at("TEST:PV:SLOW", instants, value_only=True)
+            n_requests = len(archiver.requests)
+            second = archive.get_points_at("TEST:PV:SLOW", instants, value_only=True)
+        assert len(archiver.requests) == n_requests
+        np.testing.assert_array_equal(first, second)
+
+
+# ── get_points_many ────────────────────────────────────────────────────
+
+
+class TestGetPointsMany:
+    def _queries(self, n):
+        return [("TEST:PV:FAST" if k % 2 else "TEST:PV:SLOW", T0 + 50 * k, T0 + 50 * k + 30)
+                for k in range(n)]
+
+    def test_results_in_order(self, archiver):
+        queries = self._queries(12)
+        with EpicsArchive(base_url=archiver.url, max_workers=4) as archive:
+            results = archive.get_points_many(queries, unit="seconds", raw=True, two_lists=True)
+            expected = [archive.get_points(pv, s, e, unit="seconds", raw=True, two_lists=True)
+                        for pv, s, e in queries]
+        assert results == expected
+
+    def test_concurrent(self, archiver):
+        archiver.delay = 0.2
+        queries = self._queries(8)
+        with EpicsArchive(base_url=archiver.url, max_workers=8) as archive:
+            start = time.perf_counter()
+            archive.get_points_many(queries, unit="seconds", raw=True)
+            elapsed = time.perf_counter() - start
+        assert elapsed < 8 * 0.2 / 2
+
+    def test_bounded_connections(self, archiver):
+        with EpicsArchive(base_url=archiver.url, max_workers=2) as archive:
+            archive.get_points_many(self._queries(10), unit="seconds", raw=True)
+        assert len(archiver.connections) <= 2
+
+    def test_empty(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            assert archive.get_points_many([]) == []
+
+    def test_does_not_touch_last_query_cache(self, archiver):
+        with EpicsArchive(base_url=archiver.url, max_workers=4) as archive:
+            last = archive.get_points("TEST:PV:SLOW", T0, T0 + 20, unit="seconds", raw=True)
+            archive.get_points_many(self._queries(6), unit="seconds", raw=True)
+            assert archive._pv_cache == "TEST:PV:SLOW"
+            assert archive.get_points(raw=True) == last
+
+
+# ── merge_windows / previous_value ─────────────────────────────────────
+
+
+class TestMergeWindows:
+    def test_adjacent_merged(self):
+        assert merge_windows([(0, 10), (12, 20), (50, 60)], max_gap=5) == [(0, 20), (50, 60)]
+
+    def test_overlapping_and_unsorted(self):
+        assert merge_windows([(30, 40), (0, 10), (5, 35)]) == [(0, 40)]
+
+    def test_no_gap(self):
+        assert merge_windows([(0, 10), (11, 20)]) == [(0, 10), (11, 20)]
+
+    def test_empty(self):
+        assert merge_windows([]) == []
+
+
+class TestPreviousValue:
+    def test_matches_interp1d(self):
+        times = np.array([1.0, 2.0, 3.0, 7.0])
+        values = np.array([10.0, 20.0, 30.0, 70.0])
+        query = np.linspace(0, 9, 37)
+        expected = interp1d(times, values, kind="previous", fill_value="extrapolate")(query)
+        np.testing.assert_array_equal(previous_value(times, values, query), expected)
+
+    def test_exact_sample_times(self):
+        np.testing.assert_array_equal(previous_value([1, 2], [5, 6], [1, 2]), [5, 6])
+
+    def test_empty_samples(self):
+        assert np.all(np.isnan(previous_value([], [], [1.0, 2.0])))
+
+
+# ── get_points_for_windows ─────────────────────────────────────────────
+
+
+class TestGetPointsForWindows:
+    WINDOWS = [(T0 + 100.5, T0 + 160.2), (T0 + 170.0, T0 + 230.9), (T0 + 240.1, T0 + 300.0)]
+
+    def test_one_query_per_pv_for_back_to_back_runs(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            archive.get_points_for_windows(["TEST:PV:SLOW", "TEST:PV:FAST"], self.WINDOWS)
+        assert len(archiver.requests) == 2
+
+    def test_separated_windows_not_merged(self, archiver):
+        windows = [(T0 + 100, T0 + 110), (T0 + 5000, T0 + 5010)]
+        with EpicsArchive(base_url=archiver.url) as archive:
+            archive.get_points_for_windows("TEST:PV:SLOW", windows, max_gap=60)
+        assert len(archiver.requests) == 2
+
+    def test_matches_per_run_interpolation(self, archiver):
+        rng = np.random.default_rng(0)
+        run_times = [np.sort(rng.uniform(s, e, 50)) for s, e in self.WINDOWS]
+        with EpicsArchive(base_url=archiver.url) as archive:
+            times, values = archive.get_points_for_windows("TEST:PV:SLOW", self.WINDOWS)["TEST:PV:SLOW"]
+            for t in run_times:
+                pt, pv = archive.get_points("TEST:PV:SLOW", t[0], t[-1], unit="seconds",
+                                            raw=True, two_lists=True)
+                expected = interp1d(pt, pv, kind="previous", fill_value="extrapolate")(t)
+                np.testing.assert_array_equal(previous_value(times, values, t), expected)
+
+    def test_sorted_unique_times(self, archiver):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            times, _ = archive.get_points_for_windows(
+                "TEST:PV:SLOW", [(T0 + 100, T0 + 150), (T0 + 155, T0 + 200)], max_gap=0
+            )["TEST:PV:SLOW"]
+        assert np.all(np.diff(times) > 0)
+
+
+# ── ArchiveCache ───────────────────────────────────────────────────────
+
+
+class TestArchiveCache:
+    def test_missing_intervals(self, tmp_path):
+        cache = ArchiveCache(tmp_path)
+        assert cache.missing("PV", 0, 100) == [(0, 100)]
+        cache.add("PV", 10, 20, [9, 15, 20], [1, 2, 3])
+        cache.add("PV", 40, 50, [38, 45], [4, 5])
+        assert cache.missing("PV", 0, 100) == [(0, 10), (20, 40), (50, 100)]
+        assert cache.missing("PV", 12, 18) == []
+        assert cache.missing("PV", 15, 45) == [(20, 40)]
+
+    def test_overlapping_segments_merged(self, tmp_path):
+        cache = ArchiveCache(tmp_path)
+        cache.add("PV", 10, 20, [9, 15, 20], [1, 2, 3])
+        cache.add("PV", 20, 30, [20, 25], [30, 4], [np.nan, 24.5])
+        times, values, cnxlost, covered = cache.load("PV")
+        np.testing.assert_array_equal(times, [9, 15, 20, 25])
+        np.testing.assert_array_equal(values, [1, 2, 30, 4])  # newer sample wins
+        np.testing.assert_array_equal(cnxlost[-1], 24.5)
+        np.testing.assert_array_equal(covered, [[10, 30]])
+
+    def test_get_starts_at_previous_sample(self, tmp_path):
+        cache = ArchiveCache(tmp_path)
+        cache.add("PV", 10, 40, [9, 15, 20, 35], [1, 2, 3, 4])
+        times, values, _ = cache.get("PV", 17, 30)
+        np.testing.assert_array_equal(times, [15, 20])
+        np.testing.assert_array_equal(values, [2, 3])
+
+    def test_datasets_grow_in_place(self, tmp_path):
+        cache = ArchiveCache(tmp_path, chunk_size=4)
+        cache.add("PV", 0, 10, [0, 5, 10], [0, 1, 2])
+        cache.add("PV", 10, 30, [10, 20, 30], [2, 3, 4])
+        cache.add("PV", 40, 50, [35, 45], [5, 6])
+        # An older segment is merged into the middle of the stored samples
+        cache.add("PV", 30, 40, [30, 33], [4, 7])
+        with h5py.File(cache.path("PV"), "r") as f:
+            assert f["times"].maxshape == (None,)
+            assert f["times"].chunks == (4,)
+        times, values, _, covered = cache.load("PV")
+        np.testing.assert_array_equal(times, [0, 5, 10, 20, 30, 33, 35, 45])
+        np.testing.assert_array_equal(values, [0, 1, 2, 3, 4, 7, 5, 6])
+        np.testing.assert_array_equal(covered, [[0, 50]])
+
+    def test_get_and_covered_without_file(self, tmp_path):
+        cache = ArchiveCache(tmp_path)
+        assert all(a.size == 0 for a in cache.get("PV", 0, 10))
+        assert cache.covered("PV").shape == (0, 2)
+
+    def test_recent_data_not_marked_covered(self, tmp_path):
+        cache = ArchiveCache(tmp_path, settle_time=600)
+        now = time.time()
+        cache.add("PV", now - 1000, now, [now - 900], [1])
+        (lo, hi), = cache.load("PV")[3]
+        assert hi < now - 590
+        assert cache.missing("PV", now - 1000, now)
+
+    def test_clear(self, tmp_path):
+        cache = ArchiveCache(tmp_path)
+        cache.add("A:PV", 0, 1, [0], [1])
+        cache.add("B:PV", 0, 1, [0], [1])
+        cache.clear("A:PV")
+        assert cache.missing("A:PV", 0, 1) == [(0, 1)]
+        assert cache.missing("B:PV", 0, 1) == []
+        cache.clear()
+        assert cache.missing("B:PV", 0, 1) == [(0, 1)]
+
+
+class TestGetArraysCached:
+    PV = "TEST:PV:SLOW"
+
+    def test_repeated_load_served_from_cache(self, archiver, tmp_path):
+        with EpicsArchive(base_url=archiver.url, cache=tmp_path) as archive:
+            first = archive.get_arrays(self.PV, T0 + 100, T0 + 200)
+            second = archive.get_arrays(self.PV, T0 + 120, T0 + 180)
+        assert len(archiver.requests) == 1
+        np.testing.assert_array_equal(first[0], np.arange(T0 + 100, T0 + 201, 10))
+        np.testing.assert_array_equal(second[0], np.arange(T0 + 120, T0 + 181, 10))
+
+    def test_only_missing_range_fetched(self, archiver, tmp_path):
+        with EpicsArchive(base_url=archiver.url, cache=tmp_path) as archive:
+            archive.get_arrays(self.PV, T0 + 100, T0 + 200)
+            times, values, _ = archive.get_arrays(self.PV, T0 + 150, T0 + 300)
+        assert len(archiver.requests) == 2
+        query = urllib.parse.parse_qs(archiver.requests[1].split("?", 1)[1])
+        assert _parse_time(query["from"][0]) == T0 + 200
+        np.testing.assert_array_equal(times, np.arange(T0 + 150, T0 + 301, 10))
+        np.testing.assert_array_equal(values, times % 1000)
+
+    def test_matches_uncached(self, archiver, tmp_path):
+        with EpicsArchive(base_url=archiver.url) as archive:
+            expected = archive.get_arrays(self.PV, T0 + 95, T0 + 305)
+        with EpicsArchive(base_url=archiver.url, cache=tmp_path) as archive:
+            archive.get_arrays(self.PV, T0 + 200, T0 + 250)
+            result = archive.get_arrays(self.PV, T0 + 95, T0 + 305)
+        for r, e in zip(result, expected):
+            np.testing.assert_array_equal(r, e)
+
+    def test_offline_after_caching(self, archiver, tmp_path):
+        with EpicsArchive(base_url=archiver.url, cache=tmp_path) as archive:
+            expected = archive.get_points_for_windows(self.PV, [(T0 + 100, T0 + 200)])
+        archiver.shutdown()
+        archiver.server_close()
+        with EpicsArchive(base_url="http://127.0.0.1:1", cache=tmp_path) as archive:
+            result = archive.get_points_for_windows(self.PV, [(T0 + 100, T0 + 200)])
+        np.testing.assert_array_equal(result[self.PV][1], expected[self.PV][1])
+
+
+class TestUnwritableCache:
+    def test_falls_back_to_no_cache(self, archiver, monkeypatch, tmp_path, caplog):
+        blocker = tmp_path / "not_a_dir"
+        blocker.write_text("")
+        monkeypatch.setenv("XRAYSCATTERINGTOOLS_CACHE", str(blocker / "cache"))
+        with pytest.raises(OSError):
+            ArchiveCache()
+        with EpicsArchive(base_url=archiver.url, cache=True) as archive:
+            assert archive.cache is None
+            times, values, _ = archive.get_arrays("TEST:PV:SLOW", T0 + 100, T0 + 200)
+        assert "Archive cache unavailable" in caplog.text
+        np.testing.assert_array_equal(times, np.arange(T0 + 100, T0 + 201, 10))
+
+
+class TestCombineRunsArchPVs:
+    def test_add_archive_pvs(self, archiver, monkeypatch, tmp_path):
+        monkeypatch.setattr(io_mod, "EpicsArchive",
+                            lambda **kwargs: EpicsArchive(base_url=archiver.url, **kwargs))
+        monkeypatch.setenv("XRAYSCATTERINGTOOLS_CACHE", str(tmp_path))
+        unix_time = np.concatenate([np.arange(T0 + 100, T0 + 150, 0.5),
+                                    np.arange(T0 + 152, T0 + 200, 0.5)])
+        data = {
+            "unixTime": unix_time,
+            "run_indicator": np.repeat([1, 2], [100, 96]),
+        }
+        io_mod._add_archive_pvs(data, [1, 2], "TEST:PV:SLOW")
+        expected = ((unix_time.astype(int) - T0) // 10 * 10 + T0) % 1000.0
+        np.testing.assert_array_equal(data["TEST:PV:SLOW"], expected)
+        assert len(archiver.requests) == 1
+
+        # The second load is served from the local cache
+        data.pop("TEST:PV:SLOW")
+        io_mod._add_archive_pvs(data, [1, 2], "TEST:PV:SLOW")
+        np.testing.assert_array_equal(data["TEST:PV:SLOW"], expected)
+        assert len(archiver.requests) == 1
+
+        # Without the cache every load queries the archiver
+        data.pop("TEST:PV:SLOW")
+        io_mod._add_archive_pvs(data, [1, 2], "TEST:PV:SLOW", cache=False)
+        np.testing.assert_array_equal(data["TEST:PV:SLOW"], expected)
+        assert len(archiver.requests) == 2
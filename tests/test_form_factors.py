@@ -0,0 +1,84 @@
+"""Tests for xrayscatteringtools.theory.form_factors."""
+
+import numpy as np
+import pytest
+
+from xrayscatteringtools.theory.form_factors import (
+    FormFactorCache,
+    atomic_form_factor,
+    cromer_mann_coefficients,
+    form_factors,
+)
+
+
+def _loop_reference(Z, q):
+    """Cromer-Mann sum written out term by term, as iam.py used to."""
+    fc = cromer_mann_coefficients()[Z - 1]
+    s2 = (q / (4 * np.pi)) ** 2
+    return sum(fc[k] * np.exp(-fc[k + 4] * s2) for k in range(4)) + fc[8]
+
+
+@pytest.fixture
+def q():
+    return np.linspace(0.0, 12.0, 101)
+
+
+class TestCoefficients:
+    def test_loaded_once_read_only(self):
+        table = cromer_mann_coefficients()
+        assert table is cromer_mann_coefficients()
+        assert table.dtype == float and table.shape[1] == 9
+        assert not table.flags.writeable
+
+
+class TestFormFactors:
+    def test_matches_reference(self, q):
+        f = form_factors(['S', 'F', 'F', 6], q)
+        assert f.shape == (4, q.size)
+        np.testing.assert_allclose(f[0], _loop_reference(16, q), rtol=1e-12)
+        np.testing.assert_allclose(f[1], _loop_reference(9, q), rtol=1e-12)
+        np.testing.assert_array_equal(f[1], f[2])
+        np.testing.assert_allclose(f[3], _loop_reference(6, q), rtol=1e-12)
+        # f(0) is close to the number of electrons
+        assert f[0, 0] == pytest.approx(16, abs=0.05)
+
+    def test_multidimensional_q(self, q):
+        grid = np.stack([q, q / 2])
+        f = atomic_form_factor('O', grid)
+        assert f.shape == grid.shape
+        np.testing.assert_allclose(f[1], _loop_reference(8, q / 2), rtol=1e-12)
+
+    def test_unknown_element(self, q):
+        with pytest.raises(ValueError, match="Z = 99"):
+            form_factors([99], q)
+        with pytest.raises(KeyError):
+            form_factors(['Xx'], q)
+
+
+class TestFormFactorCache:
+    def test_hits_and_read_only_entries(self, q):
+        cache = FormFactorCache()
+        Z, f, inverse = cache.unique(['F'] * 6 + ['S'], q)
+        np.testing.assert_array_equal(Z, [9, 16])
+        np.testing.assert_array_equal(inverse, [0] * 6 + [1])
+        assert (cache.hits, cache.misses) == (0, 2)
+        # An equal grid built separately hits the cache
+        again = cache(['S', 'F'], np.linspace(0.0, 12.0, 101))
+        assert (cache.hits, cache.misses) == (2, 2)
+        np.testing.assert_array_equal(again, f[::-1])
+        again[:] = 0  # returned arrays are copies
+        np.testing.assert_array_equal(cache(['S'], q)[0], f[1])
+
+    def test_lru_eviction(self, q):
+        cache = FormFactorCache(maxsize=2)
+        cache(['H'], q)
+        cache(['C'], q)
+        cache(['H'], q)  # H is now the most recent
+        cache(['O'], q)  # evicts C
+        assert len(cache) == 2
+        cache(['H'], q)
+        assert cache.misses == 3
+        cache(['C'], q)
+        assert cache.misses == 4
+        cache.clear()
+        assert len(cache) == 0 and cache.hits == 0
@@ -0,0 +1,175 @@
+"""Tests for xrayscatteringtools.h5layout."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+import h5py
+
+import xrayscatteringtools.h5layout as h5layout
+from xrayscatteringtools.h5layout import H5Layout, get_layout, find_keys
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    """Create a small smalldata-like HDF5 file."""
+    path = str(tmp_path / "run.h5")
+    with h5py.File(path, "w") as f:
+        f.create_dataset("lightStatus/xray", data=np.ones(10, dtype=int))
+        f.create_dataset("lightStatus/laser", data=np.zeros(10, dtype=int))
+        f.create_dataset("jungfrau4M/azav_azav", data=np.zeros((10, 1, 50)),
+                         chunks=(5, 1, 50), compression="gzip", compression_opts=3)
+        f.create_dataset("Sums/jungfrau4M_calib", data=np.zeros((2, 4)))
+        f.create_dataset("scalar", data=3.5)
+    return path
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    h5layout._memory_cache.clear()
+    d = tmp_path / "cache"
+    d.mkdir()
+    yield str(d)
+    h5layout._memory_cache.clear()
+
+
+class TestH5Layout:
+    def test_datasets_and_groups(self, h5_file, cache_dir):
+        layout = get_layout(h5_file, cache_dir=cache_dir)
+        assert set(layout.datasets) == {
+            "lightStatus/xray", "lightStatus/laser", "jungfrau4M/azav_azav",
+            "Sums/jungfrau4M_calib", "scalar",
+        }
+        assert set(layout.groups) == {"lightStatus", "jungfrau4M", "Sums"}
+
+    def test_metadata(self, h5_file, cache_dir):
+        info = get_layout(h5_file, cache_dir=cache_dir)["jungfrau4M/azav_azav"]
+        assert info["shape"] == (10, 1, 50)
+        assert info["dtype"] == "float64"
+        assert info["chunks"] == (5, 1, 50)
+        assert info["compression"] == "gzip"
+        assert info["compression_opts"] == 3
+
+    def test_scalar_shape(self, h5_file, cache_dir):
+        assert get_layout(h5_file, cache_dir=cache_dir)["scalar"]["shape"] == ()
+
+    def test_visit_order_matches_h5py(self, h5_file, cache_dir):
+        names = []
+        with h5py.File(h5_file, "r") as f:
+            f.visit(names.append)
+        assert list(get_layout(h5_file, cache_dir=cache_dir)) == names
+
+    def test_glob(self, h5_file, cache_dir):
+        layout = get_layout(h5_file, cache_dir=cache_dir)
+        assert layout.glob("lightStatus/*") == ["lightStatus/laser", "lightStatus/xray"]
+        assert layout.glob("*azav*") == ["jungfrau4M/azav_azav"]
+        assert "Sums" in layout.glob("S*", datasets_only=False)
+        assert layout.glob("nothing*") == []
+
+    def test_contains(self, h5_file, cache_dir):
+        layout = get_layout(h5_file, cache_dir=cache_dir)
+        assert "/Sums/jungfrau4M_calib" in layout
+        assert "Sums/missing" not in layout
+
+    def test_dict_roundtrip(self, h5_file, cache_dir):
+        layout = get_layout(h5_file, cache_dir=cache_dir)
+        again = H5Layout.from_dict(layout.to_dict())
+        assert again.nodes == layout.nodes
+
+    def test_dict_roundtrip_tuple_filter_options(self):
+        nodes = {"d": {"kind": "dataset", "shape": (4,), "dtype": "int32", "chunks": (2,),
+                       "compression": "szip", "compression_opts": ("nn", 8)}}
+        layout = H5Layout("f.h5", nodes, mtime_ns=1, size=2)
+        d = json.loads(json.dumps(layout.to_dict()))
+        assert H5Layout.from_dict(d).nodes == nodes
+
+
+class TestLayoutCache:
+    def test_disk_cache_written(self, h5_file, cache_dir):
+        get_layout(h5_file, cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 1
+
+    def test_cache_hit_does_not_open_file(self, h5_file, cache_dir, monkeypatch):
+        first = get_layout(h5_file, cache_dir=cache_dir)
+        h5layout._memory_cache.clear()  # force the on-disk path
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("file should not be walked again")
+        monkeypatch.setattr(H5Layout, "from_file", classmethod(_fail))
+        second = get_layout(h5_file, cache_dir=cache_dir)
+        assert second.nodes == first.nodes
+
+    def test_invalidated_on_modification(self, h5_file, cache_dir):
+        get_layout(h5_file, cache_dir=cache_dir)
+        with h5py.File(h5_file, "a") as f:
+            f.create_dataset("new/key", data=np.arange(3))
+        st = os.stat(h5_file)
+        os.utime(h5_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert "new/key" in get_layout(h5_file, cache_dir=cache_dir)
+
+    def test_corrupt_cache_is_rebuilt(self, h5_file, cache_dir):
+        get_layout(h5_file, cache_dir=cache_dir)
+        h5layout._memory_cache.clear()
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), "w") as fp:
+                fp.write("{not json")
+        assert "scalar" in get_layout(h5_file, cache_dir=cache_dir)
+
+    def test_open_file_readonly_uses_cache(self, h5_file, cache_dir):
+        with h5py.File(h5_file, "r") as f:
+            layout = get_layout(f, cache_dir=cache_dir)
+        assert "scalar" in layout
+        assert len(os.listdir(cache_dir)) == 1
+
+    def test_open_file_writable_skips_cache(self, h5_file, cache_dir):
+        with h5py.File(h5_file, "a") as f:
+            f.create_dataset("fresh", data=1)
+            assert "fresh" in get_layout(f, cache_dir=cache_dir)
+        assert os.listdir(cache_dir) == []
+
+    def test_use_cache_false(self, h5_file, cache_dir):
+        get_layout(h5_file, cache_dir=cache_dir, use_cache=False)
+        assert os.listdir(cache_dir) == []
+
+    def test_persist_false_stays_in_memory(self, h5_file, cache_dir):
+        first = get_layout(h5_file, cache_dir=cache_dir, persist=False)
+        assert os.listdir(cache_dir) == []
+        assert get_layout(h5_file, cache_dir=cache_dir, persist=False) is first
+
+    def test_memory_cache_is_bounded(self, tmp_path, cache_dir, monkeypatch):
+        monkeypatch.setattr(h5layout, "_MEMORY_CACHE_SIZE", 2)
+        paths = []
+        for i in range(3):
+            paths.append(str(tmp_path / f"f{i}.h5"))
+            with h5py.File(paths[-1], "w") as f:
+                f.create_dataset("x", data=i)
+        get_layout(paths[0], persist=False)
+        get_layout(paths[1], persist=False)
+        get_layout(paths[0], persist=False)  # most recently used
+        get_layout(paths[2], persist=False)  # evicts f1
+        assert list(h5layout._memory_cache) == [os.path.abspath(paths[0]), os.path.abspath(paths[2])]
+
+    def test_get_tree_and_leaves_do_not_persist_by_default(self, h5_file, tmp_path, capsys):
+        from xrayscatteringtools.io import get_leaves, get_tree
+        root = os.environ["XRAYSCATTERINGTOOLS_CACHE"]
+        with h5py.File(h5_file, "r") as f:
+            get_tree(f)
+            get_leaves(f, {})
+        assert not os.path.exists(os.path.join(root, "h5layout")) or not os.listdir(os.path.join(root, "h5layout"))
+        with h5py.File(h5_file, "r") as f:
+            h5layout._memory_cache.clear()
+            get_leaves(f, cache=True)
+        assert len(os.listdir(os.path.join(root, "h5layout"))) == 1
+
+
+class TestFindKeys:
+    def test_across_files(self, h5_file, tmp_path, cache_dir):
+        other = str(tmp_path / "other.h5")
+        with h5py.File(other, "w") as f:
+            f.create_dataset("Sums/other", data=np.zeros(2))
+        result = find_keys([h5_file, other], "Sums/*", cache_dir=cache_dir)
+        assert result == {h5_file: ["Sums/jungfrau4M_calib"], other: ["Sums/other"]}
+
+    def test_single_filename(self, h5_file, cache_dir):
+        assert find_keys(h5_file, "scalar", cache_dir=cache_dir) == {h5_file: ["scalar"]}
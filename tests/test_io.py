@@ -17,7 +17,13 @@ from xrayscatteringtools.io import (
     get_tree,
     get_config,
     get_config_for_runs,
+    get_config_for_shots,
     get_data_paths,
+    combineRuns,
+    iterRuns,
+    _run_filename,
+    _prefetch,
+    _array_digest,
 )
 
 
@@ -185,6 +191,202 @@ class TestHDF5Helpers:
         assert "group" in captured.out
         assert "group/nested" in captured.out
 
+    def test_get_leaves_subgroup(self, h5_file):
+        result = {}
+        with h5py.File(h5_file, "r") as f:
+            get_leaves(f["group"], saveto=result)
+        assert list(result) == ["nested"]
+        np.testing.assert_array_equal(result["nested"], np.ones((3, 3)))
+
+    def test_get_tree_subgroup(self, h5_file, capsys):
+        with h5py.File(h5_file, "r") as f:
+            get_tree(f["group"])
+        captured = capsys.readouterr()
+        assert "nested" in captured.out
+        assert "scalar" not in captured.out
+
+
+# ── Multi-run loading ──────────────────────────────────────────────────
+
+
+@pytest.fixture
+def run_folder(tmp_path):
+    """Create three smalldata-like run files and return (folder, runs).
+
+    The folder is nested deep enough for ``_run_filename`` to find an
+    experiment name in the seventh path component.
+    """
+    folder = tmp_path / "sdf" / "data" / "lcls" / "ds" / "cxi" / "cxitest" / "hdf5"
+    folder.mkdir(parents=True)
+    folder = str(folder) + "/"
+    runs = {10: 7, 11: 5, 12: 3}  # run number -> number of events
+    for run, n in runs.items():
+        with h5py.File(_run_filename(folder, run), "w") as f:
+            f.create_dataset("lightStatus/xray", data=np.ones(n, dtype=int))
+            f.create_dataset("lightStatus/laser", data=np.arange(n) % 2)
+            f.create_dataset(
+                "jungfrau4M/azav_azav",
+                data=run + np.arange(n * 4, dtype=float).reshape(n, 1, 4),
+                chunks=(2, 1, 4),
+            )
+            f.create_dataset("Sums/jungfrau4M_calib", data=np.full((2, 3), run, dtype=float))
+            f.create_dataset("UserDataCfg/mask", data=np.eye(3))
+    return folder, runs
+
+
+class TestCombineRuns:
+    """Tests for combineRuns on small synthetic run files."""
+
+    def _combine(self, folder, runs, **kwargs):
+        return combineRuns(
+            list(runs), folder,
+            keys_to_combine=["jungfrau4M/azav_azav", "lightStatus/laser"],
+            keys_to_sum=["Sums/jungfrau4M_calib"],
+            keys_to_check=["UserDataCfg/mask"],
+            **kwargs,
+        )
+
+    def test_concatenation(self, run_folder):
+        folder, runs = run_folder
+        data = self._combine(folder, runs)
+        assert data["jungfrau4M/azav_azav"].shape == (sum(runs.values()), 4)
+        assert data["lightStatus/laser"].shape == (sum(runs.values()),)
+
+    def test_run_indicator(self, run_folder):
+        folder, runs = run_folder
+        data = self._combine(folder, runs)
+        expected = np.concatenate([np.full(n, run) for run, n in runs.items()])
+        np.testing.assert_array_equal(data["run_indicator"], expected)
+
+    def test_sum(self, run_folder):
+        folder, runs = run_folder
+        data = self._combine(folder, runs)
+        np.testing.assert_array_equal(data["Sums/jungfrau4M_calib"], np.full((2, 3), sum(runs)))
+
+    def test_check_consistent(self, run_folder, capsys):
+        folder, runs = run_folder
+        data = self._combine(folder, runs)
+        np.testing.assert_array_equal(data["UserDataCfg/mask"], np.eye(3))
+        assert "Problem with key" not in capsys.readouterr().out
+
+    def test_check_inconsistent(self, run_folder, capsys):
+        folder, runs = run_folder
+        with h5py.File(_run_filename(folder, 12), "r+") as f:
+            f["UserDataCfg/mask"][0, 1] = 5
+        data = self._combine(folder, runs)
+        out = capsys.readouterr().out
+        assert "Problem with key UserDataCfg/mask in run 12" in out
+        assert "run 11" not in out
+        # The first run's array is returned
+        np.testing.assert_array_equal(data["UserDataCfg/mask"], np.eye(3))
+
+    def test_return_stats(self, run_folder):
+        folder, runs = run_folder
+        data, stats = self._combine(folder, runs, return_stats=True)
+        assert "run_indicator" in data
+        assert [f.run for f in stats.files] == list(runs)
+        keys = {k.key for k in stats.files[0].keys}
+        assert {"jungfrau4M/azav_azav", "Sums/jungfrau4M_calib", "UserDataCfg/mask"} <= keys
+        assert stats.per_key()["Sums/jungfrau4M_calib"]["nbytes"] == 3 * 6 * 8
+
+
+class TestArrayDigest:
+    def test_equal_arrays(self):
+        assert _array_digest(np.arange(6)) == _array_digest(np.arange(6))
+
+    def test_different_values(self):
+        assert _array_digest(np.arange(6)) != _array_digest(np.arange(1, 7))
+
+    def test_shape_and_dtype_matter(self):
+        a = np.arange(6)
+        assert _array_digest(a) != _array_digest(a.reshape(2, 3))
+        assert _array_digest(a) != _array_digest(a.astype(np.int32))
+
+    def test_non_contiguous(self):
+        a = np.arange(12).reshape(3, 4)
+        assert _array_digest(a.T) == _array_digest(np.ascontiguousarray(a.T))
+
+    def test_scalar_and_strings(self):
+        assert _array_digest(np.float64(1.5)) == _array_digest(1.5)
+        assert _array_digest(np.array(["a", "b"], dtype=object)) != _array_digest(
+            np.array(["a", "c"], dtype=object))
+
+
+class TestIterRuns:
+    """Tests for the batched multi-run event iterator."""
+
+    @pytest.mark.parametrize("prefetch", [0, 1, 3])
+    def test_batches_cover_all_events(self, run_folder, prefetch):
+        folder, runs = run_folder
+        batches = list(iterRuns(list(runs), folder, ["jungfrau4M/azav_azav"],
+                                batch_size=2, prefetch=prefetch))
+        total = sum(len(b["run_indicator"]) for b in batches)
+        assert total == sum(runs.values())
+        assert all(len(b["run_indicator"]) <= 2 for b in batches)
+
+    def test_matches_full_read(self, run_folder):
+        folder, runs = run_folder
+        batches = list(iterRuns(list(runs), folder, ["jungfrau4M/azav_azav", "lightStatus/laser"],
+                                batch_size=3))
+        azav = np.concatenate([b["jungfrau4M/azav_azav"] for b in batches])
+        expected = []
+        for run in runs:
+            with h5py.File(_run_filename(folder, run), "r") as f:
+                expected.append(np.squeeze(f["jungfrau4M/azav_azav"][()]))
+        np.testing.assert_array_equal(azav, np.concatenate(expected))
+        assert azav.shape == (sum(runs.values()), 4)
+
+    def test_batches_do_not_span_runs(self, run_folder):
+        folder, runs = run_folder
+        for b in iterRuns(list(runs), folder, "lightStatus/laser", batch_size=4):
+            assert np.all(b["run_indicator"] == b["runNumber"])
+
+    def test_single_run_and_key_string(self, run_folder):
+        folder, _ = run_folder
+        batches = list(iterRuns(11, folder, "lightStatus/laser", batch_size=100))
+        assert len(batches) == 1
+        np.testing.assert_array_equal(batches[0]["lightStatus/laser"], np.arange(5) % 2)
+
+    def test_early_close_stops_prefetch(self, run_folder):
+        folder, runs = run_folder
+        it = iterRuns(list(runs), folder, "lightStatus/laser", batch_size=1, prefetch=1)
+        next(it)
+        it.close()  # must not hang on the background thread
+
+    def test_early_close_closes_source(self):
+        closed = []
+
+        def source():
+            try:
+                yield from range(100)
+            finally:
+                closed.append(True)
+
+        it = _prefetch(source(), 1)
+        next(it)
+        it.close()
+        assert closed == [True]
+
+    def test_missing_key_raises(self, run_folder):
+        folder, runs = run_folder
+        with pytest.raises(KeyError, match="not found"):
+            list(iterRuns(list(runs), folder, "does/not/exist"))
+
+    def test_non_event_key_raises(self, run_folder):
+        folder, runs = run_folder
+        with pytest.raises(ValueError, match="not per-event"):
+            list(iterRuns(list(runs), folder, "Sums/jungfrau4M_calib", prefetch=0))
+
+    def test_invalid_batch_size(self, run_folder):
+        folder, runs = run_folder
+        with pytest.raises(ValueError):
+            list(iterRuns(list(runs), folder, "lightStatus/laser", batch_size=0))
+
+    def test_folder_count_mismatch(self, run_folder):
+        folder, _ = run_folder
+        with pytest.raises(ValueError):
+            list(iterRuns([10, 11, 12], [folder, folder], "lightStatus/laser"))
+
 
 # ── YAML config helpers ────────────────────────────────────────────────
 
@@ -259,6 +461,59 @@ class TestConfigHelpers:
             get_config("anything", config_path="nonexistent_config.yaml")
 
 
+class TestGetConfigForShots:
+    """Tests for the vectorized per-shot config lookup."""
+
+    @pytest.fixture
+    def config_file(self, tmp_path):
+        config = {
+            "tt_calibration": [
+                {"runs": [1, 10], "slope": 0.5, "intercept": 1.0, "center": [1, 2]},
+                {"runs": [11, float("inf")], "slope": 2.0, "intercept": -1.0, "center": [3, 4]},
+            ],
+            "data_paths": [
+                {"runs": [1, 10], "path": "/a/"},
+                {"runs": [11, 20], "path": "/b/"},
+            ],
+        }
+        path = str(tmp_path / "config.yaml")
+        with open(path, "w") as f:
+            yaml.dump(config, f)
+        return path
+
+    def test_single_subkey(self, config_file):
+        run_indicator = np.array([3, 3, 12, 12, 12, 3])
+        slopes = get_config_for_shots(run_indicator, "tt_calibration", "slope", config_path=config_file)
+        np.testing.assert_array_equal(slopes, [0.5, 0.5, 2.0, 2.0, 2.0, 0.5])
+
+    def test_multiple_subkeys(self, config_file):
+        run_indicator = np.array([12, 3])
+        cal = get_config_for_shots(run_indicator, "tt_calibration", ["slope", "intercept"],
+                                   config_path=config_file)
+        np.testing.assert_array_equal(cal["slope"], [2.0, 0.5])
+        np.testing.assert_array_equal(cal["intercept"], [-1.0, 1.0])
+
+    def test_matches_get_config_for_runs(self, config_file):
+        run_indicator = np.repeat([1, 5, 11, 20], 3)
+        paths = get_config_for_shots(run_indicator, "data_paths", "path", config_path=config_file)
+        expected = [get_config_for_runs(int(r), "data_paths", "path", config_path=config_file)
+                    for r in run_indicator]
+        assert list(paths) == expected
+
+    def test_list_valued_entries(self, config_file):
+        centers = get_config_for_shots([3, 12], "tt_calibration", "center", config_path=config_file)
+        np.testing.assert_array_equal(centers, [[1, 2], [3, 4]])
+
+    def test_preserves_shape(self, config_file):
+        run_indicator = np.full((2, 3), 5)
+        assert get_config_for_shots(run_indicator, "data_paths", "path",
+                                    config_path=config_file).shape == (2, 3)
+
+    def test_missing_run_raises(self, config_file):
+        with pytest.raises(ValueError, match="No data_paths/path value found for run number: 30"):
+            get_config_for_shots([5, 30], "data_paths", "path", config_path=config_file)
+
+
 # ── read_mol ───────────────────────────────────────────────────────────
 
 
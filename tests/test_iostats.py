@@ -0,0 +1,132 @@
+"""Tests for xrayscatteringtools.iostats."""
+
+import json
+import logging
+
+import numpy as np
+import pytest
+import h5py
+
+from xrayscatteringtools.iostats import IOStats, KeyReadStats, peak_rss_bytes
+
+
+@pytest.fixture
+def h5_file(tmp_path):
+    """HDF5 file with one compressed and one contiguous dataset."""
+    path = str(tmp_path / "stats.h5")
+    with h5py.File(path, "w") as f:
+        f.create_dataset("compressed", data=np.zeros((64, 128)), chunks=(16, 128),
+                         compression="gzip", compression_opts=4)
+        f.create_dataset("plain/data", data=np.arange(1000, dtype=np.float32))
+    return path
+
+
+def _read_all(path, stats):
+    file_stats = stats.open_file(path, run=7)
+    with h5py.File(path, "r") as f:
+        a = file_stats.read(f["compressed"])
+        out = np.empty(1000, dtype=np.float32)
+        b = file_stats.read(f["plain/data"], out=out)
+    file_stats.close()
+    return a, b, out
+
+
+class TestFileReadStats:
+    def test_read_returns_data(self, h5_file):
+        a, b, out = _read_all(h5_file, IOStats())
+        np.testing.assert_array_equal(a, np.zeros((64, 128)))
+        assert b is out
+        np.testing.assert_array_equal(b, np.arange(1000))
+
+    def test_bytes_and_keys(self, h5_file):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        fs = stats.files[0]
+        assert [k.key for k in fs.keys] == ["compressed", "plain/data"]
+        assert fs.keys[0].nbytes == 64 * 128 * 8
+        assert fs.keys[1].nbytes == 4000
+        # gzip of zeros is much smaller on disk than in memory
+        assert fs.keys[0].storage_bytes < fs.keys[0].nbytes
+        assert fs.keys[0].compression == "gzip(4)"
+        assert fs.keys[1].compression is None
+        assert fs.nbytes == 64 * 128 * 8 + 4000
+        assert fs.run == 7
+
+    def test_times_and_rss(self, h5_file):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        fs = stats.files[0]
+        assert fs.read_time >= 0
+        assert fs.wall_time >= fs.read_time
+        assert fs.mb_per_s > 0
+        if peak_rss_bytes() is not None:
+            assert fs.peak_rss > 0
+
+    def test_decompression_not_measured_by_default(self, h5_file):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        assert all(k.decompress_time is None for k in stats.files[0].keys)
+
+    def test_measure_decompression(self, h5_file):
+        stats = IOStats(measure_decompression=True)
+        _read_all(h5_file, stats)
+        compressed, plain = stats.files[0].keys
+        assert plain.decompress_time == 0.0
+        if compressed.raw_read_time is not None:
+            assert compressed.decompress_time >= 0
+            # Only the filter step is counted, not the whole (cold) read
+            assert compressed.decompress_time != compressed.read_time
+
+    def test_logging(self, h5_file, caplog):
+        with caplog.at_level(logging.DEBUG, logger="xrayscatteringtools.iostats"):
+            _read_all(h5_file, IOStats())
+        messages = [r.getMessage() for r in caplog.records]
+        assert any("compressed" in m for m in messages)
+        assert any("MB/s" in m and "peak RSS" in m for m in messages)
+
+
+class TestIOStats:
+    def test_per_key_aggregates_files(self, h5_file):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        _read_all(h5_file, stats)
+        per_key = stats.per_key()
+        assert per_key["plain/data"]["nbytes"] == 8000
+        assert stats.nbytes == 2 * (64 * 128 * 8 + 4000)
+
+    def test_summary(self, h5_file):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        text = stats.summary()
+        assert "stats.h5" in text
+        assert "plain/data" in text
+        assert "total" in text
+
+    def test_to_json(self, h5_file, tmp_path):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        path = tmp_path / "stats.json"
+        stats.to_json(path)
+        loaded = json.loads(path.read_text())
+        assert loaded["files"][0]["keys"][1]["key"] == "plain/data"
+
+    def test_chrome_trace(self, h5_file, tmp_path):
+        stats = IOStats()
+        _read_all(h5_file, stats)
+        path = tmp_path / "trace.json"
+        stats.to_chrome_trace(path)
+        trace = json.loads(path.read_text())
+        events = trace["traceEvents"]
+        assert len(events) == 3  # one file + two reads
+        assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+        assert {e["cat"] for e in events} == {"file", "read"}
+
+
+class TestKeyReadStats:
+    def test_mb_per_s(self):
+        k = KeyReadStats("a", nbytes=2e6, storage_bytes=1e6, read_time=0.5, start=0.0)
+        assert k.mb_per_s == pytest.approx(4.0)
+
+    def test_zero_time(self):
+        k = KeyReadStats("a", nbytes=10, storage_bytes=10, read_time=0.0, start=0.0)
+        assert k.mb_per_s == float("inf")
@@ -0,0 +1,180 @@
+"""Tests for xrayscatteringtools.parallel."""
+
+import pickle
+
+import numpy as np
+import pytest
+import h5py
+
+from xrayscatteringtools._backends import DatasetArray, MemmapArray, SharedArray, array_reader
+from xrayscatteringtools.io import combineRuns, _run_filename
+from xrayscatteringtools.parallel import (
+    shard,
+    tree_reduce,
+    SerialBackend,
+    ProcessPoolBackend,
+    combineRunsParallel,
+)
+
+
+# ── Fixtures ───────────────────────────────────────────────────────────
+
+KEYS_TO_COMBINE = ["jungfrau4M/azav_azav", "lightStatus/laser"]
+KEYS_TO_SUM = ["Sums/jungfrau4M_calib"]
+KEYS_TO_CHECK = ["UserDataCfg/mask"]
+
+
+@pytest.fixture
+def run_folder(tmp_path):
+    """Write five small run files and return (folder, run numbers)."""
+    folder = tmp_path / "sdf" / "data" / "lcls" / "ds" / "cxi" / "cxitest" / "hdf5"
+    folder.mkdir(parents=True)
+    folder = str(folder) + "/"
+    runs = [3, 4, 5, 6, 7]
+    for run in runs:
+        n = run + 1
+        with h5py.File(_run_filename(folder, run), "w") as f:
+            f.create_dataset("lightStatus/xray", data=np.ones(n, dtype=int))
+            f.create_dataset("lightStatus/laser", data=np.arange(n) % 2)
+            f.create_dataset("jungfrau4M/azav_azav", data=run + np.arange(n * 4.0).reshape(n, 4))
+            f.create_dataset("Sums/jungfrau4M_calib", data=np.full((2, 3), run, dtype=float))
+            f.create_dataset("UserDataCfg/mask", data=np.eye(3) * (2 if run == 6 else 1))
+    return folder, runs
+
+
+def _assert_same(a, b):
+    assert set(a) == set(b)
+    for key in a:
+        np.testing.assert_array_equal(a[key], b[key])
+
+
+# ── shard ──────────────────────────────────────────────────────────────
+
+
+class TestShard:
+    def test_contiguous_and_complete(self):
+        parts = shard(range(10), 3)
+        assert parts == [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+    def test_more_shards_than_items(self):
+        assert shard([1, 2], 5) == [[1], [2]]
+
+    def test_empty(self):
+        assert shard([], 4) == []
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            shard([1, 2], 0)
+
+
+# ── tree_reduce ────────────────────────────────────────────────────────
+
+
+class TestTreeReduce:
+    def test_preserves_order(self):
+        assert tree_reduce(lambda a, b: a + b, [[1], [2], [3], [4], [5]]) == [1, 2, 3, 4, 5]
+
+    def test_single_item(self):
+        assert tree_reduce(lambda a, b: a + b, [7]) == 7
+
+    def test_depth_is_logarithmic(self):
+        depth = tree_reduce(lambda a, b: max(a, b) + 1, [0] * 8)
+        assert depth == 3
+
+    def test_empty_raises(self):
+        with pytest.raises(ValueError):
+            tree_reduce(lambda a, b: a, [])
+
+
+# ── Backends ───────────────────────────────────────────────────────────
+
+
+class TestBackends:
+    def test_serial(self):
+        assert SerialBackend().map(abs, [-1, 2, -3]) == [1, 2, 3]
+
+    def test_process_pool_ordered(self):
+        assert ProcessPoolBackend(2).map(abs, [-1, 2, -3, 4]) == [1, 2, 3, 4]
+
+
+# ── array_reader ───────────────────────────────────────────────────────
+
+
+def _read_rows(task):
+    reader, rows = task
+    return reader[rows]
+
+
+class TestArrayReader:
+    def _check(self, reader, expected):
+        rows = np.array([4, 1, 1, 7])
+        assert len(pickle.dumps(reader)) < 1000
+        np.testing.assert_array_equal(pickle.loads(pickle.dumps(reader))[rows], expected[rows])
+        out = ProcessPoolBackend(2).map(_read_rows, [(reader, rows), (reader, slice(2, 5))])
+        np.testing.assert_array_equal(out[0], expected[rows])
+        np.testing.assert_array_equal(out[1], expected[2:5])
+
+    def test_shared_memory(self):
+        array = np.arange(80.0).reshape(10, 8)
+        with array_reader(array) as reader:
+            assert isinstance(reader, SharedArray)
+            self._check(reader, array)
+
+    def test_memmap(self, tmp_path):
+        array = np.arange(80, dtype=np.float32).reshape(10, 8)
+        np.save(tmp_path / "a.npy", array)
+        with array_reader(np.load(tmp_path / "a.npy", mmap_mode="r")) as reader:
+            assert isinstance(reader, MemmapArray)
+            self._check(reader, array)
+
+    def test_memmap_view_copied(self, tmp_path):
+        np.save(tmp_path / "a.npy", np.arange(80.0).reshape(10, 8))
+        view = np.load(tmp_path / "a.npy", mmap_mode="r")[2:]
+        with array_reader(view) as reader:
+            assert isinstance(reader, SharedArray)
+            self._check(reader, np.asarray(view))
+
+    def test_hdf5_dataset(self, tmp_path):
+        array = np.arange(80.0).reshape(10, 8)
+        with h5py.File(tmp_path / "a.h5", "w") as f:
+            f["group/data"] = array
+        with h5py.File(tmp_path / "a.h5", "r") as f:
+            reader = array_reader(f["group/data"])
+        assert isinstance(reader, DatasetArray)
+        self._check(reader, array)
+
+
+# ── combineRunsParallel ────────────────────────────────────────────────
+
+
+class TestCombineRunsParallel:
+    @pytest.mark.parametrize("n_workers", [1, 2, 3, 5, 8])
+    def test_matches_combine_runs(self, run_folder, n_workers):
+        folder, runs = run_folder
+        expected = combineRuns(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, KEYS_TO_CHECK)
+        result = combineRunsParallel(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, KEYS_TO_CHECK,
+                                     n_workers=n_workers, backend=SerialBackend())
+        _assert_same(result, expected)
+
+    def test_process_pool(self, run_folder):
+        folder, runs = run_folder
+        expected = combineRuns(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, KEYS_TO_CHECK)
+        result = combineRunsParallel(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, KEYS_TO_CHECK,
+                                     n_workers=2)
+        _assert_same(result, expected)
+
+    def test_reports_inconsistent_runs(self, run_folder, capsys):
+        folder, runs = run_folder
+        combineRunsParallel(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, KEYS_TO_CHECK,
+                            n_workers=3, backend=SerialBackend())
+        out = capsys.readouterr().out
+        assert "Problem with key UserDataCfg/mask in run 6" in out
+        assert "in run 7" not in out
+
+    def test_executor_backend(self, run_folder):
+        from concurrent.futures import ThreadPoolExecutor
+        folder, runs = run_folder
+        with ThreadPoolExecutor(2) as pool:
+            result = combineRunsParallel(runs, folder, KEYS_TO_COMBINE, KEYS_TO_SUM, [],
+                                         n_workers=2, backend=pool)
+        assert result["jungfrau4M/azav_azav"].shape == (sum(r + 1 for r in runs), 4)
@@ -0,0 +1,68 @@
+"""Tests for xrayscatteringtools.analysis.scaling."""
+
+import numpy as np
+import pytest
+
+from xrayscatteringtools.analysis import fit_scale_offset
+
+
+@pytest.fixture
+def shots():
+    rng = np.random.default_rng(0)
+    q = np.linspace(0.5, 4, 80)
+    theory = 10 / q + np.sin(q)
+    scale = rng.uniform(0.5, 2, 3000)
+    offset = rng.normal(0, 1, 3000)
+    azav = scale[:, None] * theory + offset[:, None] + rng.normal(0, 0.01, (3000, 80))
+    return azav, theory, scale, offset
+
+
+def _polyfit(y, t, w=None):
+    """Reference weighted fit with np.linalg.lstsq."""
+    sw = np.ones_like(t) if w is None else np.sqrt(w)
+    A = np.stack([t, np.ones_like(t)], axis=1) * sw[:, None]
+    return np.linalg.lstsq(A, y * sw, rcond=None)[0]
+
+
+class TestFitScaleOffset:
+    def test_recovers_parameters(self, shots):
+        azav, theory, scale, offset = shots
+        res = fit_scale_offset(azav, theory, chunk_size=700)
+        np.testing.assert_allclose(res['scale'], scale, atol=3e-3)
+        np.testing.assert_allclose(res['offset'], offset, atol=3e-2)
+        np.testing.assert_allclose(res['residuals'], azav - (res['scale'][:, None] * theory + res['offset'][:, None]))
+        np.testing.assert_allclose(res['chi2'], (res['residuals'] ** 2).sum(axis=1))
+        assert np.all(res['n_points'] == 80)
+
+    def test_matches_lstsq_with_mask_and_weights(self, shots):
+        azav, theory, _, _ = shots
+        rng = np.random.default_rng(1)
+        mask = rng.random(azav.shape) > 0.3
+        weights = rng.uniform(0.5, 2, 80)
+        azav = azav.copy()
+        azav[5, 10] = np.nan
+        res = fit_scale_offset(azav, theory, mask=mask, weights=weights, chunk_size=512)
+        for i in (0, 5, 1234):
+            sel = mask[i] & np.isfinite(azav[i])
+            a, b = _polyfit(azav[i, sel], theory[sel], weights[sel])
+            assert res['scale'][i] == pytest.approx(a, rel=1e-9)
+            assert res['offset'][i] == pytest.approx(b, rel=1e-7, abs=1e-9)
+            assert res['n_points'][i] == sel.sum()
+
+    def test_per_shot_theory_no_offset(self, shots):
+        azav, theory, scale, _ = shots
+        per_shot = np.tile(theory, (len(azav), 1)) * np.linspace(1, 2, len(azav))[:, None]
+        data = per_shot * scale[:, None]
+        res = fit_scale_offset(data, per_shot, offset=False, return_residuals=False)
+        np.testing.assert_allclose(res['scale'], scale)
+        np.testing.assert_array_equal(res['offset'], 0)
+        assert 'residuals' not in res
+
+    def test_undetermined_and_shape_errors(self, shots):
+        azav, theory, _, _ = shots
+        mask = np.zeros(azav.shape, dtype=bool)
+        mask[:, :1] = True
+        res = fit_scale_offset(azav[:4], theory, mask=mask[:4])
+        assert np.isnan(res['scale']).all() and np.isnan(res['chi2']).all()
+        with pytest.raises(ValueError, match="theory must have shape"):
+            fit_scale_offset(azav, theory[:-1])
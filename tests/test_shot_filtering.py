@@ -0,0 +1,106 @@
+"""Tests for xrayscatteringtools.analysis.shot_filtering."""
+
+import numpy as np
+import pytest
+
+from xrayscatteringtools.analysis import (
+    shot_metrics,
+    mad_outliers,
+    group_median,
+    filter_shots,
+)
+
+
+@pytest.fixture
+def stack():
+    """Two runs of patterns with known bad shots."""
+    rng = np.random.default_rng(0)
+    n, n_q = 2000, 40
+    q = np.linspace(0.5, 4, n_q)
+    run = np.repeat([7, 8], n // 2)
+    i0 = rng.normal(1.0, 0.05, n)
+    shape = np.where(run[:, None] == 7, 1 / q, 1 / q + 0.1 * np.sin(q))
+    azav = i0[:, None] * shape * (1 + rng.normal(0, 0.01, (n, n_q)))
+    bad = {
+        'dropped': 10,     # i0 monitor and detector see nothing
+        'spike': 20,       # hot q bins
+        'shape': 30,       # wrong pattern shape
+    }
+    azav[bad['dropped']] *= 0.01
+    i0[bad['dropped']] = 0.01
+    azav[bad['spike'], 5:8] += 50
+    azav[bad['shape']] = azav[bad['shape'], ::-1]
+    return azav, q, i0, run, bad
+
+
+class TestShotMetrics:
+    def test_values(self, stack):
+        azav, q, i0, run, _ = stack
+        m = shot_metrics(azav, q=q, q_window=(1, 2), i0=i0, run_indicator=run, chunk_size=300)
+        np.testing.assert_allclose(m['total'], azav.sum(axis=1))
+        np.testing.assert_allclose(m['window'], azav[:, (q >= 1) & (q <= 2)].sum(axis=1))
+        np.testing.assert_allclose(m['total_per_i0'], m['total'] / i0)
+        ref = np.array([np.corrcoef(azav[i], azav[run == run[i]].mean(axis=0))[0, 1] for i in range(0, 2000, 97)])
+        np.testing.assert_allclose(m['correlation'][::97], ref)
+
+    def test_memmap_and_nan(self, stack, tmp_path):
+        azav, _, _, run, _ = stack
+        mm = np.lib.format.open_memmap(tmp_path / "azav.npy", mode="w+", dtype=np.float32, shape=azav.shape)
+        mm[:] = azav
+        mm[3, 2] = np.nan
+        m = shot_metrics(mm, run_indicator=run, chunk_size=128)
+        np.testing.assert_allclose(m['total'], np.nansum(mm, axis=1), rtol=1e-5)
+        assert np.all(np.isfinite(m['correlation']))
+
+    def test_q_window_requires_q(self, stack):
+        with pytest.raises(ValueError, match="q is required"):
+            shot_metrics(stack[0], q_window=(1, 2))
+
+
+class TestGroupMedian:
+    def test_matches_np_median(self):
+        rng = np.random.default_rng(1)
+        values = rng.normal(size=501)
+        values[::50] = np.nan
+        groups = rng.integers(0, 5, 501)
+        medians = group_median(values, groups)
+        for g in range(5):
+            sel = groups == g
+            np.testing.assert_allclose(medians[sel], np.nanmedian(values[sel]))
+
+
+class TestMadOutliers:
+    def test_flags_tails(self):
+        values = np.r_[np.random.default_rng(2).normal(0, 1, 1000), 20, -20]
+        outlier, z = mad_outliers(values, threshold=6)
+        assert outlier[-2:].all() and outlier[:-2].sum() == 0
+        low, _ = mad_outliers(values, threshold=6, side='low')
+        assert low[-1] and not low[-2]
+
+    def test_per_group(self):
+        values = np.r_[np.full(50, 1.0) + np.linspace(0, 0.1, 50), np.full(50, 100.0) + np.linspace(0, 0.1, 50)]
+        groups = np.repeat([0, 1], 50)
+        assert mad_outliers(values, groups=groups)[0].sum() == 0
+        assert mad_outliers(values)[0].sum() == 0  # bimodal, but MAD is wide
+
+    def test_zero_mad_and_nan(self):
+        outlier, _ = mad_outliers([1.0, 1.0, 1.0, 2.0, np.nan])
+        np.testing.assert_array_equal(outlier, [False, False, False, True, True])
+
+
+class TestFilterShots:
+    def test_rejects_bad_shots(self, stack):
+        azav, q, i0, run, bad = stack
+        keep, diag = filter_shots(azav, q=q, q_window=(0.5, 1.2), i0=i0, run_indicator=run,
+                                  threshold=8, chunk_size=256)
+        assert not keep[list(bad.values())].any()
+        assert keep.sum() >= len(keep) - 20
+        assert diag['rejected_by']['correlation'][bad['shape']]
+        assert diag['n_rejected']['i0'] >= 1
+        assert set(diag['z']) == set(diag['metrics'])
+
+    def test_threshold_per_metric(self, stack):
+        azav, q, i0, run, bad = stack
+        keep, diag = filter_shots(azav, i0=i0, run_indicator=run, threshold={'i0': 8})
+        assert list(diag['rejected_by']) == ['i0']
+        assert not keep[bad['dropped']] and keep[bad['shape']]
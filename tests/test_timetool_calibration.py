@@ -10,8 +10,13 @@ from ruamel.yaml import YAML
 
 from xrayscatteringtools.calib.timetool_calibration import (
     fast_erf_fit,
+    fast_erf_fit_batch,
+    erf_fit_batch,
     add_calibration_to_yaml,
     apply_timetool_correction,
+    LinearFitAccumulator,
+    robust_linear_fit,
+    run_timetool_calibration,
 )
 
 
@@ -171,6 +176,147 @@ class TestFastErfFit:
         assert len(result) == 5
 
 
+# ===================================================================
+# fast_erf_fit_batch
+# ===================================================================
+def _make_traces(n_shots=200, n_pixels=300, seed=0):
+    """Noisy erf steps with random centers/widths, plus some degenerate rows."""
+    rng = np.random.default_rng(seed)
+    x = np.arange(n_pixels, dtype=float)
+    centers = rng.uniform(50, n_pixels - 50, n_shots)
+    widths = rng.uniform(5, 40, n_shots)
+    traces = 0.5 * (1 + erf((x - centers[:, None]) / widths[:, None]))
+    traces = 3.0 * traces + 1.0 + rng.normal(0, 0.02, traces.shape)
+    traces[0] = 2.0                    # flat
+    traces[1] = traces[1, ::-1]        # falling edge
+    traces[2, 10] = np.nan             # NaN pixel
+    traces[3] = rng.normal(size=n_pixels)  # pure noise
+    return traces
+
+
+class TestFastErfFitBatch:
+    """Tests for fast_erf_fit_batch."""
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_matches_fast_erf_fit(self, chunk_size):
+        traces = _make_traces()
+        range_val, cent_pos, cent_amp, norm, slope_val = fast_erf_fit_batch(
+            traces, return_norm=True, chunk_size=chunk_size)
+        for i, trace in enumerate(traces):
+            r, c, a, nd, sl = fast_erf_fit(trace)
+            assert range_val[i] == r
+            assert cent_pos[i] == c
+            np.testing.assert_allclose(cent_amp[i], a)
+            np.testing.assert_allclose(slope_val[i], sl)
+            np.testing.assert_allclose(norm[i], nd)
+
+    def test_shapes_and_types(self):
+        traces = _make_traces(n_shots=20)
+        range_val, cent_pos, cent_amp, norm, slope_val = fast_erf_fit_batch(traces)
+        assert norm is None
+        assert range_val.shape == cent_pos.shape == cent_amp.shape == slope_val.shape == (20,)
+        assert np.issubdtype(range_val.dtype, np.integer)
+        assert np.issubdtype(cent_pos.dtype, np.integer)
+
+    def test_degenerate_rows_zero(self):
+        range_val, cent_pos, cent_amp, _, slope_val = fast_erf_fit_batch(_make_traces())
+        for out in (range_val, cent_pos, cent_amp, slope_val):
+            assert out[0] == 0 and out[1] == 0
+
+    def test_custom_thresholds(self):
+        traces = _make_traces(n_shots=10)
+        batch = fast_erf_fit_batch(traces, min_val=0.2, max_val=0.8)
+        for i, trace in enumerate(traces):
+            r, c, _, _, _ = fast_erf_fit(trace, min_val=0.2, max_val=0.8)
+            assert (batch[0][i], batch[1][i]) == (r, c)
+
+    def test_h5py_dataset(self, tmp_path):
+        import h5py
+        traces = _make_traces(n_shots=50)
+        with h5py.File(tmp_path / "tt.h5", "w") as f:
+            f["traces"] = traces
+        with h5py.File(tmp_path / "tt.h5", "r") as f:
+            result = fast_erf_fit_batch(f["traces"], chunk_size=16)
+        for a, b in zip(result, fast_erf_fit_batch(traces)):
+            if a is None:
+                assert b is None
+            else:
+                np.testing.assert_array_equal(a, b)
+
+    def test_rejects_1d(self):
+        with pytest.raises(ValueError, match="2D"):
+            fast_erf_fit_batch(np.arange(10.0))
+
+
+# ===================================================================
+# erf_fit_batch
+# ===================================================================
+class TestErfFitBatch:
+    """Tests for erf_fit_batch."""
+
+    @staticmethod
+    def _traces(n_shots=100, n_pixels=400, noise=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        x = np.arange(n_pixels, dtype=float)
+        centers = rng.uniform(100, 300, n_shots)
+        widths = rng.uniform(8, 30, n_shots)
+        traces = 1.0 + 2.5 * 0.5 * (1 + erf((x - centers[:, None]) / widths[:, None]))
+        traces += rng.normal(0, noise, traces.shape)
+        return traces, centers, widths
+
+    def test_exact_recovery(self):
+        traces, centers, widths = self._traces()
+        center, width, amplitude, offset, converged = erf_fit_batch(traces)
+        assert converged.all()
+        np.testing.assert_allclose(center, centers, atol=1e-4)
+        np.testing.assert_allclose(width, widths, rtol=1e-4)
+        np.testing.assert_allclose(amplitude, 2.5, rtol=1e-4)
+        np.testing.assert_allclose(offset, 1.0, atol=1e-4)
+
+    def test_sub_pixel_better_than_coarse(self):
+        traces, centers, _ = self._traces(n_shots=300, noise=0.05)
+        center = erf_fit_batch(traces)[0]
+        coarse = fast_erf_fit_batch(traces)[1]
+        assert np.std(center - centers) < 0.5 * np.std(coarse - centers)
+        assert np.std(center - centers) < 0.5
+
+    def test_matches_curve_fit(self):
+        from scipy.optimize import curve_fit
+        traces, _, _ = self._traces(n_shots=5, noise=0.05, seed=3)
+        center, width, amplitude, offset, _ = erf_fit_batch(traces, tol=1e-6, max_iter=50)
+        x = np.arange(traces.shape[1], dtype=float)
+
+        def model(x, o, a, c, w):
+            return o + a * 0.5 * (1 + erf((x - c) / w))
+
+        for i, trace in enumerate(traces):
+            popt, _ = curve_fit(model, x, trace, p0=[offset[i], amplitude[i], center[i] + 3, width[i] * 1.2])
+            np.testing.assert_allclose([offset[i], amplitude[i], center[i], abs(width[i])],
+                                       [popt[0], popt[1], popt[2], abs(popt[3])], rtol=1e-4, atol=1e-4)
+
+    def test_window(self):
+        traces, centers, _ = self._traces(noise=0.02)
+        center, _, _, _, converged = erf_fit_batch(traces, window=80, chunk_size=32)
+        assert converged.all()
+        np.testing.assert_allclose(center, centers, atol=0.5)
+
+    def test_failed_rows_nan(self):
+        traces, _, _ = self._traces(n_shots=4)
+        traces[1] = 3.0            # flat
+        traces[2] = traces[2, ::-1]  # falling edge
+        center, width, amplitude, offset, converged = erf_fit_batch(traces)
+        for out in (center, width, amplitude, offset):
+            assert np.isnan(out[1]) and np.isnan(out[2])
+            assert np.isfinite(out[0]) and np.isfinite(out[3])
+        assert not converged[1] and not converged[2]
+
+    def test_nan_pixels_ignored(self):
+        traces, centers, _ = self._traces(n_shots=10)
+        traces[:, 50] = np.nan
+        center = erf_fit_batch(traces)[0]
+        np.testing.assert_allclose(center, centers, atol=1e-4)
+
+
 # ===================================================================
 # add_calibration_to_yaml
 # ===================================================================
@@ -330,6 +476,15 @@ class TestApplyTimetoolCorrection:
         with pytest.raises(ValueError, match="scalars"):
             apply_timetool_correction([1.0], [10.0], 0.1, [0.0, 0.1])
 
+    def test_single_per_shot_arrays(self):
+        """Per-shot slope/intercept arrays are applied element-wise."""
+        delays = np.array([1.0, 2.0, 3.0])
+        edges = np.array([10.0, 20.0, 30.0])
+        slopes = np.array([0.1, 0.2, 0.3])
+        intercepts = np.array([0.0, 1.0, 2.0])
+        result = apply_timetool_correction(delays, edges, slopes, intercepts)
+        np.testing.assert_allclose(result, delays + edges * slopes + intercepts)
+
     # --- multi calibration (with run_indicator) ---
 
     def test_multi_two_runs(self):
@@ -442,3 +597,178 @@ class TestApplyTimetoolCorrection:
         edges = np.ones(50)
         result = apply_timetool_correction(delays, edges, 0.1, 0.2)
         assert result.shape == delays.shape
+
+    # --- vectorized gather, dtype and out ---
+
+    def _reference(self, delays, edges, slopes, intercepts, run_ids):
+        """Per-run loop the vectorized gather must reproduce."""
+        expected = np.empty_like(delays, dtype=float)
+        for i, run in enumerate(np.unique(run_ids)):
+            mask = run_ids == run
+            expected[mask] = delays[mask] + edges[mask] * slopes[i] + intercepts[i]
+        return expected
+
+    @pytest.mark.parametrize("run_ids", [
+        np.repeat(np.arange(100, 150), 20),                       # sorted, compact
+        np.random.default_rng(1).integers(0, 30, 1000),           # unsorted
+        np.random.default_rng(2).choice([-5, 7, 10**9], 1000),    # sparse range
+        np.random.default_rng(3).choice([1.5, 2.5, 9.0], 1000),   # float run ids
+    ])
+    def test_matches_per_run_loop(self, run_ids):
+        rng = np.random.default_rng(0)
+        n_runs = np.unique(run_ids).size
+        delays, edges = rng.normal(size=run_ids.size), rng.uniform(0, 1000, run_ids.size)
+        slopes, intercepts = rng.normal(size=n_runs), rng.normal(size=n_runs)
+        result = apply_timetool_correction(delays, edges, slopes, intercepts, run_ids)
+        np.testing.assert_allclose(result, self._reference(delays, edges, slopes, intercepts, run_ids))
+
+    def test_float32(self):
+        run_ids = np.repeat([1, 2], 50)
+        delays, edges = np.linspace(0, 1, 100), np.linspace(0, 500, 100)
+        result = apply_timetool_correction(delays, edges, [0.01, 0.02], [0.5, 1.0], run_ids,
+                                           dtype=np.float32)
+        assert result.dtype == np.float32
+        np.testing.assert_allclose(
+            result, self._reference(delays, edges, [0.01, 0.02], [0.5, 1.0], run_ids), rtol=1e-6)
+
+    def test_in_place(self):
+        run_ids = np.array([3, 3, 4, 4])
+        delays = np.array([1.0, 2.0, 3.0, 4.0])
+        edges = np.array([10.0, 20.0, 30.0, 40.0])
+        expected = self._reference(delays, edges, [0.1, 0.2], [1.0, 2.0], run_ids)
+        result = apply_timetool_correction(delays, edges, [0.1, 0.2], [1.0, 2.0], run_ids, out=delays)
+        assert result is delays
+        np.testing.assert_allclose(delays, expected)
+
+    def test_out_single_calibration(self):
+        delays, edges = np.array([1.0, 2.0]), np.array([10.0, 20.0])
+        out = np.empty(2, dtype=np.float32)
+        result = apply_timetool_correction(delays, edges, 0.1, 0.2, out=out)
+        assert result is out
+        np.testing.assert_allclose(out, delays + edges * 0.1 + 0.2, rtol=1e-6)
+
+
+# ===================================================================
+# LinearFitAccumulator / robust_linear_fit
+# ===================================================================
+def _line_with_outliers(n=20000, frac=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 1000, n)
+    y = 0.002 * x - 1.0 + rng.normal(0, 0.01, n)
+    bad = rng.random(n) < frac
+    y[bad] += rng.uniform(-3, 3, bad.sum())
+    return x, y, bad
+
+
+class TestLinearFitAccumulator:
+    def test_matches_polyfit(self):
+        x, y, _ = _line_with_outliers(frac=0)
+        acc = LinearFitAccumulator()
+        for i in range(0, x.size, 3000):
+            acc.add(x[i:i + 3000], y[i:i + 3000])
+        np.testing.assert_allclose(acc.solve(), np.polyfit(x, y, 1))
+        assert acc.count == x.size
+
+    def test_merge_and_nan(self):
+        x, y, _ = _line_with_outliers(n=100, frac=0)
+        a = LinearFitAccumulator().add(x[:50], y[:50])
+        b = LinearFitAccumulator().add(np.append(x[50:], np.nan), np.append(y[50:], 1.0))
+        np.testing.assert_allclose(a.merge(b).solve(), np.polyfit(x, y, 1))
+
+    def test_degenerate_raises(self):
+        with pytest.raises(ValueError):
+            LinearFitAccumulator().add([1.0, 1.0], [2.0, 3.0]).solve()
+
+
+class TestRobustLinearFit:
+    @pytest.mark.parametrize("method", ["huber", "ransac"])
+    def test_rejects_outliers(self, method):
+        x, y, bad = _line_with_outliers()
+        slope, intercept, weights = robust_linear_fit(x, y, method=method, seed=0)
+        assert abs(slope - 0.002) < 2e-6
+        assert abs(intercept + 1.0) < 2e-3
+        assert weights[bad].mean() < weights[~bad].mean()
+
+    def test_ols_biased(self):
+        x, y, _ = _line_with_outliers(seed=1)
+        ols = robust_linear_fit(x, y, method="ols")
+        huber = robust_linear_fit(x, y, method="huber")
+        assert abs(huber[1] + 1.0) < abs(ols[1] + 1.0)
+
+    def test_non_finite_ignored(self):
+        x, y, _ = _line_with_outliers(n=1000, frac=0)
+        y[::10] = np.nan
+        slope, _, weights = robust_linear_fit(x, y)
+        assert abs(slope - 0.002) < 1e-5
+        assert np.all(weights[::10] == 0)
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError, match="Unknown method"):
+            robust_linear_fit([0.0, 1.0, 2.0], [0.0, 1.0, 2.0], method="lasso")
+
+
+# ===================================================================
+# run_timetool_calibration
+# ===================================================================
+class TestRunTimetoolCalibration:
+    SLOPE, INTERCEPT = 0.004, -2.0
+
+    def _scan(self, n_shots=600, n_pixels=400, seed=0):
+        """Delay scan whose edge moves linearly with the stage delay, plus some bad shots."""
+        rng = np.random.default_rng(seed)
+        edges = rng.uniform(80, 320, n_shots)
+        delays = self.SLOPE * edges + self.INTERCEPT + rng.normal(0, 0.002, n_shots)
+        delays[:30] += rng.uniform(-1, 1, 30)  # e.g. shots with a wrong stage readback
+        x = np.arange(n_pixels, dtype=float)
+        traces = 0.5 * (1 + erf((x - edges[:, None]) / 20.0)) + rng.normal(0, 0.01, (n_shots, n_pixels))
+        traces[30:40] = 1.0  # no edge
+        return delays, traces
+
+    def test_fit_from_traces(self):
+        delays, traces = self._scan()
+        slope, intercept, edges, weights = run_timetool_calibration(delays, traces, chunk_size=100)
+        np.testing.assert_allclose([slope, intercept], [self.SLOPE, self.INTERCEPT], rtol=1e-2, atol=5e-3)
+        assert np.all(np.isnan(edges[30:40])) and np.all(weights[30:40] == 0)
+        assert edges.shape == delays.shape
+
+    def test_list_of_traces(self):
+        delays, traces = self._scan(n_shots=200)
+        expected = run_timetool_calibration(delays, traces)
+        result = run_timetool_calibration(list(delays), [list(trace) for trace in traces])
+        np.testing.assert_allclose(result[:2], expected[:2])
+        np.testing.assert_array_equal(result[2], expected[2])
+
+    def test_h5py_traces_and_yaml(self, tmp_path, yaml_file):
+        import h5py
+        delays, traces = self._scan()
+        with h5py.File(tmp_path / "scan.h5", "w") as f:
+            f["traces"] = traces
+        with h5py.File(tmp_path / "scan.h5", "r") as f:
+            slope, intercept, _, _ = run_timetool_calibration(
+                delays, f["traces"], run_range=[30, ".inf"], method="ransac",
+                file_path=yaml_file, chunk_size=128, seed=0)
+        data = YAML().load(open(yaml_file))
+        entry = data["tt_calibration"][-1]
+        assert list(entry["runs"]) == [30, float("inf")]
+        assert entry["slope"] == pytest.approx(slope)
+        assert entry["intercept"] == pytest.approx(intercept)
+
+    def test_streaming_matches_in_memory_ols(self):
+        delays, traces = self._scan()
+        streamed = run_timetool_calibration(delays, traces, method="ols", streaming=True, chunk_size=64)
+        in_memory = run_timetool_calibration(delays, traces, method="ols")
+        np.testing.assert_allclose(streamed[:2], in_memory[:2])
+        assert streamed[2] is None
+
+    def test_precomputed_edges(self):
+        edges = np.linspace(0, 100, 50)
+        slope, intercept, _, _ = run_timetool_calibration(2 * edges + 1, edges=edges)
+        np.testing.assert_allclose([slope, intercept], [2, 1])
+
+    def test_validation(self):
+        with pytest.raises(ValueError, match="traces or edges"):
+            run_timetool_calibration([1.0, 2.0])
+        with pytest.raises(ValueError, match="ols"):
+            run_timetool_calibration([1.0, 2.0], edges=[1.0, 2.0], streaming=True)
+        with pytest.raises(ValueError, match="one entry per shot"):
+            run_timetool_calibration([1.0, 2.0], edges=[1.0, 2.0, 3.0])